@@ -0,0 +1,133 @@
+import os
+import uuid
+import heapq
+import logging
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.db.models import Sum
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+
+def unique_path(directory, filename):
+    """Path for ``filename`` under ``directory`` of MEDIA_ROOT that no other result shares."""
+    return os.path.join(settings.MEDIA_ROOT, directory, f"{uuid.uuid4().hex}_{os.path.basename(filename)}")
+
+
+class Artifact(models.Model):
+    """A result file under MEDIA_ROOT, downloaded by its id.
+
+    ``content_hash`` is the SHA-256 of the input it was made from, ``source``
+    the URL or name of that input and ``params`` the settings it depends on.
+    Downloads move ``accessed_at``, which is what eviction goes by.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    path = models.CharField(max_length=512)
+    filename = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64, blank=True)
+    size = models.BigIntegerField(default=0)
+    source = models.CharField(max_length=512, blank=True)
+    params = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    accessed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.filename} ({self.id})"
+
+    @classmethod
+    def register(cls, path, filename=None, content_hash=None, source=None, **fields):
+        """Record the file already written at ``path``; ``filename`` is the name it is downloaded as."""
+        return cls.objects.create(path=os.path.relpath(path, settings.MEDIA_ROOT),
+                                  filename=filename or os.path.basename(path), size=os.path.getsize(path),
+                                  content_hash=content_hash or '', source=(source or '')[:512], **fields)
+
+    def full_path(self):
+        return os.path.join(settings.MEDIA_ROOT, self.path)
+
+    def update_size(self):
+        self.size = os.path.getsize(self.full_path())
+        type(self).objects.filter(pk=self.pk).update(size=self.size)
+
+    def touch(self):
+        self.accessed_at = timezone.now()
+        type(self).objects.filter(pk=self.pk).update(accessed_at=self.accessed_at)
+
+
+def serve_artifact(model, artifact_id):
+    artifact = model.objects.filter(pk=artifact_id).first()
+    if artifact is None:
+        return HttpResponse("File not found.", status=404)
+    try:
+        response = FileResponse(open(artifact.full_path(), 'rb'), as_attachment=True, filename=artifact.filename)
+    except FileNotFoundError:
+        return HttpResponse("File not found.", status=404)
+    artifact.touch()
+    return response
+
+
+def artifact_models():
+    return [model for model in apps.get_models() if issubclass(model, Artifact)]
+
+
+def delete_artifacts(artifacts):
+    """Remove the files of ``artifacts`` and then their records; returns how many went."""
+    removed = {}
+    for artifact in artifacts:
+        try:
+            os.remove(artifact.full_path())
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error evicting {artifact.path}: {e}")
+            continue
+        removed.setdefault(type(artifact), []).append(artifact.pk)
+    for model, pks in removed.items():
+        model.objects.filter(pk__in=pks).delete()
+    return sum(len(pks) for pks in removed.values())
+
+
+def evict_artifacts(max_age=None, max_bytes=None):
+    """Drop the artifacts not downloaded for ``max_age`` seconds, then the least recently
+    used ones until all of them together fit in ``max_bytes``.
+
+    Both steps are queries on the ``accessed_at`` index; nothing is listed on
+    disk. Returns how many artifacts were removed.
+    """
+    if max_age is None:
+        max_age = getattr(settings, 'ARTIFACTS_MAX_AGE_SECONDS', DEFAULT_MAX_AGE_SECONDS)
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'ARTIFACTS_MAX_BYTES', DEFAULT_MAX_BYTES)
+    kinds = artifact_models()
+
+    removed = 0
+    if max_age:
+        cutoff = timezone.now() - timedelta(seconds=max_age)
+        for model in kinds:
+            removed += delete_artifacts(model.objects.filter(accessed_at__lt=cutoff).only('id', 'path'))
+
+    if max_bytes:
+        total = sum(model.objects.aggregate(total=Sum('size'))['total'] or 0 for model in kinds)
+        least_recent = heapq.merge(*(model.objects.order_by('accessed_at').only('id', 'path', 'size', 'accessed_at')
+                                     .iterator() for model in kinds), key=lambda artifact: artifact.accessed_at)
+        doomed = []
+        for artifact in least_recent:
+            if total <= max_bytes:
+                break
+            doomed.append(artifact)
+            total -= artifact.size
+        removed += delete_artifacts(doomed)
+
+    if removed:
+        logger.info(f"Evicted {removed} result files")
+    return removed
@@ -0,0 +1,394 @@
+import os
+import json
+import time
+import math
+import uuid
+import shutil
+import hashlib
+import platform
+import subprocess
+import multiprocessing
+from queue import Empty
+from django.conf import settings
+from Autra.lazy import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+DEFAULT_RESOLUTIONS = ((320, 240), (1280, 720))
+DEFAULT_VIDEO_SECONDS = (5, 20)
+DEFAULT_AUDIO_SECONDS = (10, 60)
+FIXTURE_FPS = 25
+FIXTURE_SEED = 1234
+# The combined job may take this much longer than the slower of its two halves run alone:
+# the last transcription window can only start once the demux is done.
+DEFAULT_MAX_COMBINED_OVERLAP = 1.5
+DEFAULT_CASE_TIMEOUT_SECONDS = 30 * 60
+
+
+def fixtures_root():
+    return str(getattr(settings, 'BENCH_FIXTURES_ROOT', os.path.join(settings.MEDIA_ROOT, 'bench')))
+
+
+def synthetic_audio(seconds, seed=FIXTURE_SEED):
+    """Tone bursts with vibrato and noise, separated by pauses of varying length, as 16 kHz mono float32."""
+    from transcriber.audio import SAMPLE_RATE
+
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    position = 0
+    while position < len(audio):
+        length = int(rng.uniform(0.3, 2.0) * SAMPLE_RATE)
+        t = np.arange(min(length, len(audio) - position)) / SAMPLE_RATE
+        pitch = rng.uniform(120, 300)
+        burst = np.sin(2 * np.pi * pitch * t + 3 * np.sin(2 * np.pi * 5 * t))
+        burst += 0.5 * np.sin(4 * np.pi * pitch * t) + 0.05 * rng.standard_normal(len(t))
+        audio[position:position + len(t)] = 0.2 * burst * np.hanning(len(t))
+        position += len(t) + int(rng.uniform(0.1, 1.5) * SAMPLE_RATE)
+    return audio
+
+
+def synthetic_frame(index, width, height, rng):
+    """A textured background with a bright disc moving across it; sharpness varies with ``index``."""
+    frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    center = (int(width * (0.2 + 0.6 * ((index * 7) % 100) / 100)), height // 2)
+    cv2.circle(frame, center, max(4, height // 5), (230, 200, 180), -1)
+    # Blur follows a slow wave, so only a few frames are the sharpest.
+    blur = 1 + 2 * int(4 * (1 + math.sin(index / 9)))
+    return cv2.GaussianBlur(frame, (blur, blur), 0)
+
+
+def write_video_fixture(path, width, height, seconds):
+    """Write an MJPEG AVI fixture; the synthetic audio is muxed in when ffmpeg is available."""
+    from transcriber.audio import write_wav
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    silent_path = path + '.video.avi'
+    writer = cv2.VideoWriter(silent_path, cv2.VideoWriter_fourcc(*'MJPG'), FIXTURE_FPS, (width, height))
+    rng = np.random.default_rng(FIXTURE_SEED)
+    for index in range(int(seconds * FIXTURE_FPS)):
+        writer.write(synthetic_frame(index, width, height, rng))
+    writer.release()
+
+    if shutil.which('ffmpeg') is None:
+        os.replace(silent_path, path)
+        return path
+    audio_path = write_wav(synthetic_audio(seconds), path + '.wav')
+    try:
+        subprocess.run(['ffmpeg', '-nostdin', '-y', '-loglevel', 'error', '-i', silent_path, '-i', audio_path,
+                        '-c:v', 'copy', '-c:a', 'pcm_s16le', '-shortest', path], check=True)
+    finally:
+        os.remove(silent_path)
+        os.remove(audio_path)
+    return path
+
+
+def video_fixture(width, height, seconds):
+    path = os.path.join(fixtures_root(), f"video_{width}x{height}_{seconds}s.avi")
+    if not os.path.exists(path):
+        write_video_fixture(path, width, height, seconds)
+    return path
+
+
+def audio_fixture(seconds):
+    from transcriber.audio import write_wav
+
+    path = os.path.join(fixtures_root(), f"audio_{seconds}s.wav")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_wav(synthetic_audio(seconds), path)
+    return path
+
+
+def percentile(timings, q):
+    ordered = sorted(timings)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def latency(timings):
+    return {
+        'mean_s': sum(timings) / len(timings),
+        'p50_s': percentile(timings, 50),
+        'p90_s': percentile(timings, 90),
+        'p99_s': percentile(timings, 99),
+    }
+
+
+def digest(array):
+    return None if array is None else hashlib.sha256(np.ascontiguousarray(array).tobytes()).hexdigest()[:16]
+
+
+def case_get_best_frame(path, repeat):
+    from Autra.metrics import collect
+    from bestframer.bestframer import get_best_frame
+    from bestframer.sampling import open_capture, iter_sampled_frames
+    from bestframer.scoring import score_frame
+
+    # Untimed first run: imports, detector graphs and the page cache.
+    get_best_frame(path)
+    timings = []
+    frames = 0
+    best_frame = None
+    for _ in range(repeat):
+        with collect() as collector:
+            start = time.perf_counter()
+            _, best_frame = get_best_frame(path)
+            timings.append(time.perf_counter() - start)
+        frames += collector.summary()['counts'].get('frames', 0)
+
+    # Independent of the face model: the sampled frame that scores highest.
+    cap = open_capture(path)
+    scores = [(score_frame(frame) or 0, frame_index) for frame_index, frame in iter_sampled_frames(cap)]
+    cap.release()
+    return {
+        'latency': latency(timings),
+        'throughput': {'frames_per_s': frames / sum(timings)},
+        'fingerprint': {
+            'best_frame': digest(best_frame),
+            'sharpest_frame': max(scores)[1] if scores else None,
+        },
+    }
+
+
+def case_extract_audio(path, repeat):
+    from transcriber.audio import SAMPLE_RATE
+    from transcriber.transcribe import extract_audio_from_video
+
+    extract_audio_from_video(path, 'bench')
+    timings = []
+    audio = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        audio, _ = extract_audio_from_video(path, 'bench')
+        timings.append(time.perf_counter() - start)
+    if audio is None:
+        raise RuntimeError(f"No audio could be extracted from {path}")
+    seconds = len(audio) / SAMPLE_RATE
+    return {
+        'latency': latency(timings),
+        'throughput': {'audio_seconds_per_s': seconds * repeat / sum(timings)},
+        # Rounded so that ffmpeg builds that differ in the last bit still match.
+        'fingerprint': {'samples': len(audio), 'rms': round(float(np.sqrt(np.mean(audio * audio))), 4)},
+    }
+
+
+def case_transcribe(path, repeat, model_name=None, profile=None):
+    import torch
+    from transcriber.audio import SAMPLE_RATE, load_audio
+    from transcriber.transcribe import transcribe_audio_file
+
+    audio = load_audio(path)
+    start = time.perf_counter()
+    # The first call loads the model; it is reported apart from the latencies.
+    transcribe_audio_file(audio, 'bench', model_name, profile=profile)
+    warm_up_s = time.perf_counter() - start
+
+    timings = []
+    text = None
+    for _ in range(repeat):
+        torch.manual_seed(0)
+        start = time.perf_counter()
+        text, _ = transcribe_audio_file(audio, 'bench', model_name, profile=profile)
+        timings.append(time.perf_counter() - start)
+    return {
+        'warm_up_s': warm_up_s,
+        'latency': latency(timings),
+        'throughput': {'audio_seconds_per_s': len(audio) / SAMPLE_RATE * repeat / sum(timings)},
+        'fingerprint': {'text': (text or '').strip()},
+    }
+
+
+def case_combined(path, repeat, profile=None):
+    """The combined job against its frame search and its windowed transcription run alone.
+
+    Every run gets a new content hash so that no result comes from the cache.
+    ``overlap`` is the combined mean over the slower half's mean: about 1
+    when the two halves run side by side, about 2 when one waits for the other.
+    """
+    from Autra.combined import best_frames_and_transcript
+    from bestframer.views import save_best_frames
+    from transcriber.streaming import transcribe_stream
+
+    # Untimed first run: model load and imports.
+    best_frames_and_transcript(path, 'bench', uuid.uuid4().hex, profile=profile)
+    search, transcribe, combined = [], [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        save_best_frames(path, 'bench', uuid.uuid4().hex)
+        search.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in transcribe_stream(path, 'bench', profile=profile):
+            pass
+        transcribe.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        best_frames_and_transcript(path, 'bench', uuid.uuid4().hex, profile=profile)
+        combined.append(time.perf_counter() - start)
+    slower = max(sum(search), sum(transcribe)) / repeat
+    return {
+        'latency': latency(combined),
+        'search_latency': latency(search),
+        'transcribe_latency': latency(transcribe),
+        'overlap': sum(combined) / repeat / slower,
+    }
+
+
+CASES = {
+    'get_best_frame': case_get_best_frame,
+    'extract_audio_from_video': case_extract_audio,
+    'transcribe_audio_file': case_transcribe,
+    'best_frames_and_transcript': case_combined,
+}
+
+
+def _run_case(name, args, queue):
+    import django
+    django.setup()
+    import resource
+    from transcriber.utils import current_rss_bytes
+
+    baseline_rss = current_rss_bytes()
+    try:
+        result = CASES[name](*args)
+    except Exception as e:
+        result = {'error': f"{type(e).__name__}: {e}"}
+    result['baseline_rss_bytes'] = baseline_rss
+    # ru_maxrss is in KiB on Linux; children covers ffmpeg.
+    result['peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    result['peak_child_rss_bytes'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    queue.put(result)
+
+
+def run_case(name, *args, timeout=None):
+    """Run one case in a fresh process, so peak memory is its own and not the suite's.
+
+    A case that crashes its process or runs longer than ``timeout`` seconds
+    (BENCH_CASE_TIMEOUT_SECONDS) is reported with an ``error``.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'BENCH_CASE_TIMEOUT_SECONDS', DEFAULT_CASE_TIMEOUT_SECONDS)
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_case, args=(name, args, queue))
+    process.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=max(0.01, min(1, deadline - time.monotonic())))
+        except Empty:
+            if process.exitcode is not None:
+                # The result may still be on its way through the pipe.
+                try:
+                    result = queue.get(timeout=1)
+                except Empty:
+                    result = {'error': f"The case process exited with code {process.exitcode}"}
+            elif time.monotonic() >= deadline:
+                process.terminate()
+                result = {'error': f"Timed out after {timeout}s"}
+    process.join()
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=settings.BASE_DIR).stdout.strip() or None
+    except OSError:
+        commit = None
+    from bestframer.bestframer import best_frame_params
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'ffmpeg': shutil.which('ffmpeg') is not None,
+        'best_frame_params': best_frame_params(),
+    }
+
+
+def run_suite(resolutions=DEFAULT_RESOLUTIONS, video_seconds=DEFAULT_VIDEO_SECONDS,
+              audio_seconds=DEFAULT_AUDIO_SECONDS, repeat=5, transcribe=True, model_name=None, profile=None,
+              cases=None):
+    """Benchmark the pipelines on generated fixtures and return a JSON-serialisable report.
+
+    Fixtures are generated from a fixed seed the first time and kept under
+    BENCH_FIXTURES_ROOT. Real recordings in TRANSCRIBER_BENCH_SAMPLES are
+    transcribed too when that directory exists. Every case reports latency
+    percentiles, throughput, peak RSS and a ``fingerprint`` of its output
+    that :func:`compare_fingerprints` checks against a baseline. ``cases``
+    names the cases to run, all of them by default.
+    """
+    selected = set(CASES if cases is None else cases)
+    results = []
+
+    def run(name, path, *args):
+        results.append(dict(run_case(name, path, *args), case=name, fixture=os.path.basename(path)))
+
+    video_cases = selected & {'get_best_frame', 'extract_audio_from_video'}
+    if transcribe and shutil.which('ffmpeg') is not None:
+        video_cases |= selected & {'best_frames_and_transcript'}
+    if video_cases:
+        for width, height in resolutions:
+            for seconds in video_seconds:
+                path = video_fixture(width, height, seconds)
+                if 'get_best_frame' in video_cases:
+                    run('get_best_frame', path, repeat)
+                if 'extract_audio_from_video' in video_cases:
+                    run('extract_audio_from_video', path, repeat)
+                if 'best_frames_and_transcript' in video_cases:
+                    run('best_frames_and_transcript', path, repeat, profile)
+
+    if transcribe and 'transcribe_audio_file' in selected:
+        audio_paths = [audio_fixture(seconds) for seconds in audio_seconds]
+        samples = str(getattr(settings, 'TRANSCRIBER_BENCH_SAMPLES', ''))
+        if samples and os.path.isdir(samples):
+            from transcriber.benchmarks import load_samples
+
+            audio_paths += [path for path, _ in load_samples(samples)]
+        for path in audio_paths:
+            run('transcribe_audio_file', path, repeat, model_name, profile)
+
+    return {'environment': environment(), 'repeat': repeat, 'cases': results}
+
+
+def slow_overlaps(report, max_overlap=DEFAULT_MAX_COMBINED_OVERLAP):
+    """Describe every combined case that took longer than ``max_overlap`` times its slower half."""
+    return [f"{case_key(case)}: combined took {case['overlap']:.2f}x the slower of search and transcription"
+            for case in report['cases'] if case.get('overlap', 0) > max_overlap]
+
+
+def case_key(case):
+    return f"{case['case']}:{case['fixture']}"
+
+
+def fingerprints(report):
+    return {case_key(case): case['fingerprint'] for case in report['cases'] if 'fingerprint' in case}
+
+
+def load_baseline(path=None):
+    """The fingerprints at ``path``, by default the BENCH_BASELINE committed with the code."""
+    with open(path or getattr(settings, 'BENCH_BASELINE')) as baseline_file:
+        return json.load(baseline_file)
+
+
+def compare_fingerprints(report, baseline):
+    """Describe every case whose output differs from ``baseline`` (a report or its fingerprints).
+
+    Only the fields a baseline records are compared, so it can pin the outputs
+    that do not depend on an optional model or on the ffmpeg build.
+    """
+    expected = fingerprints(baseline) if 'cases' in baseline else baseline
+    changes = []
+    for case in report['cases']:
+        key = case_key(case)
+        if key not in expected:
+            continue
+        if 'error' in case:
+            changes.append(f"{key}: {case['error']}")
+            continue
+        actual = {field: case['fingerprint'].get(field) for field in expected[key]}
+        if expected[key] != actual:
+            changes.append(f"{key}: {expected[key]} -> {actual}")
+    return changes
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_MAX_AGE_SECONDS = 3 * 24 * 3600
+DEFAULT_EVICT_INTERVAL_SECONDS = 300
+
+
+def save_chunks(chunks, path):
+    """Write ``chunks`` to ``path`` and return their SHA-256, hashed in the same pass."""
+    digest = hashlib.sha256()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb+') as destination:
+        for chunk in chunks:
+            digest.update(chunk)
+            destination.write(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResultCache:
+    """Content-addressed store for finished results under ``root``.
+
+    Entries are keyed by the SHA-256 of the input plus the model and the
+    parameters that affect the output. Reading an entry refreshes its mtime,
+    so eviction drops entries that were not used for ``max_age`` seconds and
+    then the least recently used ones until the cache fits in ``max_bytes``.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE_SECONDS,
+                 evict_interval=DEFAULT_EVICT_INTERVAL_SECONDS):
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evict_interval = evict_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._last_evict = 0
+        self._lock = threading.Lock()
+
+    def key(self, content_hash, **params):
+        payload = json.dumps({'input': content_hash, 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path(self, namespace, key):
+        return os.path.join(self.root, namespace, key[:2], key)
+
+    def get(self, namespace, key):
+        path = self.path(namespace, key)
+        try:
+            with open(path, 'rb') as entry:
+                data = entry.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, namespace, key, data):
+        path = self.path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as entry:
+            entry.write(data)
+        os.replace(temp_path, path)
+        self.maybe_evict()
+        return path
+
+    def maybe_evict(self):
+        if not self.evict_interval:
+            return
+        now = time.time()
+        with self._lock:
+            if now - self._last_evict < self.evict_interval:
+                return
+            self._last_evict = now
+        self.evict()
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            expired = self.max_age and now - mtime > self.max_age
+            if not expired and (not self.max_bytes or total <= self.max_bytes):
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error(f"Error evicting cache entry {path}: {e}")
+                continue
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self.evictions += removed
+        if removed:
+            logger.info(f"Evicted {removed} cached results, {total} bytes left")
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                getattr(settings, 'RESULT_CACHE_ROOT', os.path.join(settings.MEDIA_ROOT, 'cache')),
+                max_bytes=getattr(settings, 'RESULT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+                max_age=getattr(settings, 'RESULT_CACHE_MAX_AGE_SECONDS', DEFAULT_MAX_AGE_SECONDS),
+                evict_interval=getattr(settings, 'RESULT_CACHE_EVICT_INTERVAL_SECONDS',
+                                       DEFAULT_EVICT_INTERVAL_SECONDS),
+            )
+        return _cache
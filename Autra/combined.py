@@ -0,0 +1,302 @@
+import os
+import json
+import queue
+import logging
+import threading
+import subprocess
+import contextvars
+from fractions import Fraction
+from concurrent.futures import ThreadPoolExecutor
+from Autra.artifacts import delete_artifacts
+from Autra.cache import get_cache, hash_file
+from Autra.lazy import lazy_import
+from Autra.metrics import count
+from jobs.queue import JobError
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+
+def probe_streams(path):
+    """Size, frame rate and length of the first video stream of ``path``, and whether it has audio.
+
+    Returns None when ffprobe cannot read the file. Width and height are
+    those of the frames ffmpeg outputs, i.e. after applying the rotation.
+    """
+    command = ['ffprobe', '-v', 'error', '-show_entries',
+               'stream=codec_type,width,height,avg_frame_rate,nb_frames:stream_tags=rotate'
+               ':stream_side_data=rotation:format=duration', '-of', 'json', path]
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        probe = json.loads(output)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+    streams = probe.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+    info = {
+        'video': video is not None,
+        'audio': any(stream.get('codec_type') == 'audio' for stream in streams),
+        'duration': float(probe.get('format', {}).get('duration') or 0) or None,
+    }
+    if video is None:
+        return info
+
+    from bestframer.sampling import DEFAULT_FPS
+
+    try:
+        fps = float(Fraction(video.get('avg_frame_rate') or '0'))
+    except (ValueError, ZeroDivisionError):
+        fps = 0
+    fps = fps or DEFAULT_FPS
+    rotation = video.get('tags', {}).get('rotate') or next(
+        (side_data['rotation'] for side_data in video.get('side_data_list', []) if 'rotation' in side_data), 0)
+    width, height = video['width'], video['height']
+    if int(float(rotation)) % 180:
+        width, height = height, width
+    frame_count = int(video.get('nb_frames') or 0) or int((info['duration'] or 0) * fps)
+    info.update(width=width, height=height, fps=fps, frame_count=frame_count)
+    return info
+
+
+def demux_command(path, step, max_samples, video_fd, audio):
+    # select keeps every step-th decoded frame, the frames the grab sampler would keep;
+    # passthrough stops the rawvideo muxer from duplicating frames back to a constant rate.
+    command = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-threads', '0', '-i', path,
+               '-map', '0:v:0', '-vf', f"select='not(mod(n,{step}))'", '-vsync', 'passthrough']
+    if max_samples:
+        command += ['-frames:v', str(max_samples)]
+    command += ['-f', 'rawvideo', '-pix_fmt', 'bgr24', f"pipe:{video_fd}"]
+    if audio:
+        from transcriber.audio import SAMPLE_RATE
+
+        command += ['-map', '0:a:0', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE),
+                    '-f', 's16le', 'pipe:1']
+    return command
+
+
+class PipeCapture:
+    """VideoCapture stand-in reading the raw BGR frames a :class:`Demux` writes to a pipe.
+
+    Only sampled frames reach the pipe, so it reports their rate as its FPS
+    and no frame count: the samplers then read every frame in order and
+    never seek.
+    """
+
+    def __init__(self, stream, width, height, fps):
+        self.stream = stream
+        self.shape = (height, width, 3)
+        self.fps = fps
+        self.frame = None
+
+    def isOpened(self):
+        return not self.stream.closed
+
+    def grab(self):
+        self.frame = None
+        if self.stream.closed:
+            return False
+        frame = np.empty(self.shape, dtype=np.uint8)
+        view = memoryview(frame).cast('B')
+        filled = 0
+        while filled < len(view):
+            read = self.stream.readinto(view[filled:])
+            if not read:
+                return False
+            filled += read
+        self.frame = frame
+        return True
+
+    def retrieve(self):
+        return self.frame is not None, self.frame
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        # ffmpeg writes both pipes in step, so frames left unread would stall the audio.
+        if not self.stream.closed:
+            while self.stream.read(1024 * 1024):
+                pass
+            self.stream.close()
+
+
+class Demux:
+    """One ffmpeg process that reads ``path`` once and writes its sampled video frames
+    to :attr:`capture` and its audio, as 16 kHz mono PCM, to :meth:`audio_blocks`.
+
+    ffmpeg writes both pipes in step, so a thread drains the audio pipe as
+    fast as it fills: only the frame search paces the demux, and audio that
+    is not transcribed yet waits in memory, never in the pipe.
+    """
+
+    def __init__(self, path, info, samples_per_second=None, max_samples=None):
+        from bestframer.sampling import get_sampling_options, sampling_step
+
+        samples_per_second, max_samples, _ = get_sampling_options(samples_per_second, max_samples)
+        step = sampling_step(info['fps'], info['frame_count'], samples_per_second, max_samples)
+        self.path = path
+        self.duration = info['duration']
+        read_fd, write_fd = os.pipe()
+        try:
+            self.process = subprocess.Popen(demux_command(path, step, max_samples, write_fd, info['audio']),
+                                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds=(write_fd,))
+        except OSError:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        self.capture = PipeCapture(os.fdopen(read_fd, 'rb'), info['width'], info['height'], info['fps'] / step)
+        self.audio = queue.Queue()
+        self.reader = threading.Thread(target=self._read_audio, name='combined-audio', daemon=True)
+        self.reader.start()
+
+    def _read_audio(self):
+        from transcriber.audio import iter_pcm_blocks
+
+        try:
+            for block in iter_pcm_blocks(self.process.stdout, block_seconds=1):
+                self.audio.put(block)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading the audio of {self.path}: {e}")
+        finally:
+            self.audio.put(None)
+
+    def audio_blocks(self):
+        """Yield the audio as float32 blocks of about a second, as soon as ffmpeg has decoded them."""
+        while True:
+            block = self.audio.get()
+            if block is None:
+                return
+            yield block
+
+    def wait(self):
+        stderr = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to demux {self.path}: {stderr.decode(errors='replace').strip()}")
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.reader.join()
+        self.process.stdout.close()
+        self.process.stderr.close()
+
+
+def best_frames_and_transcript(path, name, content_hash, top_n=1, backend=None, profile=None):
+    """Find the best frames of the video at ``path`` and transcribe its audio from a single demux.
+
+    The frame search reads the sampled frames on a second thread while this
+    one transcribes the audio window by window as it arrives (see
+    :func:`transcriber.streaming.transcribe_blocks`), so the whole takes about
+    as long as the slower of the two. Returns ``((best_frames, error), (text,
+    transcript))`` as ``save_best_frames`` and ``transcribe_audio_file``
+    do. When one result is already cached, or ffprobe cannot find both
+    streams, the two run one after the other on their usual paths.
+    """
+    from bestframer.views import save_best_frames, best_frames_cache_key
+    from transcriber.transcribe import cached_transcription, transcribe_audio_file, extract_audio_from_video
+
+    frames_cached = get_cache().get('best_frames', best_frames_cache_key(content_hash, top_n, backend)) is not None
+    transcription = cached_transcription(content_hash, name, profile=profile)
+    info = None if frames_cached or transcription[0] is not None else probe_streams(path)
+    if not info or not info['video'] or not info['audio']:
+        frames = save_best_frames(path, name, content_hash, top_n, backend)
+        if transcription[0] is None:
+            audio, _ = extract_audio_from_video(path, name)
+            if audio is not None:
+                transcription = transcribe_audio_file(audio, name, content_hash=content_hash, profile=profile)
+        return frames, transcription
+
+    count('bytes_read', os.path.getsize(path))
+    demux = Demux(path, info)
+
+    def search():
+        try:
+            return save_best_frames(path, name, content_hash, top_n, backend, capture=demux.capture)
+        finally:
+            demux.capture.release()
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='combined-frames')
+    try:
+        # The copied context carries the metrics collector of this job over to the search thread.
+        frames_future = executor.submit(contextvars.copy_context().run, search)
+        transcription = transcribe_demuxed(demux, name, content_hash, profile)
+        frames = frames_future.result()
+    finally:
+        # Killing ffmpeg first ends the frame pipe, so the search thread cannot be left waiting on it.
+        demux.close()
+        executor.shutdown()
+    return frames, transcription
+
+
+def transcribe_demuxed(demux, name, content_hash, profile=None):
+    """Transcribe the audio of ``demux`` while it is being decoded and cache the text as the
+    transcribe jobs do; returns ``(text, transcript)``, ``(None, None)`` when it failed.
+    """
+    from transcriber.streaming import transcribe_blocks
+    from transcriber.transcribe import save_text_to_file, transcript_params, transcript_cache_key
+
+    transcript = save_text_to_file('', name, content_hash, params=transcript_params(profile=profile))
+    if transcript is None:
+        return None, None
+    try:
+        segments = list(transcribe_blocks(demux.audio_blocks(), name, profile=profile, transcript=transcript,
+                                          duration=demux.duration))
+        demux.wait()
+    except Exception as e:
+        logger.error(f"Error during transcription: {e}")
+        # The text file was written as the windows came in; nothing may download a partial one.
+        delete_artifacts([transcript])
+        return None, None
+    transcription_text = ' '.join(segment['text'] for segment in segments)
+    get_cache().put('transcripts', transcript_cache_key(content_hash, profile=profile), transcription_text.encode())
+    return transcription_text, transcript
+
+
+def analyze(job):
+    """Job handler: best frames and transcript of one uploaded video.
+
+    The result holds the fields of both the bestframe and the transcribe
+    results; a side that failed is reported in ``errors`` instead, and the
+    job only fails when both did.
+    """
+    from bestframer.tasks import best_frames_result
+    from transcriber.tasks import transcription_result
+
+    path = job.params['path']
+    name = job.params['name']
+    try:
+        content_hash = job.params.get('content_hash') or hash_file(path)
+        (frames, error), (transcription_text, transcript) = best_frames_and_transcript(
+            path, name, content_hash, job.params.get('top_n', 1), job.params.get('backend'),
+            job.params.get('profile'))
+    finally:
+        if job.params.get('remove_input') and os.path.exists(path):
+            os.remove(path)
+
+    result = {'errors': {}}
+    try:
+        result.update(best_frames_result(frames, error))
+    except JobError as e:
+        result['errors']['best_frame'] = str(e)
+    if transcription_text is None:
+        result['errors']['transcription'] = "Error during transcription."
+    else:
+        result.update(transcription_result(transcription_text, transcript, None))
+    if len(result['errors']) == 2:
+        raise JobError(f"{result['errors']['best_frame']} {result['errors']['transcription']}")
+    return result
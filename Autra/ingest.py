@@ -0,0 +1,322 @@
+import io
+import os
+import json
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from .cache import save_chunks, hash_text
+from .lazy import lazy_import
+from .metrics import count
+
+requests = lazy_import('requests')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_CHUNK_BYTES = 1024 * 1024
+DEFAULT_BUFFER_BYTES = 16 * 1024 * 1024
+DEFAULT_POOL_SIZE = 10
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_io_executor = None
+
+
+def get_timeout():
+    return (getattr(settings, 'INGEST_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+            getattr(settings, 'INGEST_READ_TIMEOUT', DEFAULT_READ_TIMEOUT))
+
+
+def get_chunk_bytes():
+    return getattr(settings, 'INGEST_CHUNK_BYTES', DEFAULT_CHUNK_BYTES)
+
+
+def get_session():
+    """Process-wide HTTP session whose connection pool is shared by every download."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            from requests.adapters import HTTPAdapter
+
+            pool_size = getattr(settings, 'INGEST_POOL_SIZE', DEFAULT_POOL_SIZE)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+            _session_pid = os.getpid()
+        return _session
+
+
+def get_io_executor():
+    """Threads that run blocking HTTP calls for async views, one per pooled connection."""
+    global _io_executor
+    with _session_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'INGEST_POOL_SIZE', DEFAULT_POOL_SIZE),
+                                              thread_name_prefix='ingest')
+        return _io_executor
+
+
+async def run_io(fn, *args):
+    """Await ``fn(*args)``, a call doing network I/O through :func:`get_session`, from async code.
+
+    It runs on the ingest threads so the event loop keeps serving other
+    requests meanwhile; the metrics collector of the caller goes along.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_io_executor(), context.run, fn, *args)
+
+
+def download(url, path, validate=None, session=None):
+    """Stream ``url`` to ``path`` and return its SHA-256, or None when the response is refused.
+
+    ``validate(response)`` can reject a response from its status and headers
+    before any byte is written.
+    """
+    session = session or get_session()
+    with session.get(url, stream=True, timeout=get_timeout()) as response:
+        if response.status_code != 200 or (validate is not None and not validate(response)):
+            return None
+
+        def chunks():
+            for chunk in response.iter_content(get_chunk_bytes()):
+                count('bytes_fetched', len(chunk))
+                yield chunk
+
+        return save_chunks(chunks(), path)
+
+
+def remote_content_hash(url, session=None):
+    """Cache key for what ``url`` serves now, without downloading it.
+
+    Combines the URL with the ETag, Last-Modified and Content-Length the
+    server reports, so the key changes with the content. None when the server
+    reports neither an ETag nor a Last-Modified (or cannot be reached), as a
+    change could then go unnoticed and the result must not be cached.
+    """
+    session = session or get_session()
+    try:
+        with session.head(url, allow_redirects=True, timeout=get_timeout()) as response:
+            headers = response.headers if response.ok else None
+        if headers is None:
+            # Some servers (e.g. presigned object storage URLs) only answer GET.
+            with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=get_timeout()) as response:
+                headers = response.headers if response.ok else {}
+    except (Exception,) as e:
+        logger.error(f"Error checking {url}: {e}")
+        return None
+    validators = {name: headers.get(name) for name in ('ETag', 'Last-Modified', 'Content-Length', 'Content-Range')}
+    if not validators['ETag'] and not validators['Last-Modified']:
+        return None
+    return hash_text(json.dumps({'url': url, 'validators': validators}, sort_keys=True))
+
+
+class RingBuffer:
+    """Fixed-size window over a byte stream, addressed by absolute stream offsets.
+
+    Holds the bytes in ``[start, end)``. Writes append at ``end`` and may only
+    overwrite bytes before ``keep_from`` (the reader position), so unread
+    bytes are never lost; already-read bytes stay around for short back-seeks
+    until the space is needed.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = bytearray(capacity)
+        self.reset(0)
+
+    def reset(self, offset):
+        self.start = offset
+        self.end = offset
+
+    def writable(self, keep_from):
+        return self.capacity - (self.end - max(self.start, min(keep_from, self.end)))
+
+    def write(self, chunk, keep_from):
+        size = min(len(chunk), self.writable(keep_from))
+        if size <= 0:
+            return 0
+        self.start = max(self.start, self.end + size - self.capacity)
+        position = self.end % self.capacity
+        first = min(size, self.capacity - position)
+        self.data[position:position + first] = chunk[:first]
+        self.data[:size - first] = chunk[first:size]
+        self.end += size
+        return size
+
+    def read(self, offset, size):
+        size = min(size, self.end - offset)
+        position = offset % self.capacity
+        first = min(size, self.capacity - position)
+        return bytes(self.data[position:position + first]) + bytes(self.data[:size - first])
+
+
+class RemoteFile(io.BufferedIOBase):
+    """Seekable, read-only file over HTTP.
+
+    A background thread streams the file from the current position with a
+    single Range request into a bounded :class:`RingBuffer`, so the decoder
+    reads bytes while later ones are still arriving. Seeking outside the
+    buffered window (or far ahead of it) aborts that request and opens a new
+    one at the target, so a sampler that seeks only downloads the ranges it
+    reads. Servers without Range support are streamed from the start and the
+    bytes before the target are skipped.
+    """
+
+    def __init__(self, url, session=None, chunk_bytes=None, buffer_bytes=None, timeout=None):
+        super().__init__()
+        self.url = url
+        self.session = session or get_session()
+        self.chunk_bytes = chunk_bytes or get_chunk_bytes()
+        self.timeout = timeout or get_timeout()
+        buffer_bytes = buffer_bytes or getattr(settings, 'INGEST_BUFFER_BYTES', DEFAULT_BUFFER_BYTES)
+        self.ring = RingBuffer(max(buffer_bytes, 2 * self.chunk_bytes))
+        self.position = 0
+        self.requests = 0
+        self.bytes_fetched = 0
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._eof = False
+        self._error = None
+        self._stalled = False
+
+        self.size, self.ranges = self._probe()
+        self._restart(0)
+
+    def _probe(self):
+        with self.session.head(self.url, allow_redirects=True, timeout=self.timeout) as response:
+            if response.ok and 'Content-Length' in response.headers:
+                return (int(response.headers['Content-Length']),
+                        response.headers.get('Accept-Ranges', '').lower() == 'bytes')
+        # Some servers (e.g. presigned object storage URLs) only answer GET.
+        with self.session.get(self.url, headers={'Range': 'bytes=0-0'}, stream=True,
+                              timeout=self.timeout) as response:
+            response.raise_for_status()
+            if response.status_code == 206 and '/' in response.headers.get('Content-Range', ''):
+                total = response.headers['Content-Range'].rsplit('/', 1)[1]
+                return (int(total) if total.isdigit() else None), True
+            length = response.headers.get('Content-Length')
+            return (int(length) if length else None), False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            if self.size is None:
+                raise io.UnsupportedOperation("Remote file size is unknown")
+            offset += self.size
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self.position = offset
+        return self.position
+
+    def _restart(self, offset):
+        self._generation += 1
+        self._eof = False
+        self._error = None
+        self._stalled = False
+        self.ring.reset(offset)
+        thread = threading.Thread(target=self._fill, args=(self._generation, offset), daemon=True)
+        thread.start()
+
+    def _fill(self, generation, offset):
+        headers = {'Range': f"bytes={offset}-"} if offset else {}
+        try:
+            with self.session.get(self.url, headers=headers, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                skip = offset if response.status_code != 206 else 0
+                with self._condition:
+                    self.requests += 1
+                for chunk in response.iter_content(self.chunk_bytes):
+                    if skip:
+                        dropped = min(skip, len(chunk))
+                        chunk, skip = chunk[dropped:], skip - dropped
+                    while chunk:
+                        with self._condition:
+                            while generation == self._generation and not self.ring.writable(self.position):
+                                if not self._condition.wait(self.timeout[1]):
+                                    logger.info(f"Stopped prefetching idle stream {self.url}")
+                                    self._stalled = True
+                                    return
+                            if generation != self._generation:
+                                return
+                            written = self.ring.write(chunk, self.position)
+                            self.bytes_fetched += written
+                            self._condition.notify_all()
+                        chunk = chunk[written:]
+            with self._condition:
+                if generation == self._generation:
+                    self._eof = True
+                    self._condition.notify_all()
+        except (Exception,) as e:
+            with self._condition:
+                if generation == self._generation:
+                    self._error = e
+                    self._condition.notify_all()
+
+    def read1(self, size=-1):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        if size is None or size < 0:
+            size = self.chunk_bytes
+        if self.size is not None and self.position >= self.size:
+            return b''
+
+        with self._condition:
+            ring = self.ring
+            # Restart when the target fell out of the window or is further ahead
+            # than the buffer would fill before getting there.
+            if self.position < ring.start or self.position > ring.end + ring.capacity or self._stalled:
+                self._restart(self.position)
+            while ring.end <= self.position and not self._eof and self._error is None:
+                # Let the producer overwrite everything before the target.
+                self._condition.notify_all()
+                self._condition.wait(self.timeout[1])
+                if self.position < ring.start:
+                    self._restart(self.position)
+            if self._error is not None and ring.end <= self.position:
+                raise IOError(f"Error reading {self.url}: {self._error}")
+            if ring.end <= self.position:
+                return b''
+            data = ring.read(self.position, size)
+            self.position += len(data)
+            self._condition.notify_all()
+            return data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b''.join(iter(self.read1, b''))
+        parts = []
+        while size > 0:
+            data = self.read1(size)
+            if not data:
+                break
+            parts.append(data)
+            size -= len(data)
+        return b''.join(parts)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+        super().close()
@@ -0,0 +1,68 @@
+import time
+import logging
+import importlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+_modules = {}
+_modules_lock = threading.Lock()
+_import_seconds = {}
+
+
+class LazyModule:
+    """Stand-in for a module that is only imported when one of its attributes is used.
+
+    Attributes are copied onto the proxy after the first lookup, so hot loops
+    pay the indirection once per name rather than once per call.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    seconds = time.perf_counter() - start
+                    _import_seconds[self._name] = seconds
+                    logger.info(f"Imported {self._name} in {seconds:.2f}s")
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, name):
+        value = getattr(self._load(), name)
+        self.__dict__[name] = value
+        return value
+
+    def __repr__(self):
+        state = 'not loaded' if self._module is None else 'loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    with _modules_lock:
+        module = _modules.get(name)
+        if module is None:
+            module = LazyModule(name)
+            _modules[name] = module
+        return module
+
+
+def load(name):
+    """Import ``name`` now and return the real module."""
+    return lazy_import(name)._load()
+
+
+def is_loaded(name):
+    module = _modules.get(name)
+    return module is not None and module._module is not None
+
+
+def import_times():
+    """Seconds spent importing each lazy module loaded so far in this process."""
+    return dict(_import_seconds)
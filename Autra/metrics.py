@@ -0,0 +1,160 @@
+import time
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the stage histograms; per-frame stages fall in the
+# first buckets, model loads and whole transcriptions in the last ones.
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class Collector:
+    """Stage timings (as histograms), counters and peaks (the largest value reported).
+
+    One instance holds the process totals served by ``/metrics``; others
+    collect what a single request or job did. A snapshot is a plain dict so
+    it can come back from a worker process and be merged.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counts = defaultdict(float)
+        self.peaks = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = {'buckets': [0] * (len(STAGE_BUCKETS) + 1), 'seconds': 0.0, 'calls': 0}
+            entry['buckets'][bisect_left(STAGE_BUCKETS, seconds)] += 1
+            entry['seconds'] += seconds
+            entry['calls'] += 1
+
+    def add(self, name, value):
+        with self.lock:
+            self.counts[name] += value
+
+    def raise_peak(self, name, value):
+        with self.lock:
+            self.peaks[name] = max(self.peaks.get(name, value), value)
+
+    def merge(self, snapshot):
+        with self.lock:
+            for stage, other in snapshot['stages'].items():
+                entry = self.stages.get(stage)
+                if entry is None:
+                    entry = self.stages[stage] = {'buckets': [0] * (len(STAGE_BUCKETS) + 1), 'seconds': 0.0,
+                                                  'calls': 0}
+                entry['buckets'] = [a + b for a, b in zip(entry['buckets'], other['buckets'])]
+                entry['seconds'] += other['seconds']
+                entry['calls'] += other['calls']
+            for name, value in snapshot['counts'].items():
+                self.counts[name] += value
+            for name, value in snapshot.get('peaks', {}).items():
+                self.peaks[name] = max(self.peaks.get(name, value), value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'stages': {stage: dict(entry, buckets=list(entry['buckets'])) for stage, entry in self.stages.items()},
+                'counts': dict(self.counts),
+                'peaks': dict(self.peaks),
+            }
+
+    def summary(self):
+        """Seconds and calls per stage plus the counters and peaks, for logs."""
+        with self.lock:
+            return {
+                'stages': {stage: {'seconds': round(entry['seconds'], 4), 'calls': entry['calls']}
+                           for stage, entry in self.stages.items()},
+                'counts': dict(self.counts),
+                'peaks': dict(self.peaks),
+            }
+
+
+_totals = Collector()
+_current = contextvars.ContextVar('metrics_collector', default=None)
+
+
+def observe(stage, seconds):
+    _totals.observe(stage, seconds)
+    collector = _current.get()
+    if collector is not None:
+        collector.observe(stage, seconds)
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def count(name, value=1):
+    _totals.add(name, value)
+    collector = _current.get()
+    if collector is not None:
+        collector.add(name, value)
+
+
+def peak(name, value):
+    _totals.raise_peak(name, value)
+    collector = _current.get()
+    if collector is not None:
+        collector.raise_peak(name, value)
+
+
+def merge(snapshot):
+    """Add a snapshot taken in another process to the totals and the current collector."""
+    if not snapshot:
+        return
+    _totals.merge(snapshot)
+    collector = _current.get()
+    if collector is not None:
+        collector.merge(snapshot)
+
+
+@contextmanager
+def collect():
+    """Collect the stages and counters recorded by this thread into a new Collector.
+
+    Context variables are not passed to executor threads, so work handed to
+    another thread has to open its own ``collect()``.
+    """
+    collector = Collector()
+    token = _current.set(collector)
+    try:
+        yield collector
+    finally:
+        _current.reset(token)
+
+
+def render(prefix='autra'):
+    """The process totals in the Prometheus text exposition format."""
+    snapshot = _totals.snapshot()
+    lines = [
+        f"# HELP {prefix}_stage_seconds Time spent in each pipeline stage.",
+        f"# TYPE {prefix}_stage_seconds histogram",
+    ]
+    for stage, entry in sorted(snapshot['stages'].items()):
+        cumulative = 0
+        for bound, bucket in zip(STAGE_BUCKETS + ('+Inf',), entry['buckets']):
+            cumulative += bucket
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {entry["seconds"]}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {entry["calls"]}')
+    for name, value in sorted(snapshot['counts'].items()):
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.append(f"{prefix}_{name}_total {value}")
+    for name, value in sorted(snapshot['peaks'].items()):
+        lines.append(f"# TYPE {prefix}_{name}_peak gauge")
+        lines.append(f"{prefix}_{name}_peak {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,113 @@
+import io
+import time
+import logging
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from .metrics import collect, count
+
+logger = logging.getLogger('Autra.metrics')
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+
+def requested_profiler(request):
+    if not getattr(settings, 'METRICS_PROFILING', settings.DEBUG):
+        return None
+    profiler = request.GET.get('profile') or request.headers.get('X-Profile')
+    if profiler in ('1', 'true'):
+        profiler = 'cprofile'
+    return profiler if profiler in PROFILERS else None
+
+
+@contextmanager
+def profiling(profiler):
+    """Profile the enclosed code with ``profiler``; the text report is put in the yielded dict.
+
+    Only the request thread is profiled: work handed to job workers, and the
+    body of a streaming response, run outside of it. Under ASGI the thread is
+    the event loop's, so cProfile also sees the other requests it serves
+    meanwhile; pyinstrument only follows the profiled one.
+    """
+    result = {}
+    if profiler == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        profile = Profiler()
+        profile.start()
+        try:
+            yield result
+        finally:
+            profile.stop()
+            result['report'] = profile.output_text(unicode=True)
+        return
+
+    import cProfile
+    import pstats
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield result
+    finally:
+        profile.disable()
+        report = io.StringIO()
+        stats = pstats.Stats(profile, stream=report)
+        stats.sort_stats('cumulative').print_stats(getattr(settings, 'METRICS_PROFILE_LINES', 40))
+        result['report'] = report.getvalue()
+
+
+class MetricsMiddleware:
+    """Collects the stage timings of each request and logs them with its frame and byte counts.
+
+    With METRICS_PROFILING on, ``?profile=cprofile`` (or ``pyinstrument``, or
+    an ``X-Profile`` header) replaces the response with a profile of the view.
+    Works in both the sync and the async request path.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        profiler = requested_profiler(request)
+        with collect() as collector:
+            if profiler:
+                with profiling(profiler) as profile:
+                    response = self.get_response(request)
+            else:
+                response = self.get_response(request)
+        return self.finish(request, response, collector, start, profile['report'] if profiler else None)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        profiler = requested_profiler(request)
+        with collect() as collector:
+            if profiler:
+                with profiling(profiler) as profile:
+                    response = await self.get_response(request)
+            else:
+                response = await self.get_response(request)
+        return self.finish(request, response, collector, start, profile['report'] if profiler else None)
+
+    def finish(self, request, response, collector, start, report):
+        seconds = time.perf_counter() - start
+        count('requests')
+
+        summary = collector.summary()
+        if summary['stages'] or summary['counts'] or summary['peaks']:
+            logger.info(f"{request.method} {request.path} {response.status_code} in {seconds:.3f}s: {summary}",
+                        extra={'metrics': summary, 'path': request.path, 'seconds': seconds})
+        if report is not None:
+            profiled = HttpResponse(report, content_type='text/plain')
+            profiled['X-Profiled-Status'] = str(response.status_code)
+            return profiled
+        return response
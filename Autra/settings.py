@@ -27,10 +27,12 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'transcriber',
     'bestframer',
+    'jobs',
 
 ]
 
 MIDDLEWARE = [
+    'Autra.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,6 +70,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Background job threads write to the same file as requests.
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -114,3 +118,237 @@ MEDIA_URL = '/media/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Best frame extraction
+
+# Face backend used when a request does not pick one, and the backends requests may pick.
+# Each entry is the dotted path of a bestframer.backends.FaceBackend subclass.
+BESTFRAMER_BACKEND = 'mediapipe'
+BESTFRAMER_BACKENDS = {
+    'mediapipe': 'bestframer.backends.MediaPipeBackend',
+    'dlib': 'bestframer.backends.DlibBackend',
+}
+BESTFRAMER_DLIB_PREDICTOR = MEDIA_ROOT / 'dependencies/shape_predictor_68_face_landmarks.dat'
+BESTFRAMER_HAAR_CASCADE = MEDIA_ROOT / 'cascades/haarcascade_frontalface_default.xml'
+
+# MediaPipe graphs kept per worker process; one graph serves one thread at a time.
+BESTFRAMER_DETECTOR_POOL_SIZE = 2
+
+# Face detection and landmarks run on a copy of each frame whose longest side is at most
+# this many pixels (None keeps the source size); crops are still cut from the original frame.
+BESTFRAMER_DETECTION_MAX_SIDE = 640
+
+# Bytes one best frame search may hold in decoded frames and scratch buffers. Frames that
+# would not fit are scored downscaled; the peak is reported as the frame_bytes metric.
+BESTFRAMER_MEMORY_LIMIT_BYTES = 128 * 1024 * 1024
+
+# Load and run the default backend's models once when a gunicorn worker boots (see gunicorn.conf.py).
+BESTFRAMER_WARM_UP_DETECTORS = True
+
+# Frames scored per second of video, and an optional cap on the total number of samples.
+BESTFRAMER_SAMPLES_PER_SECOND = 4
+BESTFRAMER_MAX_SAMPLES = None
+
+# 'grab' decodes skipped frames without converting them, 'seek' jumps to each sample,
+# 'auto' seeks once samples are at least BESTFRAMER_SEEK_MIN_STEP frames apart.
+BESTFRAMER_SAMPLING_MODE = 'auto'
+BESTFRAMER_SEEK_MIN_STEP = 30
+
+# 'exhaustive' validates every sample; 'two_pass' ranks downscaled samples first and
+# only runs landmark validation on the TOP_K best candidates at full resolution;
+# 'tracking' runs the face mesh once and follows the eye and mouth landmarks with optical flow;
+# 'shots' validates only the best few samples of each shot.
+BESTFRAMER_SEARCH = 'exhaustive'
+BESTFRAMER_TWO_PASS_TOP_K = 8
+BESTFRAMER_TWO_PASS_COARSE_WIDTH = 160
+
+# A new shot starts when the luminance histograms of consecutive samples are further apart
+# than SHOT_CUT_THRESHOLD (Bhattacharyya distance). Shot search validates up to
+# SHOT_CANDIDATES samples per shot; the API returns the best frame of up to MAX_TOP_N shots.
+BESTFRAMER_SHOT_CUT_THRESHOLD = 0.3
+BESTFRAMER_SHOT_CANDIDATES = 3
+BESTFRAMER_MAX_TOP_N = 10
+
+# Tracking re-runs the face mesh every REDETECT_INTERVAL samples, after a shot cut, or when
+# the forward-backward flow error exceeds MAX_ERROR pixels.
+BESTFRAMER_TRACKING_REDETECT_INTERVAL = 25
+BESTFRAMER_TRACKING_MAX_ERROR = 1.5
+
+# Processes used to scan one video in parallel time segments (1 disables, 0 uses every core).
+# Clips shorter than two segments of BESTFRAMER_PARALLEL_MIN_SEGMENT_SECONDS are scanned serially.
+BESTFRAMER_PARALLEL_WORKERS = 1
+BESTFRAMER_PARALLEL_MIN_SEGMENT_SECONDS = 10
+
+
+# Background jobs
+
+# Dotted paths of the functions that run each job kind.
+JOBS_HANDLERS = {
+    'bestframe': 'bestframer.tasks.find_best_frame',
+    'transcribe': 'transcriber.tasks.transcribe',
+    'analyze': 'Autra.combined.analyze',
+}
+
+# Jobs of one kind that may run at the same time in a process.
+JOBS_CONCURRENCY = {
+    'bestframe': 2,
+    'transcribe': 1,
+    'analyze': 1,
+}
+JOBS_DEFAULT_CONCURRENCY = 1
+
+# Async views run their work on the same workers, but answer 429 (with Retry-After) once
+# MAX_QUEUED requests of a kind are already waiting for one. These views hold no thread
+# while they wait since the app is served over ASGI (Autra.asgi on gunicorn with
+# uvicorn.workers.UvicornWorker, see the procfile).
+JOBS_MAX_QUEUED = {
+    'bestframe': 8,
+    'transcribe': 4,
+}
+JOBS_DEFAULT_MAX_QUEUED = 8
+JOBS_RETRY_AFTER = 5
+
+# Run submitted jobs on worker threads of the web process. Set to False to leave them
+# queued in the database for `manage.py runjobs`.
+JOBS_RUN_IN_PROCESS = True
+# A running job marks itself alive every JOBS_HEARTBEAT_SECONDS. Jobs still RUNNING without
+# a heartbeat for JOBS_STALE_SECONDS were left behind by a process that died and are queued
+# again, up to JOBS_MAX_ATTEMPTS runs in all. Each web worker also resumes the queued jobs
+# when it starts.
+JOBS_HEARTBEAT_SECONDS = 30
+JOBS_STALE_SECONDS = 5 * 60
+JOBS_MAX_ATTEMPTS = 2
+
+# Batch endpoints and `manage.py batch` run their items on the same job workers, without
+# Job rows. These functions turn one URL or file of a batch into the params of its job.
+JOBS_BATCH_PARAMS = {
+    'bestframe': 'bestframer.tasks.batch_params',
+    'transcribe': 'transcriber.tasks.batch_params',
+}
+JOBS_BATCH_MAX_ITEMS = 100
+
+
+# Transcription
+
+# Whisper model used when a request does not ask for one, and the sizes a request may use.
+TRANSCRIBER_MODEL = 'medium'
+TRANSCRIBER_ENABLED_MODELS = ['tiny', 'base', 'small', 'medium']
+
+# Upper bound on the weights kept loaded per process; least recently used models are
+# dropped first, before the next model is loaded. None keeps every model that has been loaded.
+TRANSCRIBER_MODEL_CACHE_BYTES = None
+
+# Models loaded when a gunicorn worker or runjobs starts, before the first request,
+# e.g. ['medium']. Other management commands never load them.
+TRANSCRIBER_PRELOAD_MODELS = []
+
+# Streaming transcription: window length, how far back from a window end to look for a
+# silence to cut at, the shortest pause that counts, and its RMS level (audio in [-1, 1]).
+TRANSCRIBER_STREAM_WINDOW_SECONDS = 30
+TRANSCRIBER_STREAM_SILENCE_SEARCH_SECONDS = 5
+TRANSCRIBER_STREAM_MIN_SILENCE_SECONDS = 0.3
+TRANSCRIBER_STREAM_SILENCE_THRESHOLD = 0.01
+
+# Inference profiles a request may pick, and the one used when it does not.
+#   quantize: int8 dynamic quantization of the Linear layers (CPU), loaded as '<model>:int8'
+#   language: decode in this language instead of detecting it on every file
+#   beam_size: beam search width; None decodes greedily
+#   threads: torch CPU threads (process-wide); None keeps torch's default
+#   vad: cut long silences out before decoding (not applied to streaming)
+TRANSCRIBER_PROFILE = 'default'
+TRANSCRIBER_PROFILES = {
+    'default': {},
+    'fast': {'quantize': True, 'vad': True},
+    'accurate': {'beam_size': 5},
+}
+
+# Silence removal of the VAD pre-pass: RMS level below which a 30 ms frame is silent,
+# shortest silence that is cut, and how much of it is kept next to the speech.
+TRANSCRIBER_VAD_THRESHOLD = 0.01
+TRANSCRIBER_VAD_MIN_SILENCE_SECONDS = 0.5
+TRANSCRIBER_VAD_PAD_SECONDS = 0.2
+
+# Speed/WER benchmark samples (`manage.py bench_transcriber --profiles`): audio files
+# with a reference transcript next to each one, as NAME.txt.
+TRANSCRIBER_BENCH_SAMPLES = MEDIA_ROOT / 'samples' / 'transcriber'
+
+# Generated fixtures of `manage.py bench_suite`, written once from a fixed seed and reused.
+BENCH_FIXTURES_ROOT = MEDIA_ROOT / 'bench'
+# Output fingerprints the suite is checked against by default; refresh it with
+# `manage.py bench_suite --save-baseline` when an output is meant to change.
+BENCH_BASELINE = BASE_DIR / 'Autra' / 'bench_baseline.json'
+# A case still running after this long is stopped and reported as an error.
+BENCH_CASE_TIMEOUT_SECONDS = 30 * 60
+
+
+# Result cache
+
+# Finished transcripts and best frames, keyed by the SHA-256 of the input plus the model
+# and parameters. Entries unused for MAX_AGE are dropped, then the least recently used
+# ones until the cache fits in MAX_BYTES. `manage.py evict_artifacts` evicts the cache;
+# with an interval set, writes also do it at most once per interval.
+RESULT_CACHE_ROOT = MEDIA_ROOT / 'cache'
+RESULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+RESULT_CACHE_MAX_AGE_SECONDS = 3 * 24 * 3600
+RESULT_CACHE_EVICT_INTERVAL_SECONDS = None
+
+# Result files
+# Saved best frames, transcripts and kept audio are recorded in the database (see
+# Autra/artifacts.py) and downloaded by id. `manage.py evict_artifacts`, run periodically
+# (cron, a systemd timer or with --interval), drops the files not downloaded for MAX_AGE
+# and then the least recently downloaded ones until all of them fit in MAX_BYTES.
+ARTIFACTS_MAX_AGE_SECONDS = 7 * 24 * 3600
+ARTIFACTS_MAX_BYTES = 5 * 1024 ** 3
+
+# Uploads
+# Uploaded files are written once, straight into UPLOAD_ROOT, and hashed while they are
+# received; views then rename them into place instead of copying them from /tmp.
+# Files with other extensions are dropped, bodies above UPLOAD_MAX_BYTES are aborted.
+FILE_UPLOAD_HANDLERS = ['Autra.uploadhandlers.HashingUploadHandler']
+UPLOAD_ROOT = MEDIA_ROOT / 'uploads'
+UPLOAD_MAX_BYTES = 2 * 1024 ** 3
+# Zip archives are only unpacked by the batch endpoints.
+UPLOAD_ALLOWED_EXTENSIONS = {'mp4', 'mov', 'mkv', 'avi', 'webm', 'wav', 'mp3', 'flac', 'aac', 'ogg', 'zip'}
+
+# Startup
+# Heavy libraries (cv2, numpy, mediapipe, whisper/torch) are imported on first use, so
+# workers and management commands boot without them (see Autra/lazy.py and
+# `manage.py startup_report`). When gunicorn runs with --preload
+# (e.g. GUNICORN_CMD_ARGS="--preload"), the master imports these modules and the
+# TRANSCRIBER_PRELOAD_MODELS before forking so workers share them copy-on-write.
+PRELOAD_MODULES = ['numpy', 'cv2', 'mediapipe', 'whisper']
+
+# Remote ingestion
+# Downloads share one pooled HTTP session, read INGEST_CHUNK_BYTES at a time and give up
+# after the connect/read timeouts (seconds). Remote videos are decoded through ranged
+# requests with at most INGEST_BUFFER_BYTES prefetched ahead of the decoder. Async views
+# run their downloads on INGEST_POOL_SIZE threads, one per pooled connection.
+INGEST_CONNECT_TIMEOUT = 5
+INGEST_READ_TIMEOUT = 30
+INGEST_CHUNK_BYTES = 1024 * 1024
+INGEST_BUFFER_BYTES = 16 * 1024 * 1024
+INGEST_POOL_SIZE = 10
+INGEST_RANGED_CAPTURE = True
+
+
+# Metrics
+# Per-stage timings (decode, color, face_detection, landmarks, scoring, crop, encode,
+# audio_extraction, model_load, transcribe) and counters (frames, bytes_read from local
+# inputs, bytes_fetched over HTTP, audio_seconds, requests) are served at /metrics
+# in the Prometheus text format, per process. Each request and job logs its own on the
+# 'Autra.metrics' logger. With METRICS_PROFILING on, ?profile=cprofile (or pyinstrument)
+# returns a profile of the view instead of its response.
+METRICS_PROFILING = DEBUG
+METRICS_PROFILE_LINES = 40
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'Autra.metrics': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
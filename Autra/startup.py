@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import subprocess
+
+HEAVY_MODULES = ('cv2', 'numpy', 'mediapipe', 'dlib', 'whisper', 'torch', 'requests')
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+from transcriber.utils import current_rss_bytes
+print(json.dumps({{'seconds': elapsed, 'rss_bytes': current_rss_bytes(),
+                  'heavy_loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+_DJANGO_BODY = """
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.conf import settings
+from importlib import import_module
+import_module(settings.ROOT_URLCONF)
+print(json.dumps({'setup_seconds': setup_done - start}))
+"""
+
+
+def parse_importtime(stderr, limit=15):
+    """Top-level imports from ``python -X importtime`` output, slowest first, in seconds."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('  '):
+            continue
+        imports.append({'module': name.strip(), 'seconds': int(cumulative) / 1e6})
+    imports.sort(key=lambda item: item['seconds'], reverse=True)
+    return imports[:limit]
+
+
+def _run_probe(body, cwd=None):
+    script = _PROBE.format(body=body, heavy=HEAVY_MODULES)
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'Autra.settings')
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], capture_output=True, text=True,
+                               cwd=cwd, env=env)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else
+                           f"probe exited with {completed.returncode}")
+    result = {}
+    for line in completed.stdout.splitlines():
+        if line.startswith('{'):
+            result.update(json.loads(line))
+    result['slowest_imports'] = parse_importtime(completed.stderr)
+    return result
+
+
+def startup_cost(cwd=None):
+    """Time ``django.setup()`` plus the URLconf import in a fresh interpreter.
+
+    This is what every worker boot and management command pays before doing
+    any work. ``heavy_loaded`` lists the heavy libraries that got imported on
+    the way; with lazy imports it should be empty.
+    """
+    return _run_probe(_DJANGO_BODY, cwd)
+
+
+def import_cost(module, cwd=None):
+    """Time and resident memory of importing ``module`` in a fresh interpreter."""
+    baseline = _run_probe("pass", cwd)
+    try:
+        result = _run_probe(f"import {module}", cwd)
+    except RuntimeError as e:
+        return {'module': module, 'error': str(e)}
+    return {
+        'module': module,
+        'seconds': result['seconds'],
+        'rss_bytes': result['rss_bytes'] - baseline['rss_bytes'],
+    }
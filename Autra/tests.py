@@ -0,0 +1,430 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import importlib.util
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from .benchsuite import (FIXTURE_FPS, FIXTURE_SEED, synthetic_frame, video_fixture, run_suite, run_case,
+                         load_baseline, compare_fingerprints)
+from .ingest import RingBuffer, RemoteFile, download, remote_content_hash
+from .lazy import lazy_import
+from .uploadhandlers import HashedUploadedFile, HashingUploadHandler, store_upload
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+requests = lazy_import('requests')
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """Serves ``server.payload``, honouring Range headers when ``server.ranges`` is set.
+
+    ``server.stall_after`` bytes into a response the handler stops sending for
+    ``server.stall_seconds``; every GET is recorded in ``server.seen``.
+    ``server.headers`` are added to every response.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def span(self):
+        size = len(self.server.payload)
+        header = self.headers.get('Range')
+        if not self.server.ranges or not header:
+            return 0, size, False
+        first, _, last = header.split('=', 1)[1].partition('-')
+        return int(first), min(int(last) + 1 if last else size, size), True
+
+    def send_head(self):
+        start, stop, partial = self.span()
+        self.send_response(206 if partial else 200)
+        self.send_header('Content-Length', str(stop - start))
+        if self.server.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if partial:
+            self.send_header('Content-Range', f"bytes {start}-{stop - 1}/{len(self.server.payload)}")
+        for name, value in self.server.headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        return start, stop
+
+    def do_HEAD(self):
+        if self.server.head:
+            self.send_head()
+        else:
+            self.send_error(405)
+
+    def do_GET(self):
+        if self.path != '/video.avi':
+            self.send_error(404)
+            return
+        self.server.seen.append(self.headers.get('Range'))
+        start, stop = self.send_head()
+        try:
+            for offset in range(start, stop, 16 * 1024):
+                if self.server.stall_after is not None and offset - start >= self.server.stall_after:
+                    time.sleep(self.server.stall_seconds)
+                    return
+                self.wfile.write(self.server.payload[offset:min(offset + 16 * 1024, stop)])
+        except (ConnectionError, OSError):
+            pass
+
+
+class FileServer:
+    def __init__(self, payload, ranges=True, head=True, stall_after=None, stall_seconds=0, headers=None):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+        self.server.daemon_threads = True
+        self.server.payload = payload
+        self.server.ranges = ranges
+        self.server.head = head
+        self.server.stall_after = stall_after
+        self.server.stall_seconds = stall_seconds
+        self.server.seen = []
+        self.server.headers = headers or {}
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/video.avi"
+
+    @property
+    def seen(self):
+        return self.server.seen
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def payload(size):
+    return np.random.default_rng(FIXTURE_SEED).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+class RingBufferTests(SimpleTestCase):
+    def test_wraps_around(self):
+        ring = RingBuffer(8)
+        self.assertEqual(ring.write(b'abcdef', 0), 6)
+        self.assertEqual(ring.read(2, 3), b'cde')
+        self.assertEqual(ring.write(b'ghijkl', 4), 6)
+        self.assertEqual((ring.start, ring.end), (4, 12))
+        self.assertEqual(ring.read(4, 8), b'efghijkl')
+
+    def test_keeps_unread_bytes(self):
+        ring = RingBuffer(8)
+        ring.write(b'abcdefgh', 0)
+        self.assertEqual(ring.writable(0), 0)
+        self.assertEqual(ring.write(b'ijk', 2), 2)
+        self.assertEqual(ring.read(2, 8), b'cdefghij')
+
+    def test_reads_stop_at_the_end(self):
+        ring = RingBuffer(8)
+        ring.reset(100)
+        ring.write(b'xyz', 100)
+        self.assertEqual(ring.read(101, 10), b'yz')
+
+
+class RemoteFileTests(SimpleTestCase):
+    DATA = payload(600 * 1024)
+
+    def open(self, server, **options):
+        options.setdefault('chunk_bytes', 16 * 1024)
+        options.setdefault('buffer_bytes', 64 * 1024)
+        options.setdefault('timeout', (2, 2))
+        remote = RemoteFile(server.url, session=requests.Session(), **options)
+        self.addCleanup(remote.close)
+        return remote
+
+    def test_reads_with_ranges(self):
+        with FileServer(self.DATA) as server:
+            remote = self.open(server)
+            self.assertEqual((remote.size, remote.ranges), (len(self.DATA), True))
+            self.assertEqual(remote.read(), self.DATA)
+            self.assertEqual(remote.requests, 1)
+
+    def test_reads_without_ranges_or_head(self):
+        with FileServer(self.DATA, ranges=False, head=False) as server:
+            remote = self.open(server)
+            self.assertEqual((remote.size, remote.ranges), (len(self.DATA), False))
+            self.assertEqual(remote.read(), self.DATA)
+
+    def test_seeks_mid_stream_with_a_new_range(self):
+        with FileServer(self.DATA) as server:
+            remote = self.open(server)
+            self.assertEqual(remote.read(1000), self.DATA[:1000])
+            remote.seek(500 * 1024)
+            self.assertEqual(remote.read(4096), self.DATA[500 * 1024:500 * 1024 + 4096])
+            remote.seek(-10, os.SEEK_END)
+            self.assertEqual(remote.read(), self.DATA[-10:])
+            self.assertIn(f"bytes={500 * 1024}-", server.seen)
+            self.assertLess(remote.bytes_fetched, len(self.DATA))
+
+    def test_seeks_mid_stream_without_ranges(self):
+        with FileServer(self.DATA, ranges=False) as server:
+            remote = self.open(server)
+            remote.seek(500 * 1024)
+            self.assertEqual(remote.read(4096), self.DATA[500 * 1024:500 * 1024 + 4096])
+            remote.seek(100)
+            self.assertEqual(remote.read(100), self.DATA[100:200])
+
+    def test_read_timeout(self):
+        with FileServer(self.DATA, stall_after=64 * 1024, stall_seconds=3) as server:
+            remote = self.open(server, timeout=(2, 0.5))
+            self.assertEqual(remote.read(1000), self.DATA[:1000])
+            remote.seek(len(self.DATA) // 2 - 1000)
+            start = time.monotonic()
+            with self.assertRaises(IOError):
+                remote.read(len(self.DATA))
+            self.assertLess(time.monotonic() - start, 2.5)
+
+    def test_buffer_back_pressure(self):
+        with FileServer(self.DATA) as server:
+            remote = self.open(server)
+            self.assertEqual(remote.read(1000), self.DATA[:1000])
+            time.sleep(0.3)
+            # The producer fills the buffer and then waits for the reader.
+            self.assertEqual(remote.ring.end - remote.position, remote.ring.capacity)
+            self.assertLessEqual(remote.bytes_fetched, 1000 + remote.ring.capacity)
+            self.assertEqual(remote.read(), self.DATA[1000:])
+
+
+class DownloadTests(SimpleTestCase):
+    DATA = payload(300 * 1024)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_download(self):
+        path = os.path.join(self.directory, 'video.avi')
+        with FileServer(self.DATA) as server:
+            self.assertEqual(download(server.url, path, session=requests.Session()),
+                             hashlib.sha256(self.DATA).hexdigest())
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), self.DATA)
+
+    def test_refused(self):
+        path = os.path.join(self.directory, 'video.avi')
+        with FileServer(self.DATA) as server:
+            self.assertIsNone(download(server.url.replace('video.avi', 'missing.avi'), path,
+                                       session=requests.Session()))
+            self.assertIsNone(download(server.url, path, validate=lambda response: False,
+                                       session=requests.Session()))
+        self.assertFalse(os.path.exists(path))
+
+
+class RemoteContentHashTests(SimpleTestCase):
+    DATA = payload(1024)
+
+    def content_hash(self, server, data=DATA, **headers):
+        server.server.payload = data
+        server.server.headers = headers
+        return remote_content_hash(server.url, session=requests.Session())
+
+    def test_follows_the_validators(self):
+        with FileServer(self.DATA) as server:
+            etag = self.content_hash(server, ETag='"v1"')
+            self.assertIsNotNone(etag)
+            self.assertEqual(self.content_hash(server, ETag='"v1"'), etag)
+            self.assertNotEqual(self.content_hash(server, ETag='"v2"'), etag)
+            modified = self.content_hash(server, **{'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+            self.assertNotEqual(self.content_hash(server, **{'Last-Modified': 'Tue, 02 Jan 2024 00:00:00 GMT'}),
+                                modified)
+            self.assertNotEqual(self.content_hash(server, payload(2048),
+                                                  **{'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}), modified)
+
+    def test_without_head(self):
+        with FileServer(self.DATA, head=False) as server:
+            self.assertIsNotNone(self.content_hash(server, ETag='"v1"'))
+
+    def test_not_cached_without_validators(self):
+        with FileServer(self.DATA) as server:
+            self.assertIsNone(self.content_hash(server))
+        self.assertIsNone(remote_content_hash('http://127.0.0.1:9/video.avi', session=requests.Session()))
+
+
+class OpenCaptureTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'video.avi')
+        writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*'MJPG'), FIXTURE_FPS, (320, 240))
+        rng = np.random.default_rng(FIXTURE_SEED)
+        for index in range(3 * FIXTURE_FPS):
+            writer.write(synthetic_frame(index, 320, 240, rng))
+        writer.release()
+
+    def frames(self, cap, indexes):
+        frames = []
+        for index in indexes:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            frames.append(cap.read()[1])
+        cap.release()
+        return frames
+
+    @override_settings(INGEST_CHUNK_BYTES=16 * 1024, INGEST_BUFFER_BYTES=64 * 1024)
+    def test_decodes_the_same_frames_as_the_file(self):
+        from bestframer.sampling import StreamCapture, open_capture, get_video_info
+
+        if cv2.CAP_FFMPEG not in getattr(cv2.videoio_registry, 'getStreamBufferedBackends', list)():
+            self.skipTest("OpenCV cannot decode from a stream")
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        indexes = [0, 40, 10, 70]
+        expected = self.frames(cv2.VideoCapture(self.path), indexes)
+        for ranges in (True, False):
+            with self.subTest(ranges=ranges), FileServer(data, ranges=ranges) as server:
+                cap = open_capture(server.url)
+                self.assertIsInstance(cap, StreamCapture)
+                self.assertTrue(cap.isOpened())
+                self.assertEqual(get_video_info(cap), get_video_info(cv2.VideoCapture(self.path)))
+                for frame, expected_frame in zip(self.frames(cap, indexes), expected):
+                    self.assertTrue(np.array_equal(frame, expected_frame))
+
+
+class BenchSuiteTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def available_cases(self):
+        from bestframer.backends import get_backend
+
+        cases = []
+        try:
+            get_backend().warm_up()
+        except Exception:
+            pass
+        else:
+            cases.append('get_best_frame')
+        if shutil.which('ffmpeg') is not None:
+            cases.append('extract_audio_from_video')
+        if importlib.util.find_spec('whisper') is not None:
+            cases += ['transcribe_audio_file', 'best_frames_and_transcript']
+        return cases
+
+    def test_fixture_cases_match_the_baseline(self):
+        cases = self.available_cases()
+        if not cases:
+            self.skipTest("Neither the face backend, ffmpeg nor Whisper is installed")
+        with override_settings(BENCH_FIXTURES_ROOT=self.directory, TRANSCRIBER_BENCH_SAMPLES=None):
+            report = run_suite(repeat=1, transcribe='transcribe_audio_file' in cases, cases=cases)
+        self.assertTrue(report['cases'])
+        for case in report['cases']:
+            self.assertNotIn('error', case, case)
+        self.assertEqual(compare_fingerprints(report, load_baseline()), [])
+
+    def test_compares_the_recorded_fields(self):
+        baseline = {'get_best_frame:video.avi': {'sharpest_frame': 36}}
+
+        def report(**case):
+            return {'cases': [dict(case, case='get_best_frame', fixture='video.avi')]}
+
+        self.assertEqual(compare_fingerprints(report(fingerprint={'best_frame': 'ab', 'sharpest_frame': 36}),
+                                              baseline), [])
+        self.assertEqual(len(compare_fingerprints(report(fingerprint={'sharpest_frame': 35}), baseline)), 1)
+        self.assertEqual(len(compare_fingerprints(report(error='ImportError: no backend'), baseline)), 1)
+
+    def test_baseline_covers_the_default_fixtures(self):
+        from .benchsuite import DEFAULT_RESOLUTIONS, DEFAULT_VIDEO_SECONDS
+
+        baseline = load_baseline()
+        for width, height in DEFAULT_RESOLUTIONS:
+            for seconds in DEFAULT_VIDEO_SECONDS:
+                self.assertIn(f"get_best_frame:video_{width}x{height}_{seconds}s.avi", baseline)
+
+    def test_run_case_timeout(self):
+        with override_settings(BENCH_FIXTURES_ROOT=self.directory):
+            path = video_fixture(320, 240, 1)
+        result = run_case('get_best_frame', path, 1, timeout=0.01)
+        self.assertTrue(result['error'].startswith("Timed out"))
+
+
+class FailingDemux:
+    duration = 1.0
+
+    def audio_blocks(self):
+        raise RuntimeError("decoder died")
+        yield
+
+    def wait(self):
+        pass
+
+
+class TranscribeDemuxedTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_failure_leaves_no_transcript(self):
+        from Autra.combined import transcribe_demuxed
+        from transcriber.models import Transcript
+        with override_settings(MEDIA_ROOT=self.directory):
+            self.assertEqual(transcribe_demuxed(FailingDemux(), 'video', 'a' * 64), (None, None))
+        self.assertFalse(Transcript.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'text')), [])
+
+
+class UploadHandlerTests(SimpleTestCase):
+    DATA = payload(300 * 1024)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.upload_root = os.path.join(self.directory, 'uploads')
+        settings = override_settings(MEDIA_ROOT=self.directory, UPLOAD_ROOT=self.upload_root,
+                                     UPLOAD_ALLOWED_EXTENSIONS={'mp4'})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, name='video.mp4', data=DATA):
+        """``request.FILES`` of a multipart POST with ``data`` as the file ``name``, parsed by the handler."""
+        request = RequestFactory().post('/upload/', {'video': SimpleUploadedFile(name, data)})
+        request.upload_handlers = [HashingUploadHandler(request)]
+        return request.FILES
+
+    def test_streamed_hash(self):
+        uploaded_file = self.upload()['video']
+        self.addCleanup(uploaded_file.close)
+        self.assertIsInstance(uploaded_file, HashedUploadedFile)
+        self.assertEqual(uploaded_file.sha256, hashlib.sha256(self.DATA).hexdigest())
+        self.assertEqual(uploaded_file.size, len(self.DATA))
+        self.assertEqual(os.path.dirname(uploaded_file.temporary_file_path()), self.upload_root)
+
+    def test_store_upload_renames(self):
+        uploaded_file = self.upload()['video']
+        temporary_path = uploaded_file.temporary_file_path()
+        path = os.path.join(self.directory, 'videos', 'video.mp4')
+        with mock.patch('Autra.uploadhandlers.save_chunks') as save_chunks:
+            self.assertEqual(store_upload(uploaded_file, path), hashlib.sha256(self.DATA).hexdigest())
+        save_chunks.assert_not_called()
+        self.assertFalse(os.path.exists(temporary_path))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), self.DATA)
+        # Closing the request afterwards leaves the stored file alone.
+        uploaded_file.close()
+        self.assertTrue(os.path.exists(path))
+
+    def test_store_upload_copies_other_files(self):
+        path = os.path.join(self.directory, 'videos', 'video.mp4')
+        self.assertEqual(store_upload(SimpleUploadedFile('video.mp4', self.DATA), path),
+                         hashlib.sha256(self.DATA).hexdigest())
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), self.DATA)
+
+    def test_unstored_upload_is_removed_on_close(self):
+        uploaded_file = self.upload()['video']
+        uploaded_file.close()
+        self.assertEqual(os.listdir(self.upload_root), [])
+
+    def test_too_large_upload_is_aborted(self):
+        with override_settings(UPLOAD_MAX_BYTES=100 * 1024):
+            self.assertNotIn('video', self.upload())
+        self.assertEqual(os.listdir(self.upload_root), [])
+
+    def test_unsupported_extension_is_skipped(self):
+        self.assertNotIn('video', self.upload('video.exe'))
+        self.assertFalse(os.path.exists(self.upload_root))
@@ -0,0 +1,119 @@
+import os
+import uuid
+import hashlib
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from .cache import save_chunks
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class HashedUploadedFile(UploadedFile):
+    """An upload already written to its own file under ``UPLOAD_ROOT``.
+
+    ``sha256`` is the digest of the body, computed while it was written. The
+    file is deleted when the request closes unless a view moved it elsewhere
+    with :func:`store_upload`.
+    """
+
+    def __init__(self, file, name, content_type, size, charset, content_type_extra, sha256):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def close(self):
+        path = self.file.name
+        try:
+            self.file.close()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """Streams each uploaded file straight to disk once, hashing and validating it inline.
+
+    Replaces Django's memory/temporary-file handlers, so the body is never
+    spooled to /tmp first and copied into MEDIA_ROOT afterwards.
+    """
+
+    destination = None
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None,
+                 content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        extension = os.path.splitext(file_name)[1].lower().lstrip('.')
+        allowed = getattr(settings, 'UPLOAD_ALLOWED_EXTENSIONS', None)
+        if allowed is not None and extension not in allowed:
+            logger.info(f"Rejected upload with unsupported extension: {file_name}")
+            raise SkipFile()
+
+        self.max_bytes = getattr(settings, 'UPLOAD_MAX_BYTES', DEFAULT_MAX_BYTES)
+        upload_root = getattr(settings, 'UPLOAD_ROOT', os.path.join(settings.MEDIA_ROOT, 'uploads'))
+        os.makedirs(upload_root, exist_ok=True)
+        self.path = os.path.join(upload_root, f"{uuid.uuid4().hex}.{extension or 'bin'}")
+        self.destination = open(self.path, 'wb+')
+        self.digest = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.max_bytes and self.received > self.max_bytes:
+            self.upload_interrupted()
+            raise StopUpload(connection_reset=True)
+        self.digest.update(raw_data)
+        self.destination.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        destination, self.destination = self.destination, None
+        destination.flush()
+        destination.seek(0)
+        return HashedUploadedFile(destination, self.file_name, self.content_type, file_size, self.charset,
+                                  self.content_type_extra, self.digest.hexdigest())
+
+    def upload_interrupted(self):
+        destination = self.destination
+        if destination is not None:
+            self.destination = None
+            destination.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def store_upload(uploaded_file, path):
+    """Put ``uploaded_file`` at ``path`` and return its SHA-256.
+
+    Files from :class:`HashingUploadHandler` are renamed into place, so their
+    bytes are not read or written again. Anything else is copied chunk by
+    chunk and hashed on the way.
+    """
+    if isinstance(uploaded_file, HashedUploadedFile):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        uploaded_file.file.close()
+        os.replace(uploaded_file.temporary_file_path(), path)
+        return uploaded_file.sha256
+    return save_chunks(uploaded_file.chunks(), path)
+
+
+def _parse_body(request):
+    return request.POST, request.FILES
+
+
+async def read_form(request):
+    """``(request.POST, request.FILES)`` for an async view, parsed on a thread since the
+    upload handlers write the files to disk while reading the body.
+    """
+    return await sync_to_async(_parse_body, thread_sensitive=False)(request)
+
+
+async def store_upload_async(uploaded_file, path):
+    """:func:`store_upload` off the event loop."""
+    return await sync_to_async(store_upload, thread_sensitive=False)(uploaded_file, path)
@@ -8,8 +8,11 @@ from . import views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.index,name='index'),
+    path('metrics', views.metrics, name='metrics'),
+    path('analyze/', views.submit_analysis, name='submit_analysis'),
     path('audiotrans/', include('transcriber.urls')),
     path('bestframe/', include('bestframer.urls')),
+    path('jobs/', include('jobs.urls')),
 ]
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
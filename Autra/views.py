@@ -1,5 +1,55 @@
+import os
+import uuid
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
+from jobs.queue import submit
+from jobs.views import job_payload
+from .metrics import render as render_metrics
+from .uploadhandlers import store_upload
 
 
 def index(request):
-    return render(request, 'AuTra/index.html')
\ No newline at end of file
+    return render(request, 'AuTra/index.html')
+
+
+def metrics(request):
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@csrf_exempt
+def submit_analysis(request):
+    """Queue the best frame search and the transcription of one uploaded ``video_file``.
+
+    The video is stored and demuxed once for both. Accepts the ``top_n`` and
+    ``backend`` of /bestframe/submit/ and the ``profile`` of /audiotrans/submit/.
+    """
+    from bestframer.views import get_search_options
+    from transcriber.transcribe import SUPPORTED_VIDEO_FORMATS
+    from transcriber.views import get_profile_param
+
+    if request.method != 'POST':
+        return JsonResponse({'error': "POST a video_file."}, status=405)
+    try:
+        options = get_search_options(request.POST)
+        options['profile'] = get_profile_param(request.POST)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    video_file = request.FILES.get('video_file')
+    if not isinstance(video_file, UploadedFile):
+        return JsonResponse({'error': "Please select a video file."}, status=400)
+    file_name = os.path.basename(video_file.name)
+    base_name, extension = os.path.splitext(file_name)
+    if extension.lower().lstrip('.') not in SUPPORTED_VIDEO_FORMATS:
+        return JsonResponse({'error': f"Supported video formats: {', '.join(sorted(SUPPORTED_VIDEO_FORMATS))}."},
+                            status=400)
+
+    video_path = os.path.join(settings.UPLOAD_ROOT, f"{uuid.uuid4().hex}_{file_name}")
+    content_hash = store_upload(video_file, video_path)
+    params = {'path': video_path, 'name': base_name, 'content_hash': content_hash, 'remove_input': True}
+    params.update(options)
+    job = submit('analyze', params)
+    return JsonResponse(job_payload(job), status=202)
@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import BestFrame
 
-# Register your models here.
+
+@admin.register(BestFrame)
+class BestFrameAdmin(admin.ModelAdmin):
+    list_display = ('id', 'filename', 'rank', 'size', 'source', 'created_at', 'accessed_at')
+    search_fields = ('filename', 'content_hash', 'source')
@@ -0,0 +1,246 @@
+import os
+import logging
+import threading
+from collections import namedtuple
+from django.conf import settings
+from django.utils.module_loading import import_string
+from Autra.lazy import lazy_import
+from Autra.metrics import timed
+from .memory import current_budget
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'mediapipe'
+DEFAULT_BACKENDS = {
+    'mediapipe': 'bestframer.backends.MediaPipeBackend',
+    'dlib': 'bestframer.backends.DlibBackend',
+}
+DEFAULT_DETECTION_MAX_SIDE = 640
+
+Point = namedtuple('Point', 'x y')
+
+
+def get_detection_max_side():
+    return getattr(settings, 'BESTFRAMER_DETECTION_MAX_SIDE', DEFAULT_DETECTION_MAX_SIDE)
+
+
+def detection_frame(frame, max_side=None):
+    """Return ``(frame, scale)``: ``frame`` shrunk so its longest side is at most ``max_side``
+    and the factor from original to detection pixels. Smaller frames are returned as they are.
+    """
+    if max_side is None:
+        max_side = get_detection_max_side()
+    height, width = frame.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return frame, 1.0
+    scale = max_side / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    with timed('resize'):
+        small_frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    # The detectors add a colour-converted copy of their own.
+    current_budget().hold('detection', 2 * small_frame.nbytes)
+    return small_frame, scale
+
+
+def scale_box(box, scale):
+    return tuple(int(round(value / scale)) for value in box)
+
+
+def pad_box(frame, x, y, w, h, padding):
+    ih, iw = frame.shape[:2]
+    pad_x = int(padding * w)
+    pad_y = int(padding * h)
+
+    crop_x1 = max(0, x - pad_x)
+    crop_y1 = max(0, y - pad_y)
+    crop_x2 = min(iw, x + w + pad_x)
+    crop_y2 = min(ih, y + h + pad_y)
+    return frame[crop_y1:crop_y2, crop_x1:crop_x2]
+
+
+class FaceBackend:
+    """Face detector, landmark model and cropper used by the best frame search.
+
+    Subclasses implement ``face_box`` (detector), ``ratios`` (landmarks) and
+    ``is_good`` (the eye/mouth thresholds that fit their landmark scheme).
+    Models are loaded on first use and kept for the life of the process.
+
+    Both models run on a copy of the frame no larger than
+    BESTFRAMER_DETECTION_MAX_SIDE; ``crop`` maps the face box back and cuts
+    from the original frame.
+    """
+
+    name = None
+
+    def face_box(self, frame):
+        """Return the first face as ``(x, y, w, h)`` in pixels, or None."""
+        raise NotImplementedError
+
+    def ratios(self, frame, scale=1.0):
+        """Return ``(left_eye_ratio, right_eye_ratio, mouth_ratio)`` for the first face, or None.
+
+        ``frame`` may be a downscaled copy; ``scale`` is its size relative to
+        the original, so ratios are computed as on the full-resolution frame.
+        """
+        raise NotImplementedError
+
+    def is_good(self, left_eye_ratio, right_eye_ratio, mouth_ratio):
+        raise NotImplementedError
+
+    def warm_up(self):
+        blank = np.zeros((64, 64, 3), dtype=np.uint8)
+        self.ratios(blank)
+        self.face_box(blank)
+
+    def is_good_frame(self, frame):
+        try:
+            ratios = self.ratios(*detection_frame(frame))
+            if ratios is None:
+                return False
+            return bool(self.is_good(*ratios))
+        except (Exception,) as e:
+            return None
+
+    def crop(self, frame, padding=0.7):
+        try:
+            with timed('crop'):
+                small_frame, scale = detection_frame(frame)
+                box = self.face_box(small_frame)
+                if box is None:
+                    return None
+                return pad_box(frame, *scale_box(box, scale), padding)
+        except (Exception,) as e:
+            return None
+
+
+class MediaPipeBackend(FaceBackend):
+    name = 'mediapipe'
+
+    def face_box(self, frame):
+        from .detectors import face_detection_pool
+
+        with timed('color'):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with face_detection_pool().acquire() as face_detection, timed('face_detection'):
+            results = face_detection.process(rgb_frame)
+        if not hasattr(results, 'detections') or not results.detections:
+            return None
+
+        bboxC = results.detections[0].location_data.relative_bounding_box
+        ih, iw = frame.shape[:2]
+        return int(bboxC.xmin * iw), int(bboxC.ymin * ih), int(bboxC.width * iw), int(bboxC.height * ih)
+
+    def ratios(self, frame, scale=1.0):
+        # Landmarks are relative to the frame, so the detection size does not change them.
+        from .detectors import face_mesh_pool
+
+        with timed('color'):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with face_mesh_pool().acquire() as face_mesh, timed('landmarks'):
+            results = face_mesh.process(rgb_frame)
+        if not results.multi_face_landmarks:
+            return None
+
+        landmarks = results.multi_face_landmarks[0].landmark
+        left_eye_ratio = (landmarks[159].y - landmarks[145].y) / (landmarks[33].x - landmarks[133].x)
+        right_eye_ratio = (landmarks[386].y - landmarks[374].y) / (landmarks[362].x - landmarks[263].x)
+        mouth_ratio = landmarks[13].y - landmarks[14].y
+        return left_eye_ratio, right_eye_ratio, mouth_ratio
+
+    def is_good(self, left_eye_ratio, right_eye_ratio, mouth_ratio):
+        return left_eye_ratio > 0.09 and right_eye_ratio > 0.09 and mouth_ratio > 0
+
+    def warm_up(self):
+        from .detectors import warm_up
+        warm_up()
+
+
+class DlibBackend(FaceBackend):
+    """dlib HOG detector with the 68-point shape predictor; crops with OpenCV's Haar cascade."""
+
+    name = 'dlib'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = None
+
+    def models(self):
+        with self._lock:
+            if self._models is None:
+                import dlib
+
+                predictor_path = getattr(settings, 'BESTFRAMER_DLIB_PREDICTOR', os.path.join(
+                    settings.MEDIA_ROOT, 'dependencies/shape_predictor_68_face_landmarks.dat'))
+                cascade_path = getattr(settings, 'BESTFRAMER_HAAR_CASCADE', os.path.join(
+                    settings.MEDIA_ROOT, 'cascades/haarcascade_frontalface_default.xml'))
+                cascade = cv2.CascadeClassifier(str(cascade_path))
+                self._models = (dlib.get_frontal_face_detector(), dlib.shape_predictor(str(predictor_path)),
+                                None if cascade.empty() else cascade)
+                logger.info(f"Loaded dlib models from {predictor_path}")
+            return self._models
+
+    def face_box(self, frame):
+        _, _, cascade = self.models()
+        if cascade is None:
+            return None
+        with timed('color'):
+            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        with timed('face_detection'):
+            faces = cascade.detectMultiScale(gray_frame, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+        if len(faces) == 0:
+            return None
+        return tuple(int(value) for value in faces[0])
+
+    def ratios(self, frame, scale=1.0):
+        detector, predictor, _ = self.models()
+        with timed('color'):
+            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        with timed('face_detection'):
+            faces = detector(gray_frame)
+        if len(faces) == 0:
+            return None
+        with timed('landmarks'):
+            landmarks = predictor(gray_frame, faces[0])
+
+        # The points are numbered 1-68 as in the iBUG 300-W chart; dlib indexes them from 0.
+        # The mouth ratio mixes pixel distances with a ratio, so points go back to full-resolution pixels.
+        def part(number):
+            point = landmarks.part(number - 1)
+            return Point(point.x / scale, point.y / scale)
+
+        left_eye_ratio = (part(44).y - part(48).y) / (part(43).x - part(46).x)
+        right_eye_ratio = (part(39).y - part(41).y) / (part(37).x - part(40).x)
+        mouth_ratio = ((part(62).y + part(68).y) - (part(63).y - part(67).y)
+                       + (part(64).y - part(66).y) / (part(61).x - part(65).x))
+        return left_eye_ratio, right_eye_ratio, mouth_ratio
+
+    def is_good(self, left_eye_ratio, right_eye_ratio, mouth_ratio):
+        return left_eye_ratio > 0.06 and right_eye_ratio > 0.06 and mouth_ratio > 2.2
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def backend_names():
+    return list(getattr(settings, 'BESTFRAMER_BACKENDS', DEFAULT_BACKENDS))
+
+
+def default_backend_name():
+    return getattr(settings, 'BESTFRAMER_BACKEND', DEFAULT_BACKEND)
+
+
+def get_backend(name=None):
+    name = name or default_backend_name()
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            backends = getattr(settings, 'BESTFRAMER_BACKENDS', DEFAULT_BACKENDS)
+            if name not in backends:
+                raise ValueError(f"Unknown face backend '{name}'")
+            backend = import_string(backends[name])()
+            _backends[name] = backend
+        return backend
@@ -0,0 +1,132 @@
+import time
+import cv2
+import numpy as np
+from .scoring import FrameScorer, combine_score
+
+
+def legacy_score(frame):
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    brightness = np.mean(hsv[:, :, 2])
+    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    contrast = gray_frame.std()
+    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    sharpness = cv2.Laplacian(gray_frame, cv2.CV_64F).var()
+    return combine_score(sharpness, contrast, brightness)
+
+
+def synthetic_frames(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = rng.integers(0, 256, size=(count, height, width, 3), dtype=np.uint8)
+    for i in range(0, count, 2):
+        cv2.GaussianBlur(frames[i], (9, 9), 0, dst=frames[i])
+    return frames
+
+
+def _best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_scoring(count=32, width=1280, height=720, repeat=5):
+    frames = synthetic_frames(count, width, height)
+    scorer = FrameScorer()
+    gray_stack = np.stack([cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames])
+
+    legacy_scores = [legacy_score(frame) for frame in frames]
+    new_scores = [scorer.score(frame) for frame in frames]
+    max_error = float(np.max(np.abs(np.subtract(legacy_scores, new_scores))))
+
+    results = {
+        'frames': count,
+        'resolution': f"{width}x{height}",
+        'legacy_per_frame_s': _best_of(lambda: [legacy_score(frame) for frame in frames], repeat),
+        'scorer_per_frame_s': _best_of(lambda: [scorer.score(frame) for frame in frames], repeat),
+        'scorer_batch_bgr_s': _best_of(lambda: scorer.score_batch(frames), repeat),
+        'scorer_batch_gray_s': _best_of(lambda: scorer.score_batch(gray_stack), repeat),
+        'max_abs_score_error': max_error,
+    }
+    results['speedup_per_frame'] = results['legacy_per_frame_s'] / results['scorer_per_frame_s']
+    return results
+
+
+def compare_search(video_paths, top_k=None):
+    from .bestframer import exhaustive_search, two_pass_search
+
+    results = []
+    for path in video_paths:
+        cap = cv2.VideoCapture(path)
+        start = time.perf_counter()
+        exhaustive = exhaustive_search(cap)
+        exhaustive_s = time.perf_counter() - start
+        cap.release()
+
+        cap = cv2.VideoCapture(path)
+        start = time.perf_counter()
+        two_pass = two_pass_search(cap, top_k)
+        two_pass_s = time.perf_counter() - start
+        cap.release()
+
+        if exhaustive is None or two_pass is None:
+            match = exhaustive is None and two_pass is None
+        else:
+            match = bool(np.array_equal(exhaustive, two_pass))
+        results.append({
+            'video': path,
+            'exhaustive_s': exhaustive_s,
+            'two_pass_s': two_pass_s,
+            'match': match,
+        })
+    return results
+
+
+def compare_backends(video_paths, backends=None, samples_per_second=None, max_samples=None):
+    """Run every face backend over the same sampled frames of each clip.
+
+    Reports model load time, per-frame validation and crop latency, how many
+    frames each backend accepts, and how often its verdict agrees with the
+    first backend's. Frames are decoded once per clip so only the backends
+    are timed.
+    """
+    from .backends import get_backend, backend_names
+    from .sampling import iter_sampled_frames
+
+    backends = backends or backend_names()
+    results = []
+    for path in video_paths:
+        cap = cv2.VideoCapture(path)
+        frames = [frame for _, frame in iter_sampled_frames(cap, samples_per_second, max_samples)]
+        cap.release()
+
+        reference = None
+        for name in backends:
+            backend = get_backend(name)
+            start = time.perf_counter()
+            backend.warm_up()
+            load_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            verdicts = [bool(backend.is_good_frame(frame)) for frame in frames]
+            validate_s = time.perf_counter() - start
+            start = time.perf_counter()
+            crops = [backend.crop(frame) for frame in frames]
+            crop_s = time.perf_counter() - start
+
+            if reference is None:
+                reference = verdicts
+            agreement = sum(a == b for a, b in zip(verdicts, reference)) / len(frames) if frames else None
+            results.append({
+                'video': path,
+                'backend': name,
+                'frames': len(frames),
+                'warm_up_s': load_s,
+                'validate_ms_per_frame': 1000 * validate_s / max(1, len(frames)),
+                'crop_ms_per_frame': 1000 * crop_s / max(1, len(frames)),
+                'good_frames': sum(verdicts),
+                'faces_cropped': sum(crop is not None for crop in crops),
+                'agreement_with_' + backends[0]: agreement,
+            })
+    return results
@@ -1,35 +1,23 @@
 import os
-import cv2
-import numpy as np
-import mediapipe as mp
+import logging
 from django.conf import settings
+from .sampling import iter_sampled_frames, get_video_info, get_sampling_options, open_capture
+from .scoring import score_frame, score_frames, calculate_brightness, calculate_contrast, calculate_sharpness
+from .scoring import downscale
+from .backends import get_backend, default_backend_name, get_detection_max_side
+from .parallel import get_workers, plan_segments, parallel_search
+from .tracking import tracking_search
+from .shots import shot_search
+from .memory import FrameStore, frame_budget, get_max_bytes
+from Autra.lazy import lazy_import
+from Autra.metrics import timed, count
 
-mp_face_mesh = mp.solutions.face_mesh
-mp_face_detection = mp.solutions.face_detection
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
 
-def calculate_brightness(frame):
-    try:
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        brightness = np.mean(hsv[:, :, 2])
-        return brightness
-    except (Exception,) as e:
-        return None
+logger = logging.getLogger(__name__)
 
-def calculate_contrast(frame):
-    try:
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        contrast = gray_frame.std()
-        return contrast
-    except (Exception,) as e:
-        return None
-
-def calculate_sharpness(frame):
-    try:
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        sharpness = cv2.Laplacian(gray_frame, cv2.CV_64F).var()
-        return sharpness
-    except (Exception,) as e:
-        return None
+COARSE_BATCH_SIZE = 32
 
 def extract_filename_from_url(url):
     try:
@@ -39,109 +27,214 @@ def extract_filename_from_url(url):
     except (Exception,) as e:
         return None
 
-def is_good_frame(frame):
-    try:
-        with mp_face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1, refine_landmarks=True) as face_mesh:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = face_mesh.process(rgb_frame)
-
-            if not results.multi_face_landmarks:
-                return False
-
-            landmarks = results.multi_face_landmarks[0].landmark
-
-            left_eye_ratio = (landmarks[159].y - landmarks[145].y) / (landmarks[33].x - landmarks[133].x)
-            right_eye_ratio = (landmarks[386].y - landmarks[374].y) / (landmarks[362].x - landmarks[263].x)
-
-            mouth_ratio = landmarks[13].y - landmarks[14].y
-            print(left_eye_ratio, right_eye_ratio, mouth_ratio)
-            if left_eye_ratio > 0.09 and right_eye_ratio > 0.09 and mouth_ratio > 0:
-                print("Good one")
-                return True
-            return False
-    except (Exception,) as e:
-        return None
-
-def detect_and_crop_face(frame, padding=0.7):
-    try:
-        with mp_face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5) as face_detection:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = face_detection.process(rgb_frame)
-
-            if not hasattr(results, 'detections') or not results.detections:
-                return None
-
-            detection = results.detections[0]
-
-            bboxC = detection.location_data.relative_bounding_box
-            ih, iw, _ = frame.shape
-            x, y, w, h = bboxC.xmin, bboxC.ymin, bboxC.width, bboxC.height
-
-            # Apply padding
-            pad_x = int(padding * w * iw)
-            pad_y = int(padding * h * ih)
+def is_good_frame(frame, backend=None):
+    return get_backend(backend).is_good_frame(frame)
 
-            crop_x1 = max(0, int(x * iw) - pad_x)
-            crop_y1 = max(0, int(y * ih) - pad_y)
-            crop_x2 = min(iw, int((x + w) * iw) + pad_x)
-            crop_y2 = min(ih, int((y + h) * ih) + pad_y)
+def detect_and_crop_face(frame, padding=0.7, backend=None):
+    return get_backend(backend).crop(frame, padding)
 
-            cropped_frame = frame[crop_y1:crop_y2, crop_x1:crop_x2]
-            return cropped_frame
-    except (Exception,) as e:
-        return None
-
-def get_best_frame_from_web(video_url):
+def get_best_frame_from_web(video_url, **options):
     try:
-        cap = cv2.VideoCapture(video_url)
+        cap = open_capture(video_url)
         if not cap.isOpened():
             return None, None
 
-        return get_best_frame_from_video(cap, extract_filename_from_url(video_url))
+        return get_best_frame_from_video(cap, extract_filename_from_url(video_url), **options)
     except (Exception,) as e:
         return None, None
 
-def get_best_frame_from_video(cap, filename):
-    best_frame = None
+def exhaustive_search(cap, samples_per_second=None, max_samples=None, sampling_mode=None, backend=None):
+    store = FrameStore(cap)
+    best_index = None
     best_score = 0
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frames_to_skip = int(fps/4)
-    frame_count = 0
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        if frame_count % frames_to_skip == 0:
-            if is_good_frame(frame):
-                print("Good frame")
-                sharpness = calculate_sharpness(frame)
-                brightness = calculate_brightness(frame)
-                contrast = calculate_contrast(frame)
-
-                if sharpness is not None and contrast is not None and brightness is not None:
-                    score = (0.6 * sharpness) + (0.3 * contrast) + (0.2 * brightness)
-                    if score > best_score:
-                        best_score = score
-                        best_frame = frame
-
-        frame_count += 1
+
+    for frame_index, frame in iter_sampled_frames(cap, samples_per_second, max_samples, sampling_mode):
+        if is_good_frame(frame, backend):
+            logger.debug(f"Good frame at {frame_index}")
+            score = score_frame(frame)
+            if score is not None and score > best_score:
+                store.discard(best_index)
+                best_score = score
+                best_index = store.keep(frame_index, frame)
+
+    return store.load(best_index)
+
+def coarse_ranking(cap, coarse_width, samples_per_second=None, max_samples=None, sampling_mode=None):
+    """Every sampled frame index, highest score at ``coarse_width`` first."""
+    candidates = []
+    batch = []
+    batch_indexes = []
+
+    def flush():
+        scores = score_frames(np.stack(batch))
+        candidates.extend((float(score), frame_index) for frame_index, score in zip(batch_indexes, scores))
+        batch.clear()
+        batch_indexes.clear()
+
+    for frame_index, frame in iter_sampled_frames(cap, samples_per_second, max_samples, sampling_mode):
+        batch.append(downscale(frame, coarse_width))
+        batch_indexes.append(frame_index)
+        if len(batch) >= COARSE_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+
+    return [frame_index for _, frame_index in sorted(candidates, reverse=True)]
+
+def two_pass_search(cap, top_k=None, coarse_width=None, samples_per_second=None, max_samples=None, sampling_mode=None,
+                    backend=None):
+    if top_k is None:
+        top_k = getattr(settings, 'BESTFRAMER_TWO_PASS_TOP_K', 8)
+    if coarse_width is None:
+        coarse_width = getattr(settings, 'BESTFRAMER_TWO_PASS_COARSE_WIDTH', 160)
+
+    ranking = coarse_ranking(cap, coarse_width, samples_per_second, max_samples, sampling_mode)
+
+    # The sharpest frames often have no usable face, so the ranking is checked top_k frames
+    # at a time until one passes, as the exhaustive search would eventually find it.
+    store = FrameStore(cap)
+    for start in range(0, len(ranking), top_k):
+        best_index = None
+        best_score = 0
+        for frame_index in sorted(ranking[start:start + top_k]):
+            with timed('decode'):
+                if not cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index):
+                    continue
+                ret, frame = cap.read()
+            if not ret:
+                continue
+            count('frames')
+            if is_good_frame(frame, backend):
+                score = score_frame(frame)
+                if score is not None and score > best_score:
+                    best_score = score
+                    best_index = frame_index
+        if best_index is not None:
+            return store.load(best_index)
+    return None
+
+def get_best_frame_from_video(cap, filename, samples_per_second=None, max_samples=None, sampling_mode=None,
+                              search=None, top_k=None, backend=None):
+    if search is None:
+        search = getattr(settings, 'BESTFRAMER_SEARCH', 'exhaustive')
+
+    _, frame_count = get_video_info(cap)
+    # The second pass seeks back to the candidates, which needs a seekable source.
+    if search == 'two_pass' and frame_count:
+        best_frame = two_pass_search(cap, top_k, None, samples_per_second, max_samples, sampling_mode, backend)
+    elif search == 'tracking':
+        # Tracking follows MediaPipe face mesh landmarks whatever the backend.
+        best_frame = tracking_search(cap, samples_per_second, max_samples, sampling_mode)
+    elif search == 'shots':
+        best_frames = shot_search(cap, 1, None, samples_per_second, max_samples, sampling_mode, backend)
+        best_frame = best_frames[0] if best_frames else None
+    else:
+        best_frame = exhaustive_search(cap, samples_per_second, max_samples, sampling_mode, backend)
 
     cap.release()
+    return crop_best_frame(filename, best_frame, backend)
 
+def crop_best_frame(filename, best_frame, backend=None):
     if best_frame is not None:
-        cropped_frame = detect_and_crop_face(best_frame)
+        cropped_frame = detect_and_crop_face(best_frame, backend=backend)
         if cropped_frame is not None:
             return filename, cropped_frame
         else:
             return filename, best_frame
     return filename, None
 
-def get_best_frame(video_input):
+def best_frame_params(samples_per_second=None, max_samples=None, search=None, top_k=None, top_n=1, backend=None,
+                      **options):
+    samples_per_second, max_samples, _ = get_sampling_options(samples_per_second, max_samples)
+    return {
+        'backend': backend or default_backend_name(),
+        'samples_per_second': samples_per_second,
+        'max_samples': max_samples,
+        'search': search or getattr(settings, 'BESTFRAMER_SEARCH', 'exhaustive'),
+        'top_k': top_k or getattr(settings, 'BESTFRAMER_TWO_PASS_TOP_K', 8),
+        'top_n': top_n,
+        'shot_candidates': getattr(settings, 'BESTFRAMER_SHOT_CANDIDATES', 3),
+        'shot_cut_threshold': getattr(settings, 'BESTFRAMER_SHOT_CUT_THRESHOLD', 0.3),
+        'detection_max_side': get_detection_max_side(),
+        'memory_limit_bytes': get_max_bytes(),
+    }
+
+def get_best_frame(video_input, workers=None, **options):
+    with frame_budget():
+        return _get_best_frame(video_input, workers, **options)
+
+def _get_best_frame(video_input, workers=None, **options):
+    workers = get_workers(workers)
+    # Only the exhaustive search splits into independent segments; the others
+    # rank, track or cut across the whole video.
+    search = options.get('search') or getattr(settings, 'BESTFRAMER_SEARCH', 'exhaustive')
+    if workers > 1 and search == 'exhaustive':
+        cap = open_capture(video_input)
+        if not cap.isOpened():
+            return None, None
+        fps, frame_count = get_video_info(cap)
+        cap.release()
+        segments = plan_segments(fps, frame_count, workers, options.get('samples_per_second'),
+                                 options.get('max_samples'), options.get('sampling_mode'))
+        if len(segments) > 1:
+            best_frame = parallel_search(video_input, segments, workers, options.get('samples_per_second'),
+                                         options.get('max_samples'), options.get('sampling_mode'),
+                                         options.get('backend'))
+            return crop_best_frame(extract_filename_from_url(video_input), best_frame, options.get('backend'))
+
     if video_input.startswith("http"):
-        return get_best_frame_from_web(video_input)
+        return get_best_frame_from_web(video_input, **options)
     else:
-        cap = cv2.VideoCapture(video_input)
+        cap = open_capture(video_input)
         if not cap.isOpened():
             return None, None
-        return get_best_frame_from_video(cap, os.path.splitext(os.path.basename(video_input))[0])
+        return get_best_frame_from_video(cap, os.path.splitext(os.path.basename(video_input))[0], **options)
+
+def get_best_frames(video_input, top_n, samples_per_second=None, max_samples=None, sampling_mode=None, backend=None,
+                    **options):
+    """Return ``(filename, frames)`` with the best cropped frame of up to ``top_n`` distinct shots.
+
+    The frames and scratch buffers of the search stay within BESTFRAMER_MEMORY_LIMIT_BYTES;
+    its peak is reported as the ``frame_bytes`` metric.
+    """
+    with frame_budget():
+        return _get_best_frames(video_input, top_n, samples_per_second, max_samples, sampling_mode, backend,
+                                **options)
+
+def _get_best_frames(video_input, top_n, samples_per_second=None, max_samples=None, sampling_mode=None, backend=None,
+                     **options):
+    if os.path.isfile(video_input):
+        # An upper bound: seeking samplers skip parts of the file.
+        count('bytes_read', os.path.getsize(video_input))
+    if top_n <= 1:
+        filename, best_frame = get_best_frame(video_input, samples_per_second=samples_per_second,
+                                              max_samples=max_samples, sampling_mode=sampling_mode, backend=backend,
+                                              **options)
+        return filename, [best_frame] if best_frame is not None else []
+
+    try:
+        cap = open_capture(video_input)
+        if not cap.isOpened():
+            return None, []
+        return get_best_frames_from_video(cap, extract_filename_from_url(video_input), top_n, samples_per_second,
+                                          max_samples, sampling_mode, backend)
+    except (Exception,) as e:
+        return None, []
+
+def get_best_frames_from_video(cap, filename, top_n, samples_per_second=None, max_samples=None, sampling_mode=None,
+                               backend=None, **options):
+    """:func:`get_best_frames` on an opened capture, which is released afterwards."""
+    with frame_budget():
+        return _get_best_frames_from_video(cap, filename, top_n, samples_per_second, max_samples, sampling_mode,
+                                           backend, **options)
+
+def _get_best_frames_from_video(cap, filename, top_n, samples_per_second=None, max_samples=None, sampling_mode=None,
+                                backend=None, **options):
+    if top_n <= 1:
+        filename, best_frame = get_best_frame_from_video(cap, filename, samples_per_second, max_samples,
+                                                         sampling_mode, backend=backend, **options)
+        return filename, [best_frame] if best_frame is not None else []
+
+    best_frames = shot_search(cap, top_n, None, samples_per_second, max_samples, sampling_mode, backend)
+    cap.release()
+    return filename, [crop_best_frame(filename, frame, backend)[1] for frame in best_frames]
@@ -0,0 +1,121 @@
+import os
+import queue
+import threading
+import logging
+from contextlib import contextmanager
+import numpy as np
+import mediapipe as mp
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+mp_face_mesh = mp.solutions.face_mesh
+mp_face_detection = mp.solutions.face_detection
+
+DEFAULT_POOL_SIZE = 2
+
+
+def build_face_mesh():
+    return mp_face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1, refine_landmarks=True)
+
+
+def build_face_detection():
+    return mp_face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5)
+
+
+class DetectorPool:
+    """Per-process pool of MediaPipe graphs.
+
+    MediaPipe solutions are not safe to call from several threads at once, so
+    each graph is checked out by exactly one thread at a time. Graphs are built
+    lazily up to ``size`` and then reused across frames and requests.
+    """
+
+    def __init__(self, factory, size):
+        self.factory = factory
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if not can_create:
+            return self._idle.get()
+
+        try:
+            return self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def acquire(self):
+        detector = self._checkout()
+        try:
+            yield detector
+        finally:
+            self._idle.put(detector)
+
+    def warm_up(self):
+        blank = np.zeros((64, 64, 3), dtype=np.uint8)
+        with self.acquire() as detector:
+            detector.process(blank)
+
+    def close(self):
+        while True:
+            try:
+                detector = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                detector.close()
+            except Exception as e:
+                logger.error(f"Error closing detector: {e}")
+            with self._lock:
+                self._created -= 1
+
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def _get_pool(name, factory):
+    global _pools_pid
+    with _pools_lock:
+        # Graphs own native threads and do not survive a fork, so a child
+        # process always starts with fresh pools.
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(name)
+        if pool is None:
+            size = getattr(settings, 'BESTFRAMER_DETECTOR_POOL_SIZE', DEFAULT_POOL_SIZE)
+            pool = DetectorPool(factory, size)
+            _pools[name] = pool
+        return pool
+
+
+def face_mesh_pool():
+    return _get_pool('face_mesh', build_face_mesh)
+
+
+def face_detection_pool():
+    return _get_pool('face_detection', build_face_detection)
+
+
+def warm_up():
+    for pool in (face_mesh_pool(), face_detection_pool()):
+        pool.warm_up()
+    logger.info(f"MediaPipe detectors warmed up in process {os.getpid()}")
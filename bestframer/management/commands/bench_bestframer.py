@@ -0,0 +1,37 @@
+import json
+from django.core.management.base import BaseCommand
+from bestframer.benchmarks import bench_scoring, compare_search, compare_backends
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmarks for the best frame pipeline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frames', type=int, default=32)
+        parser.add_argument('--width', type=int, default=1280)
+        parser.add_argument('--height', type=int, default=720)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--compare-search', nargs='+', metavar='VIDEO',
+                            help="Check that the two-pass search picks the same frame as the exhaustive one.")
+        parser.add_argument('--top-k', type=int, default=None)
+        parser.add_argument('--compare-backends', nargs='+', metavar='VIDEO',
+                            help="Time every face backend on the same sampled frames and compare their verdicts.")
+        parser.add_argument('--backends', nargs='+', default=None,
+                            help="Backends to compare; the first is the reference. Defaults to all.")
+        parser.add_argument('--max-samples', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['compare_backends']:
+            results = compare_backends(options['compare_backends'], backends=options['backends'],
+                                       max_samples=options['max_samples'])
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        if options['compare_search']:
+            results = compare_search(options['compare_search'], top_k=options['top_k'])
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        results = bench_scoring(count=options['frames'], width=options['width'],
+                                height=options['height'], repeat=options['repeat'])
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,139 @@
+import math
+import logging
+import contextvars
+from contextlib import contextmanager
+from django.conf import settings
+from Autra.lazy import lazy_import
+from Autra.metrics import peak, timed
+
+cv2 = lazy_import('cv2')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+# FrameScorer buffers per scored pixel: gray (1), HSV (3) and the int16 Laplacian (2),
+# plus the BGR copy (3) when the frame has to be downscaled first.
+SCORING_BYTES_PER_PIXEL = 6
+RESIZED_BYTES_PER_PIXEL = 3
+MIN_SCORING_WIDTH = 160
+
+
+def get_max_bytes():
+    return getattr(settings, 'BESTFRAMER_MEMORY_LIMIT_BYTES', DEFAULT_MAX_BYTES)
+
+
+class FrameBudget:
+    """The bytes one best frame search may hold in frames and scratch buffers.
+
+    The decoded frame, the detection copy and the frames a search keeps are
+    accounted as they are; when scoring a frame at full size would go over
+    ``max_bytes``, :meth:`scoring_scale` asks for it to be scored downscaled
+    instead. ``peak_bytes`` is the largest total seen.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = get_max_bytes() if max_bytes is None else max_bytes
+        self.held = {}
+        self.peak_bytes = 0
+        self._scales = {}
+
+    def hold(self, name, nbytes):
+        self.held[name] = nbytes
+        self.peak_bytes = max(self.peak_bytes, sum(self.held.values()))
+
+    def scoring_scale(self, shape):
+        """Scale at which a frame of ``shape`` is scored, and account for its buffers."""
+        height, width = shape[:2]
+        channels = shape[2] if len(shape) > 2 else 1
+        pixels = height * width
+        frame_bytes = pixels * channels
+        others = sum(nbytes for name, nbytes in self.held.items() if name not in ('frame', 'scoring'))
+
+        scale = 1.0
+        if self.max_bytes and frame_bytes + others + SCORING_BYTES_PER_PIXEL * pixels > self.max_bytes:
+            room = max(self.max_bytes - frame_bytes - others, 0)
+            scale = math.sqrt(room / ((SCORING_BYTES_PER_PIXEL + RESIZED_BYTES_PER_PIXEL * channels) * pixels))
+            scale = min(1.0, max(scale, MIN_SCORING_WIDTH / width))
+            if self._scales.get(shape) != scale:
+                logger.info(f"Scoring {width}x{height} frames at {scale:.2f}x to stay under "
+                            f"{self.max_bytes / 2 ** 20:.0f} MiB")
+        self._scales[shape] = scale
+
+        scored_pixels = pixels * scale * scale
+        scoring_bytes = SCORING_BYTES_PER_PIXEL * scored_pixels
+        if scale < 1:
+            scoring_bytes += RESIZED_BYTES_PER_PIXEL * channels * scored_pixels
+        self.hold('frame', frame_bytes)
+        self.hold('scoring', int(scoring_bytes))
+        return scale
+
+
+_current = contextvars.ContextVar('frame_budget', default=None)
+
+
+def current_budget():
+    """The budget of the search running in this context, or a new one outside of :func:`frame_budget`."""
+    budget = _current.get()
+    return FrameBudget() if budget is None else budget
+
+
+@contextmanager
+def frame_budget(max_bytes=None):
+    """Give the enclosed search a :class:`FrameBudget` and report its peak as ``frame_bytes``.
+
+    Nested calls share the outer budget.
+    """
+    budget = _current.get()
+    if budget is not None:
+        yield budget
+        return
+    budget = FrameBudget(max_bytes)
+    token = _current.set(budget)
+    try:
+        yield budget
+    finally:
+        _current.reset(token)
+        peak('frame_bytes', budget.peak_bytes)
+
+
+class FrameStore:
+    """Keeps the frames a search may return without holding their decoded pixels.
+
+    On a seekable capture a frame is kept as its index and decoded again by
+    :meth:`load`; otherwise as a PNG, lossless and a fraction of the raw size.
+    :meth:`load` has to run before the capture is released.
+    """
+
+    def __init__(self, cap):
+        from .sampling import get_video_info
+
+        _, frame_count = get_video_info(cap)
+        self.cap = cap
+        self.seekable = frame_count > 0
+        self.budget = current_budget()
+        self.encoded = {}
+
+    def keep(self, frame_index, frame):
+        if not self.seekable:
+            ret, data = cv2.imencode('.png', frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            if not ret:
+                raise ValueError(f"Could not keep frame {frame_index}")
+            self.encoded[frame_index] = data
+            self.budget.hold('kept', sum(data.nbytes for data in self.encoded.values()))
+        return frame_index
+
+    def discard(self, frame_index):
+        if self.encoded.pop(frame_index, None) is not None:
+            self.budget.hold('kept', sum(data.nbytes for data in self.encoded.values()))
+
+    def load(self, frame_index):
+        if frame_index is None:
+            return None
+        if not self.seekable:
+            data = self.encoded.get(frame_index)
+            return None if data is None else cv2.imdecode(data, cv2.IMREAD_COLOR)
+        with timed('decode'):
+            if not self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index):
+                return None
+            ret, frame = self.cap.read()
+        return frame if ret else None
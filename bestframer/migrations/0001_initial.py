@@ -0,0 +1,34 @@
+# Generated by Django 5.1 on 2026-10-18 14:50
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BestFrame',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('path', models.CharField(max_length=512)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('size', models.BigIntegerField(default=0)),
+                ('source', models.CharField(blank=True, max_length=512)),
+                ('params', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('accessed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('rank', models.PositiveSmallIntegerField(default=1)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['content_hash'], name='bestframe_hash_idx'), models.Index(fields=['size'], name='bestframe_size_idx'), models.Index(fields=['created_at'], name='bestframe_created_idx'), models.Index(fields=['accessed_at'], name='bestframe_accessed_idx'), models.Index(fields=['source'], name='bestframe_source_idx')],
+            },
+        ),
+    ]
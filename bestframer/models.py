@@ -1,3 +1,17 @@
 from django.db import models
+from Autra.artifacts import Artifact
 
-# Create your models here.
+
+class BestFrame(Artifact):
+    """One saved best frame; ``rank`` is its place among the frames found for the same video."""
+
+    rank = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_hash'], name='bestframe_hash_idx'),
+            models.Index(fields=['size'], name='bestframe_size_idx'),
+            models.Index(fields=['created_at'], name='bestframe_created_idx'),
+            models.Index(fields=['accessed_at'], name='bestframe_accessed_idx'),
+            models.Index(fields=['source'], name='bestframe_source_idx'),
+        ]
@@ -0,0 +1,134 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from .sampling import get_sampling_options, sampling_step, open_capture
+from .memory import frame_budget
+from Autra.lazy import lazy_import
+from Autra.metrics import collect, merge, timed
+
+cv2 = lazy_import('cv2')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_SEGMENT_SECONDS = 10
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_workers(workers=None):
+    if workers is None:
+        workers = getattr(settings, 'BESTFRAMER_PARALLEL_WORKERS', 1)
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    return max(1, workers)
+
+
+def plan_segments(fps, frame_count, workers, samples_per_second=None, max_samples=None, mode=None):
+    """Split ``frame_count`` frames into at most ``workers`` contiguous ranges.
+
+    Boundaries are aligned to the sampling step so every segment samples the
+    same frames the serial scan would. Clips shorter than two minimum-length
+    segments, or with an unknown frame count, get a single segment.
+    """
+    if workers < 2 or not frame_count:
+        return [(0, frame_count or None)]
+
+    samples_per_second, max_samples, mode = get_sampling_options(samples_per_second, max_samples, mode)
+    step = sampling_step(fps, frame_count, samples_per_second, max_samples)
+    min_seconds = getattr(settings, 'BESTFRAMER_PARALLEL_MIN_SEGMENT_SECONDS', DEFAULT_MIN_SEGMENT_SECONDS)
+    min_frames = max(step, int(min_seconds * fps))
+
+    count = min(workers, frame_count // min_frames)
+    if count < 2:
+        return [(0, frame_count)]
+
+    steps_total = -(-frame_count // step)
+    steps_per_segment = -(-steps_total // count)
+    segments = []
+    for start_step in range(0, steps_total, steps_per_segment):
+        start = start_step * step
+        stop = min(frame_count, (start_step + steps_per_segment) * step)
+        segments.append((start, stop))
+    return segments
+
+
+def _init_worker():
+    if getattr(settings, 'BESTFRAMER_WARM_UP_DETECTORS', False):
+        from .backends import get_backend
+        get_backend().warm_up()
+
+
+def get_executor(workers):
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            # MediaPipe graphs run native threads, so workers are spawned rather
+            # than forked from a process that may already hold detectors.
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=_init_worker)
+            _executors[workers] = executor
+        return executor
+
+
+def search_segment(video_input, start, stop, samples_per_second=None, max_samples=None, sampling_mode=None,
+                   backend=None):
+    from .bestframer import is_good_frame
+    from .sampling import iter_sampled_frames
+    from .scoring import score_frame
+
+    best_score = 0
+    best_index = None
+    # Stage timings recorded in this worker process are sent back with the result.
+    with collect() as collector, frame_budget():
+        cap = open_capture(video_input)
+        if not cap.isOpened():
+            return None, None, collector.snapshot()
+        try:
+            for frame_index, frame in iter_sampled_frames(cap, samples_per_second, max_samples, sampling_mode,
+                                                          start=start, stop=stop):
+                if is_good_frame(frame, backend):
+                    score = score_frame(frame)
+                    if score is not None and score > best_score:
+                        best_score = score
+                        best_index = frame_index
+        finally:
+            cap.release()
+    return best_score, best_index, collector.snapshot()
+
+
+def parallel_search(video_input, segments, workers, samples_per_second=None, max_samples=None, sampling_mode=None,
+                    backend=None):
+    if max_samples:
+        max_samples = max(1, max_samples // len(segments))
+
+    executor = get_executor(workers)
+    futures = [executor.submit(search_segment, video_input, start, stop, samples_per_second, max_samples,
+                               sampling_mode, backend)
+               for start, stop in segments]
+
+    best_score = 0
+    best_index = None
+    for future in futures:
+        score, frame_index, stats = future.result()
+        merge(stats)
+        if frame_index is not None and score > best_score:
+            best_score = score
+            best_index = frame_index
+
+    if best_index is None:
+        return None
+
+    # Only the winning index crosses the process boundary; decode it once here.
+    cap = open_capture(video_input)
+    try:
+        with timed('decode'):
+            if not cap.set(cv2.CAP_PROP_POS_FRAMES, best_index):
+                return None
+            ret, frame = cap.read()
+        return frame if ret else None
+    finally:
+        cap.release()
@@ -0,0 +1,149 @@
+import math
+import time
+import logging
+from django.conf import settings
+from Autra.lazy import lazy_import
+from Autra.metrics import observe, count
+
+cv2 = lazy_import('cv2')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FPS = 25.0
+DEFAULT_SAMPLES_PER_SECOND = 4
+DEFAULT_SEEK_MIN_STEP = 30
+
+SAMPLING_MODES = ('auto', 'grab', 'seek')
+
+
+def get_sampling_options(samples_per_second=None, max_samples=None, mode=None):
+    if samples_per_second is None:
+        samples_per_second = getattr(settings, 'BESTFRAMER_SAMPLES_PER_SECOND', DEFAULT_SAMPLES_PER_SECOND)
+    if max_samples is None:
+        max_samples = getattr(settings, 'BESTFRAMER_MAX_SAMPLES', None)
+    if mode is None:
+        mode = getattr(settings, 'BESTFRAMER_SAMPLING_MODE', 'auto')
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode: {mode}")
+    return samples_per_second, max_samples, mode
+
+
+class StreamCapture:
+    """VideoCapture decoding from a file object; releasing it also closes the stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.cap = cv2.VideoCapture(stream, cv2.CAP_FFMPEG, [])
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+    def release(self):
+        self.cap.release()
+        count('bytes_fetched', self.stream.bytes_fetched)
+        self.stream.close()
+
+
+def open_capture(video_input):
+    """Open ``video_input`` (a path or an http(s) URL) for decoding.
+
+    URLs are read through Autra.ingest with ranged requests and a bounded
+    prefetch buffer, so seeking samplers only download what they decode.
+    OpenCV builds without stream input (before 4.10) open the URL themselves.
+    """
+    if (video_input.startswith('http') and getattr(settings, 'INGEST_RANGED_CAPTURE', True)
+            and cv2.CAP_FFMPEG in getattr(cv2.videoio_registry, 'getStreamBufferedBackends', list)()):
+        from Autra.ingest import RemoteFile
+
+        try:
+            capture = StreamCapture(RemoteFile(video_input))
+        except (Exception,) as e:
+            logger.error(f"Ranged reads failed for {video_input}, letting OpenCV fetch it: {e}")
+        else:
+            if capture.isOpened():
+                return capture
+            capture.release()
+    return cv2.VideoCapture(video_input)
+
+
+def get_video_info(cap):
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not fps or math.isnan(fps) or fps <= 0:
+        fps = DEFAULT_FPS
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    return fps, max(frame_count, 0)
+
+
+def sampling_step(fps, frame_count, samples_per_second, max_samples):
+    step = 1
+    if samples_per_second and samples_per_second > 0:
+        step = max(1, int(round(fps / samples_per_second)))
+    if max_samples and frame_count:
+        step = max(step, math.ceil(frame_count / max_samples))
+    return step
+
+
+def _iter_grab(cap, step, start, stop, max_samples):
+    frame_index = start
+    sampled = 0
+    decode_start = time.perf_counter()
+    while stop is None or frame_index < stop:
+        if not cap.grab():
+            break
+        if (frame_index - start) % step == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            # The decode time of a sample includes the frames grabbed since the previous one.
+            observe('decode', time.perf_counter() - decode_start)
+            count('frames')
+            yield frame_index, frame
+            decode_start = time.perf_counter()
+            sampled += 1
+            if max_samples and sampled >= max_samples:
+                break
+        frame_index += 1
+
+
+def _iter_seek(cap, step, start, stop, max_samples):
+    sampled = 0
+    for frame_index in range(start, stop, step):
+        decode_start = time.perf_counter()
+        if not cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index):
+            break
+        ret, frame = cap.read()
+        if not ret:
+            break
+        observe('decode', time.perf_counter() - decode_start)
+        count('frames')
+        yield frame_index, frame
+        sampled += 1
+        if max_samples and sampled >= max_samples:
+            break
+
+
+def iter_sampled_frames(cap, samples_per_second=None, max_samples=None, mode=None, start=0, stop=None):
+    """Yield ``(frame_index, frame)`` for the sampled frames of ``cap``.
+
+    Frames that are skipped are never converted to images: ``grab`` mode only
+    demuxes/decodes them with ``cap.grab()``, and ``seek`` mode jumps straight
+    to each sampled position. ``auto`` seeks when samples are far enough apart
+    and the frame count is known, and grabs otherwise (e.g. live streams).
+    """
+    samples_per_second, max_samples, mode = get_sampling_options(samples_per_second, max_samples, mode)
+    fps, frame_count = get_video_info(cap)
+    if stop is None and frame_count:
+        stop = frame_count
+    span = (stop - start) if stop is not None else 0
+    step = sampling_step(fps, span, samples_per_second, max_samples)
+
+    if mode == 'auto':
+        seek_min_step = getattr(settings, 'BESTFRAMER_SEEK_MIN_STEP', DEFAULT_SEEK_MIN_STEP)
+        mode = 'seek' if stop is not None and step >= seek_min_step else 'grab'
+
+    if mode == 'seek' and stop is not None:
+        return _iter_seek(cap, step, start, stop, max_samples)
+
+    if start and not cap.set(cv2.CAP_PROP_POS_FRAMES, start):
+        return iter(())
+    return _iter_grab(cap, step, start, stop, max_samples)
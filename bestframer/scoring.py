@@ -0,0 +1,188 @@
+import threading
+from Autra.lazy import lazy_import
+from Autra.metrics import timed
+from .memory import current_budget
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+SHARPNESS_WEIGHT = 0.6
+CONTRAST_WEIGHT = 0.3
+BRIGHTNESS_WEIGHT = 0.2
+
+
+def combine_score(sharpness, contrast, brightness):
+    return (SHARPNESS_WEIGHT * sharpness) + (CONTRAST_WEIGHT * contrast) + (BRIGHTNESS_WEIGHT * brightness)
+
+
+class FrameScorer:
+    """Computes sharpness, contrast and brightness with reusable buffers.
+
+    Every frame is converted to grayscale and HSV exactly once, into scratch
+    buffers that are kept between calls as long as the frame size does not
+    change. The Laplacian is computed in int16, which is exact for uint8
+    input, instead of allocating a float64 image. Frames scored below full
+    size are resized into a kept buffer too.
+    """
+
+    def __init__(self):
+        self._shape = None
+        self._gray = None
+        self._hsv = None
+        self._laplacian = None
+        self._resized = None
+        self._batch_shape = None
+        self._padded = None
+        self._batch_laplacian = None
+
+    def _buffers(self, frame):
+        if self._shape != frame.shape:
+            height, width = frame.shape[:2]
+            self._gray = np.empty((height, width), dtype=np.uint8)
+            self._hsv = np.empty((height, width, 3), dtype=np.uint8)
+            self._laplacian = np.empty((height, width), dtype=np.int16)
+            self._shape = frame.shape
+        return self._gray, self._hsv, self._laplacian
+
+    def metrics(self, frame):
+        gray, hsv, laplacian = self._buffers(frame)
+        if frame.ndim == 2:
+            gray = frame
+            brightness = cv2.mean(gray)[0]
+        else:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+            cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=hsv)
+            brightness = cv2.mean(hsv)[2]
+
+        _, contrast = cv2.meanStdDev(gray)
+        cv2.Laplacian(gray, cv2.CV_16S, dst=laplacian)
+        _, laplacian_std = cv2.meanStdDev(laplacian)
+
+        sharpness = float(laplacian_std[0, 0]) ** 2
+        return sharpness, float(contrast[0, 0]), float(brightness)
+
+    def resize(self, frame, scale):
+        height, width = frame.shape[:2]
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        shape = (size[1], size[0]) + frame.shape[2:]
+        if self._resized is None or self._resized.shape != shape:
+            self._resized = np.empty(shape, dtype=frame.dtype)
+        cv2.resize(frame, size, dst=self._resized, interpolation=cv2.INTER_AREA)
+        return self._resized
+
+    def score(self, frame, scale=1.0):
+        if scale < 1:
+            frame = self.resize(frame, scale)
+        return combine_score(*self.metrics(frame))
+
+    def _batch_buffers(self, shape):
+        if self._batch_shape != shape:
+            count, height, width = shape
+            self._padded = np.empty((count, height + 2, width + 2), dtype=np.int16)
+            self._batch_laplacian = np.empty((count, height, width), dtype=np.int16)
+            self._batch_shape = shape
+        return self._padded, self._batch_laplacian
+
+    def metrics_batch(self, frames):
+        """Score a stack of frames in one NumPy pass.
+
+        ``frames`` is an (N, H, W) grayscale stack or an (N, H, W, 3) BGR
+        stack. Returns three length-N arrays: sharpness, contrast, brightness.
+        For grayscale stacks the brightness is the mean gray level, since the
+        HSV value channel cannot be recovered without colour.
+        """
+        frames = np.asarray(frames)
+        if frames.ndim == 4:
+            # V in HSV is max(B, G, R), so brightness needs no HSV conversion.
+            value = np.maximum(np.maximum(frames[..., 0], frames[..., 1]), frames[..., 2])
+            brightness = value.sum(axis=(1, 2), dtype=np.int64) / (value.shape[1] * value.shape[2])
+            gray = np.empty(frames.shape[:3], dtype=np.uint8)
+            for i in range(frames.shape[0]):
+                cv2.cvtColor(frames[i], cv2.COLOR_BGR2GRAY, dst=gray[i])
+        else:
+            gray = frames
+            brightness = gray.mean(axis=(1, 2))
+
+        count, height, width = gray.shape
+        padded, laplacian = self._batch_buffers(gray.shape)
+
+        # Same border handling as cv2.Laplacian (BORDER_REFLECT_101).
+        padded[:, 1:-1, 1:-1] = gray
+        padded[:, 0, 1:-1] = gray[:, 1]
+        padded[:, -1, 1:-1] = gray[:, -2]
+        padded[:, :, 0] = padded[:, :, 2]
+        padded[:, :, -1] = padded[:, :, -3]
+
+        np.multiply(padded[:, 1:-1, 1:-1], -4, out=laplacian)
+        laplacian += padded[:, :-2, 1:-1]
+        laplacian += padded[:, 2:, 1:-1]
+        laplacian += padded[:, 1:-1, :-2]
+        laplacian += padded[:, 1:-1, 2:]
+
+        pixels = height * width
+        lap_sum = laplacian.sum(axis=(1, 2), dtype=np.int64)
+        lap_sq_sum = np.einsum('nij,nij->n', laplacian, laplacian, dtype=np.int64)
+        lap_mean = lap_sum / pixels
+        sharpness = lap_sq_sum / pixels - lap_mean ** 2
+
+        gray_sum = gray.sum(axis=(1, 2), dtype=np.int64)
+        gray_sq_sum = np.einsum('nij,nij->n', gray, gray, dtype=np.int64)
+        gray_mean = gray_sum / pixels
+        contrast = np.sqrt(np.maximum(gray_sq_sum / pixels - gray_mean ** 2, 0))
+
+        return sharpness, contrast, brightness
+
+    def score_batch(self, frames):
+        return combine_score(*self.metrics_batch(frames))
+
+
+_local = threading.local()
+
+
+def get_scorer():
+    scorer = getattr(_local, 'scorer', None)
+    if scorer is None:
+        scorer = FrameScorer()
+        _local.scorer = scorer
+    return scorer
+
+
+def score_frame(frame):
+    try:
+        with timed('scoring'):
+            return get_scorer().score(frame, current_budget().scoring_scale(frame.shape))
+    except (Exception,) as e:
+        return None
+
+
+def score_frames(frames):
+    with timed('scoring'):
+        return get_scorer().score_batch(frames)
+
+
+def downscale(frame, width):
+    height, frame_width = frame.shape[:2]
+    if frame_width <= width:
+        return frame
+    return cv2.resize(frame, (width, max(1, round(height * width / frame_width))), interpolation=cv2.INTER_AREA)
+
+
+def calculate_brightness(frame):
+    try:
+        return get_scorer().metrics(frame)[2]
+    except (Exception,) as e:
+        return None
+
+
+def calculate_contrast(frame):
+    try:
+        return get_scorer().metrics(frame)[1]
+    except (Exception,) as e:
+        return None
+
+
+def calculate_sharpness(frame):
+    try:
+        return get_scorer().metrics(frame)[0]
+    except (Exception,) as e:
+        return None
@@ -0,0 +1,105 @@
+import heapq
+import logging
+from django.conf import settings
+from .sampling import iter_sampled_frames
+from .scoring import score_frame, downscale
+from .memory import FrameStore, current_budget
+from Autra.lazy import lazy_import
+
+cv2 = lazy_import('cv2')
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_WIDTH = 64
+SIGNATURE_BINS = 32
+
+
+def frame_signature(gray):
+    height, width = gray.shape
+    small = cv2.resize(gray, (SIGNATURE_WIDTH, max(1, round(height * SIGNATURE_WIDTH / width))),
+                       interpolation=cv2.INTER_AREA)
+    histogram = cv2.calcHist([small], [0], None, [SIGNATURE_BINS], [0, 256])
+    return cv2.normalize(histogram, histogram)
+
+
+def is_scene_cut(previous, current, threshold=None):
+    if threshold is None:
+        threshold = getattr(settings, 'BESTFRAMER_SHOT_CUT_THRESHOLD', 0.3)
+    return cv2.compareHist(previous, current, cv2.HISTCMP_BHATTACHARYYA) > threshold
+
+
+def iter_shot_candidates(cap, per_shot=None, coarse_width=None, threshold=None, samples_per_second=None,
+                         max_samples=None, sampling_mode=None):
+    """Split the sampled frames of ``cap`` into shots and yield the best few of each.
+
+    A new shot starts when the luminance histograms of two consecutive
+    samples are further apart than ``threshold``. Samples are ranked within
+    their shot by the quality score of a ``coarse_width`` thumbnail, and each
+    shot is yielded as up to ``per_shot`` ``(coarse_score, frame_index, frame)``
+    tuples, best first.
+    """
+    if per_shot is None:
+        per_shot = getattr(settings, 'BESTFRAMER_SHOT_CANDIDATES', 3)
+    if coarse_width is None:
+        coarse_width = getattr(settings, 'BESTFRAMER_TWO_PASS_COARSE_WIDTH', 160)
+
+    budget = current_budget()
+    candidates = []
+    previous = None
+    for frame_index, frame in iter_sampled_frames(cap, samples_per_second, max_samples, sampling_mode):
+        thumbnail = downscale(frame, coarse_width)
+        signature = frame_signature(cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY))
+        if previous is not None and is_scene_cut(previous, signature, threshold) and candidates:
+            yield sorted(candidates, reverse=True)
+            candidates = []
+            budget.hold('candidates', 0)
+        previous = signature
+
+        score = score_frame(thumbnail)
+        if score is None:
+            continue
+        # Only the best few full-size frames of the current shot are held.
+        item = (score, frame_index, frame)
+        if len(candidates) < per_shot:
+            heapq.heappush(candidates, item)
+        elif item[:2] > candidates[0][:2]:
+            heapq.heapreplace(candidates, item)
+        budget.hold('candidates', sum(candidate[2].nbytes for candidate in candidates))
+
+    if candidates:
+        yield sorted(candidates, reverse=True)
+
+
+def shot_search(cap, top_n=1, per_shot=None, samples_per_second=None, max_samples=None, sampling_mode=None,
+                backend=None):
+    """Return up to ``top_n`` frames, best first, each from a different shot.
+
+    Only the candidates of each shot reach landmark validation, tried in
+    coarse-score order until one passes, so a static shot costs one face mesh
+    run instead of one per sample.
+    """
+    from .bestframer import is_good_frame
+
+    store = FrameStore(cap)
+    best = []
+    shots = 0
+    for candidates in iter_shot_candidates(cap, per_shot, None, None, samples_per_second, max_samples,
+                                           sampling_mode):
+        shots += 1
+        for _, frame_index, frame in candidates:
+            if not is_good_frame(frame, backend):
+                continue
+            score = score_frame(frame)
+            if score is None:
+                continue
+            item = (score, frame_index)
+            if len(best) < top_n:
+                heapq.heappush(best, item)
+                store.keep(frame_index, frame)
+            elif item > best[0]:
+                store.discard(heapq.heapreplace(best, item)[1])
+                store.keep(frame_index, frame)
+            break
+
+    logger.info(f"Found {shots} shots, kept the best frame of {len(best)}")
+    return [store.load(frame_index) for _, frame_index in sorted(best, reverse=True)]
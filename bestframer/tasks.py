@@ -0,0 +1,49 @@
+import os
+from django.urls import reverse
+from Autra.cache import hash_file
+from Autra.ingest import remote_content_hash
+from jobs.batch import is_url
+from jobs.queue import JobError
+from .bestframer import extract_filename_from_url
+from .views import save_best_frames
+
+
+def find_best_frame(job):
+    video_input = job.params['video_input']
+    try:
+        content_hash = job.params.get('content_hash')
+        if content_hash is None:
+            content_hash = remote_content_hash(video_input) if is_url(video_input) else hash_file(video_input)
+        frames, error = save_best_frames(video_input, job.params['name'], content_hash,
+                                         job.params.get('top_n', 1), job.params.get('backend'))
+    finally:
+        if job.params.get('remove_input') and os.path.exists(video_input):
+            os.remove(video_input)
+    return best_frames_result(frames, error)
+
+
+def best_frames_result(frames, error):
+    if error == 'open':
+        raise JobError("Failed to open the video.")
+    if error == 'no_face':
+        raise JobError("No face detected in the best frame from the video.")
+    if error:
+        raise JobError("Error saving best frame.")
+    best_frames = [{
+        'id': str(frame.id),
+        'best_frame': os.path.splitext(frame.filename)[0],
+        'download_url': reverse('download_image', args=[frame.id]),
+    } for frame in frames]
+    return dict(best_frames[0], best_frames=best_frames)
+
+
+def batch_params(source, content_hash=None, remove_input=False, top_n=1, backend=None):
+    """Job params for one video URL or local file of a batch; files are hashed by the job."""
+    if is_url(source):
+        params = {'video_input': source, 'name': extract_filename_from_url(source)}
+    else:
+        params = {'video_input': source, 'name': os.path.splitext(os.path.basename(source))[0],
+                  'content_hash': content_hash, 'remove_input': remove_input}
+    params['top_n'] = top_n
+    params['backend'] = backend
+    return params
@@ -1,3 +1,125 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from Autra.benchsuite import FIXTURE_FPS, FIXTURE_SEED, synthetic_frame
+from Autra.lazy import lazy_import
+from . import bestframer
+from .backends import FaceBackend
+from .bestframer import exhaustive_search, two_pass_search, coarse_ranking, is_good_frame, get_best_frame
 
-# Create your tests here.
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+
+class DiscBackend(FaceBackend):
+    """Takes the bright disc of the synthetic fixtures for a face, and finds it good in the right half of the frame."""
+
+    name = 'test-disc'
+
+    def face_box(self, frame):
+        height, width = frame.shape[:2]
+        return width // 4, height // 4, width // 2, height // 2
+
+    def ratios(self, frame, scale=1.0):
+        gray = frame.mean(axis=2)
+        half = gray.shape[1] // 2
+        return 0.3, 0.3, float(gray[:, half:].mean() > gray[:, :half].mean())
+
+    def is_good(self, left_eye_ratio, right_eye_ratio, mouth_ratio):
+        return mouth_ratio > 0
+
+
+def write_fixture(path, width, height, seconds):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), FIXTURE_FPS, (width, height))
+    rng = np.random.default_rng(FIXTURE_SEED)
+    for index in range(int(seconds * FIXTURE_FPS)):
+        writer.write(synthetic_frame(index, width, height, rng))
+    writer.release()
+    return path
+
+
+class SharpRejectingBackend(DiscBackend):
+    """Finds a face in every frame but rejects the sharp ones, which lead the coarse ranking."""
+
+    name = 'test-blurry'
+
+    def ratios(self, frame, scale=1.0):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return 0.3, 0.3, float(cv2.Laplacian(gray, cv2.CV_64F).var() < 300)
+
+
+class NoFaceBackend(DiscBackend):
+    name = 'test-none'
+
+    def ratios(self, frame, scale=1.0):
+        return None
+
+
+@override_settings(BESTFRAMER_BACKENDS={
+    'test-disc': 'bestframer.tests.DiscBackend',
+    'test-blurry': 'bestframer.tests.SharpRejectingBackend',
+    'test-none': 'bestframer.tests.NoFaceBackend',
+}, BESTFRAMER_SAMPLES_PER_SECOND=4, BESTFRAMER_MAX_SAMPLES=None, BESTFRAMER_SAMPLING_MODE='auto',
+    BESTFRAMER_TWO_PASS_TOP_K=8, BESTFRAMER_TWO_PASS_COARSE_WIDTH=160)
+class TwoPassSearchTests(SimpleTestCase):
+    FIXTURES = ((320, 240, 5), (640, 360, 8), (1280, 720, 4))
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.paths = [write_fixture(os.path.join(cls.directory, f"video_{width}x{height}_{seconds}s.avi"),
+                                   width, height, seconds) for width, height, seconds in cls.FIXTURES]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def search(self, path, search, *args, **options):
+        cap = cv2.VideoCapture(path)
+        try:
+            return search(cap, *args, **options)
+        finally:
+            cap.release()
+
+    def assertSameFrame(self, path, backend, top_k=None):
+        exhaustive = self.search(path, exhaustive_search, backend=backend)
+        two_pass = self.search(path, two_pass_search, top_k, backend=backend)
+        self.assertIsNotNone(exhaustive)
+        self.assertIsNotNone(two_pass)
+        self.assertTrue(np.array_equal(exhaustive, two_pass))
+
+    def test_matches_exhaustive_search(self):
+        for path in self.paths:
+            with self.subTest(video=os.path.basename(path)):
+                self.assertSameFrame(path, 'test-disc')
+
+    def test_walks_down_the_ranking_past_frames_without_a_good_face(self):
+        top_k = 4
+        for path in self.paths:
+            with self.subTest(video=os.path.basename(path)):
+                ranking = self.search(path, coarse_ranking, 160)
+                cap = cv2.VideoCapture(path)
+                for frame_index in ranking[:top_k]:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+                    self.assertFalse(is_good_frame(cap.read()[1], 'test-blurry'))
+                cap.release()
+                self.assertSameFrame(path, 'test-blurry', top_k)
+
+    def test_no_good_frame(self):
+        self.assertIsNone(self.search(self.paths[0], two_pass_search, 2, backend='test-none'))
+
+    @override_settings(BESTFRAMER_PARALLEL_MIN_SEGMENT_SECONDS=1)
+    def test_workers_keep_the_search_mode(self):
+        path = self.paths[1]
+        with mock.patch.object(bestframer, 'parallel_search') as parallel_search:
+            _, best_frame = get_best_frame(path, workers=2, search='two_pass', top_k=4, backend='test-blurry')
+        parallel_search.assert_not_called()
+        self.assertTrue(np.array_equal(best_frame, self.search(path, two_pass_search, 4, backend='test-blurry')))
+
+        with mock.patch.object(bestframer, 'parallel_search', return_value=None) as parallel_search:
+            get_best_frame(path, workers=2, search='exhaustive', backend='test-blurry')
+        parallel_search.assert_called_once()
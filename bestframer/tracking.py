@@ -0,0 +1,162 @@
+import logging
+from django.conf import settings
+from .backends import get_backend, detection_frame
+from .memory import FrameStore
+from .sampling import iter_sampled_frames
+from .scoring import score_frame
+from .shots import frame_signature, is_scene_cut
+from Autra.lazy import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+# Face mesh landmarks used by the eye and mouth checks.
+TRACKED_LANDMARKS = (159, 145, 33, 133, 386, 374, 362, 263, 13, 14)
+
+ROI_MARGIN = 0.25
+LK_WINDOW = (21, 21)
+LK_MAX_LEVEL = 3
+
+
+def landmark_ratios(points, width, height):
+    """Eye opening and mouth ratios from landmark points in pixels, as MediaPipeBackend.ratios computes them."""
+    p = dict(zip(TRACKED_LANDMARKS, points))
+    left_eye_ratio = ((p[159][1] - p[145][1]) / height) / ((p[33][0] - p[133][0]) / width)
+    right_eye_ratio = ((p[386][1] - p[374][1]) / height) / ((p[362][0] - p[263][0]) / width)
+    mouth_ratio = (p[13][1] - p[14][1]) / height
+    return left_eye_ratio, right_eye_ratio, mouth_ratio
+
+
+class FaceTracker:
+    """Follows one face across sampled frames without running the face mesh on each of them.
+
+    The mesh runs on the first frame, then the eye and mouth landmarks are
+    tracked with pyramidal Lucas-Kanade flow inside the face ROI. A full
+    detection runs again after a scene cut, when forward-backward tracking
+    error exceeds ``max_error`` pixels, or every ``redetect_interval`` frames
+    to bound drift.
+    """
+
+    def __init__(self, redetect_interval=None, max_error=None, cut_threshold=None):
+        if redetect_interval is None:
+            redetect_interval = getattr(settings, 'BESTFRAMER_TRACKING_REDETECT_INTERVAL', 25)
+        if max_error is None:
+            max_error = getattr(settings, 'BESTFRAMER_TRACKING_MAX_ERROR', 1.5)
+        self.redetect_interval = redetect_interval
+        self.max_error = max_error
+        self.cut_threshold = cut_threshold
+        self.detections = 0
+        self.tracked_frames = 0
+        self.reset()
+
+    def reset(self):
+        self.points = None
+        self.roi = None
+        self.gray = None
+        self.signature = None
+        self.since_detection = 0
+
+    def _set_roi(self, x1, y1, x2, y2, shape):
+        height, width = shape
+        self.roi = (max(0, int(x1)), max(0, int(y1)), min(width, int(x2)), min(height, int(y2)))
+
+    def detect(self, frame, gray):
+        from .detectors import face_mesh_pool
+
+        self.detections += 1
+        self.since_detection = 0
+        with face_mesh_pool().acquire() as face_mesh:
+            results = face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if not results.multi_face_landmarks:
+            self.points = None
+            return None
+
+        height, width = gray.shape
+        landmarks = results.multi_face_landmarks[0].landmark
+        mesh = np.array([(landmark.x * width, landmark.y * height) for landmark in landmarks], dtype=np.float32)
+        (x1, y1), (x2, y2) = mesh.min(axis=0), mesh.max(axis=0)
+        margin_x, margin_y = (x2 - x1) * ROI_MARGIN, (y2 - y1) * ROI_MARGIN
+        self._set_roi(x1 - margin_x, y1 - margin_y, x2 + margin_x, y2 + margin_y, gray.shape)
+        self.points = mesh[list(TRACKED_LANDMARKS)]
+        return self.points
+
+    def track(self, gray):
+        x1, y1, x2, y2 = self.roi
+        previous = self.gray[y1:y2, x1:x2]
+        current = gray[y1:y2, x1:x2]
+        offset = np.array([x1, y1], dtype=np.float32)
+        start = (self.points - offset).astype(np.float32).reshape(-1, 1, 2)
+
+        params = {
+            'winSize': LK_WINDOW,
+            'maxLevel': LK_MAX_LEVEL,
+            'criteria': (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01),
+        }
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(previous, current, start, None, **params)
+        if moved is None or not status.all():
+            return None
+        back, status, _ = cv2.calcOpticalFlowPyrLK(current, previous, moved, None, **params)
+        if back is None or not status.all():
+            return None
+        if np.abs(back - start).max() > self.max_error:
+            return None
+
+        points = moved.reshape(-1, 2) + offset
+        shift_x, shift_y = (points - self.points).mean(axis=0)
+        self._set_roi(x1 + shift_x, y1 + shift_y, x2 + shift_x, y2 + shift_y, gray.shape)
+        self.points = points
+        self.since_detection += 1
+        self.tracked_frames += 1
+        return points
+
+    def update(self, frame):
+        """Locate the face in ``frame``; returns its ROI as ``(x1, y1, x2, y2)`` or None."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        signature = frame_signature(gray)
+        cut = self.signature is not None and is_scene_cut(self.signature, signature, self.cut_threshold)
+
+        points = None
+        if self.points is not None and not cut and self.since_detection < self.redetect_interval:
+            points = self.track(gray)
+        if points is None:
+            points = self.detect(frame, gray)
+
+        self.gray = gray
+        self.signature = signature
+        return self.roi if points is not None else None
+
+
+def tracking_search(cap, samples_per_second=None, max_samples=None, sampling_mode=None):
+    tracker = FaceTracker()
+    store = FrameStore(cap)
+    best_index = None
+    best_score = 0
+    sampled = 0
+
+    for frame_index, frame in iter_sampled_frames(cap, samples_per_second, max_samples, sampling_mode):
+        sampled += 1
+        try:
+            # The tracker works on the detection-size frame; its ROI is mapped back for scoring.
+            small_frame, scale = detection_frame(frame)
+            roi = tracker.update(small_frame)
+            if roi is None:
+                continue
+            height, width = small_frame.shape[:2]
+            if not get_backend('mediapipe').is_good(*landmark_ratios(tracker.points, width, height)):
+                continue
+        except (Exception,) as e:
+            tracker.reset()
+            continue
+
+        x1, y1, x2, y2 = (int(value / scale) for value in roi)
+        score = score_frame(frame[y1:y2, x1:x2])
+        if score is not None and score > best_score:
+            store.discard(best_index)
+            best_score = score
+            best_index = store.keep(frame_index, frame)
+
+    logger.info(f"Tracked the face through {tracker.tracked_frames} of {sampled} sampled frames "
+                f"with {tracker.detections} full detections")
+    return store.load(best_index)
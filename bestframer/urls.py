@@ -7,7 +7,9 @@ from .views import download_image
 
 urlpatterns = [
     path('', views.process_video, name='process_video'),
-    path('download_image/<str:filename>/', download_image, name='download_image'),
+    path('submit/', views.submit_video, name='submit_video'),
+    path('batch/', views.batch_videos, name='batch_videos'),
+    path('download_image/<uuid:artifact_id>/', download_image, name='download_image'),
 ]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
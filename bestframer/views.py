@@ -1,89 +1,206 @@
 from django.core.files.uploadedfile import UploadedFile
-from django.http import FileResponse, HttpResponse
+from django.http import HttpResponse, JsonResponse
 import logging
-from datetime import datetime, timedelta
 from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
 import os
-import cv2
-from .bestframer import get_best_frame_from_web, get_best_frame_from_video
+import json
+import uuid
+import base64
+import shutil
+from .bestframer import get_best_frames, get_best_frames_from_video, extract_filename_from_url, best_frame_params
+from .backends import backend_names
 from django.conf import settings
+from Autra.artifacts import unique_path, serve_artifact
+from Autra.cache import get_cache
+from Autra.uploadhandlers import store_upload, store_upload_async, read_form
+from jobs.batch import new_batch_dir, request_sources, batch_response, is_url
+from jobs.queue import JobError, QueueFull, submit, run_async
+from jobs.views import job_payload, busy_response
+from Autra.lazy import lazy_import
+from Autra.metrics import timed
+from .models import BestFrame
+
+cv2 = lazy_import('cv2')
 
 logger = logging.getLogger(__name__)
 
 
-def generate_filename(base_dir, base_name):
-    base_name = os.path.basename(base_name)
-    filename = f"my_bestframe/{base_name}.jpeg"
-    file_path = os.path.join(base_dir, filename)
-    return file_path, base_name
-
-
-def process_video(request):
-    if request.method == 'POST':
-        video_url = request.POST.get('video_url')
-        video_file = request.FILES.get('video_file')
-        if video_url:
-            filename, cropped_frame = get_best_frame_from_web(video_url)
-            if filename and cropped_frame is not None:
-                file_path, base_filename = generate_filename(settings.MEDIA_ROOT, filename)
-                try:
-                    cv2.imwrite(file_path, cropped_frame)
-                    return render(request, 'best_framer/best_frame.html',
-                                  {'best_frame': base_filename, 'video_url': video_url})
-                except Exception as e:
-                    logger.error(f"Error saving image: {e}")
-                    return HttpResponse("Error saving best frame.")
-            else:
-                return HttpResponse("No face detected in the best frame from web video.")
-
-        elif video_file:
-            if isinstance(video_file, UploadedFile):
-                base_filename, _ = os.path.splitext(video_file.name)
-                temp_path = os.path.join(settings.MEDIA_ROOT, f"my_bestframe/videos/{video_file.name}")
-                with open(temp_path, 'wb+') as destination:
-                    for chunk in video_file.chunks():
-                        destination.write(chunk)
-                cap = cv2.VideoCapture(temp_path)
-                if not cap.isOpened():
-                    return HttpResponse("Failed to open the video file.")
-                filename, cropped_frame = get_best_frame_from_video(cap, video_file)
-                cap.release()
-                os.remove(temp_path)
-                if filename and cropped_frame is not None:
-                    file_path, base_filename = generate_filename(settings.MEDIA_ROOT, base_filename)
-                    try:
-                        cv2.imwrite(file_path, cropped_frame)
-                        return render(request, 'best_framer/best_frame.html',
-                                      {'best_frame': base_filename, 'video_file': video_file})
-                    except Exception as e:
-                        logger.error(f"Error saving image: {e}")
-                        return HttpResponse("Error saving best frame.")
-                else:
-                    return HttpResponse("No face detected in the best frame from the video file.")
-            else:
-                return HttpResponse("Invalid video file uploaded.")
-        else:
-            return HttpResponse("Please enter a valid video URL or select a video file.")
+def get_top_n(value):
+    try:
+        top_n = int(value or 1)
+    except (TypeError, ValueError):
+        return None
+    if top_n < 1 or top_n > getattr(settings, 'BESTFRAMER_MAX_TOP_N', 10):
+        return None
+    return top_n
+
+
+def get_search_options(data):
+    """``top_n`` and ``backend`` of a request; raises ValueError with a message for the client."""
+    top_n = get_top_n(data.get('top_n'))
+    if top_n is None:
+        raise ValueError(f"top_n must be between 1 and {getattr(settings, 'BESTFRAMER_MAX_TOP_N', 10)}.")
+    backend = data.get('backend') or None
+    if backend is not None and backend not in backend_names():
+        raise ValueError(f"backend must be one of: {', '.join(backend_names())}.")
+    return {'top_n': top_n, 'backend': backend}
+
+
+def best_frames_cache_key(content_hash, top_n=1, backend=None):
+    return get_cache().key(content_hash, **best_frame_params(top_n=top_n, backend=backend))
+
+
+def save_best_frames(video_input, name, content_hash, top_n=1, backend=None, capture=None):
+    """Find the best frames of up to ``top_n`` shots of ``video_input`` and save them as JPEGs.
+
+    Each is recorded as a :class:`BestFrame` and downloaded as ``{name}.jpeg``
+    for the best one and ``{name}_2.jpeg``, ``{name}_3.jpeg`` and so on for
+    the others. ``backend`` names the face backend, the deployment default
+    when None. Returns ``(best_frames, None)`` on success, or ``(None, reason)`` where reason
+    is 'open', 'no_face' or 'save'. Results are cached by ``content_hash``
+    and the search parameters, and not at all without a ``content_hash``. With ``capture`` (an opened capture of
+    ``video_input``) the frames are read from it instead of opening the input.
+    """
+    cache = get_cache()
+    key = best_frames_cache_key(content_hash, top_n, backend) if content_hash else None
+
+    data = cache.get('best_frames', key) if key else None
+    if data is not None:
+        images = [base64.b64decode(image) for image in json.loads(data)]
     else:
+        if capture is not None:
+            filename, cropped_frames = get_best_frames_from_video(capture, name, top_n, backend=backend)
+        else:
+            filename, cropped_frames = get_best_frames(video_input, top_n, backend=backend)
+        if filename is None:
+            return None, 'open'
+        if not cropped_frames:
+            return None, 'no_face'
+        images = []
+        for cropped_frame in cropped_frames:
+            with timed('encode'):
+                ret, encoded = cv2.imencode('.jpeg', cropped_frame)
+            if not ret:
+                return None, 'save'
+            images.append(encoded.tobytes())
+        if key:
+            encoded_images = [base64.b64encode(image).decode() for image in images]
+            cache.put('best_frames', key, json.dumps(encoded_images).encode())
+
+    source = video_input if isinstance(video_input, str) and is_url(video_input) else name
+    params = best_frame_params(top_n=top_n, backend=backend)
+    best_frames = []
+    for rank, image in enumerate(images, start=1):
+        filename = f"{os.path.basename(name if rank == 1 else f'{name}_{rank}')}.jpeg"
+        file_path = unique_path('my_bestframe', filename)
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'wb') as image_file:
+                image_file.write(image)
+        except OSError as e:
+            logger.error(f"Error saving image: {e}")
+            return None, 'save'
+        best_frames.append(BestFrame.register(file_path, filename, content_hash=content_hash, source=source,
+                                              params=params, rank=rank))
+    return best_frames, None
+
+
+def save_best_frame(video_input, name, content_hash):
+    best_frames, error = save_best_frames(video_input, name, content_hash)
+    return (best_frames[0] if best_frames else None), error
+
+
+async def process_video(request):
+    """Form view: the search runs on the bestframe job workers and this view awaits it
+    without holding a thread, answering 429 when too many are already waiting.
+    """
+    if request.method != 'POST':
         return render(request, 'best_framer/index.html')
-def download_image(request, filename):
-    filename = os.path.basename(filename)
-    file_path = os.path.join(settings.MEDIA_ROOT, f"my_bestframe/{filename}.jpeg")
-    if os.path.exists(file_path):
-        return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=f"{filename}.jpeg")
+
+    post, files = await read_form(request)
+    video_url = post.get('video_url')
+    video_file = files.get('video_file')
+    if video_url:
+        # The job keys URLs by what they serve (see remote_content_hash), not by the URL alone.
+        params = {'video_input': video_url, 'name': extract_filename_from_url(video_url)}
+        context = {'video_url': video_url}
+    elif video_file:
+        if not isinstance(video_file, UploadedFile):
+            return HttpResponse("Invalid video file uploaded.")
+        base_filename, _ = os.path.splitext(os.path.basename(video_file.name))
+        video_path = os.path.join(settings.MEDIA_ROOT,
+                                  f"my_bestframe/videos/{uuid.uuid4().hex}_{os.path.basename(video_file.name)}")
+        content_hash = await store_upload_async(video_file, video_path)
+        params = {'video_input': video_path, 'name': base_filename, 'content_hash': content_hash,
+                  'remove_input': True}
+        context = {'video_file': video_file}
     else:
-        return HttpResponse("File not found.")
-def cleanup_old_files():
-    now = datetime.now()
-    cutoff = now - timedelta(days=3)
-    media_path = settings.MEDIA_ROOT
-    for filename in os.listdir(media_path):
-        file_path = os.path.join(media_path, filename)
-        try:
-            if os.path.isfile(file_path):
-                file_mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
-                if file_mtime < cutoff:
-                    os.remove(file_path)
-                    logger.info(f"Deleted old file: {filename}")
-        except Exception as e:
-            logger.error(f"Error deleting file {filename}: {e}")
\ No newline at end of file
+        return HttpResponse("Please enter a valid video URL or select a video file.")
+
+    try:
+        result = await run_async('bestframe', params)
+    except QueueFull as e:
+        if params.get('remove_input') and os.path.exists(params['video_input']):
+            os.remove(params['video_input'])
+        return busy_response(e)
+    except JobError as e:
+        return HttpResponse(str(e))
+    context['best_frame'] = result['best_frame']
+    context['download_url'] = result['download_url']
+    return render(request, 'best_framer/best_frame.html', context)
+
+@csrf_exempt
+def submit_video(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': "POST a video_url or a video_file."}, status=405)
+
+    try:
+        options = get_search_options(request.POST)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    video_url = request.POST.get('video_url')
+    video_file = request.FILES.get('video_file')
+    if video_url:
+        params = {'video_input': video_url, 'name': extract_filename_from_url(video_url)}
+    elif isinstance(video_file, UploadedFile):
+        base_filename, _ = os.path.splitext(os.path.basename(video_file.name))
+        video_path = os.path.join(settings.MEDIA_ROOT,
+                                  f"my_bestframe/videos/{uuid.uuid4().hex}_{os.path.basename(video_file.name)}")
+        content_hash = store_upload(video_file, video_path)
+        params = {'video_input': video_path, 'name': base_filename, 'remove_input': True,
+                  'content_hash': content_hash}
+    else:
+        return JsonResponse({'error': "Please enter a valid video URL or select a video file."}, status=400)
+
+    params.update(options)
+    job = submit('bestframe', params)
+    return JsonResponse(job_payload(job), status=202)
+
+
+@csrf_exempt
+def batch_videos(request):
+    """Find the best frames of many videos in one call and stream one NDJSON line per video.
+
+    Accepts ``url`` fields (or ``urls``, one per line), ``files`` uploads and
+    ``archive`` zip files, plus the ``top_n`` and ``backend`` of submit_video.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': "POST video URLs, files or a zip archive."}, status=405)
+    try:
+        options = get_search_options(request.POST)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    directory = new_batch_dir()
+    try:
+        sources = request_sources(request, directory)
+    except JobError as e:
+        shutil.rmtree(directory, ignore_errors=True)
+        return JsonResponse({'error': str(e)}, status=400)
+    return batch_response('bestframe', sources, directory, **options)
+
+
+def download_image(request, artifact_id):
+    return serve_artifact(BestFrame, artifact_id)
@@ -0,0 +1,49 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _preload(modules):
+    from Autra.lazy import load
+    from transcriber.registry import preload_configured_models
+
+    for name in modules:
+        load(name)
+    preload_configured_models()
+
+
+def when_ready(server):
+    # With --preload the app is already imported in the master; load the heavy
+    # libraries and Whisper models here too so forked workers share their pages
+    # copy-on-write. MediaPipe graphs are still built per worker after the fork.
+    if server.cfg.preload_app:
+        from django.conf import settings
+
+        try:
+            _preload(getattr(settings, 'PRELOAD_MODULES', []))
+        except Exception as e:
+            logger.error(f"Preloading in the master failed: {e}")
+
+
+def post_worker_init(worker):
+    from django.conf import settings
+
+    if not worker.cfg.preload_app:
+        try:
+            _preload([])
+        except Exception as e:
+            logger.error(f"Model preload failed: {e}")
+
+    if getattr(settings, 'JOBS_RUN_IN_PROCESS', True):
+        try:
+            from jobs.queue import resume_jobs
+            resume_jobs()
+        except Exception as e:
+            logger.error(f"Resuming queued jobs failed: {e}")
+
+    if getattr(settings, 'BESTFRAMER_WARM_UP_DETECTORS', False):
+        try:
+            from bestframer.backends import get_backend
+            get_backend().warm_up()
+        except Exception as e:
+            logger.error(f"Detector warm-up failed: {e}")
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import zipfile
+from concurrent.futures import as_completed
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.module_loading import import_string
+from Autra.uploadhandlers import store_upload
+from .queue import JobError, run_inline
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ITEMS = 100
+
+
+def get_max_items():
+    return getattr(settings, 'JOBS_BATCH_MAX_ITEMS', DEFAULT_MAX_ITEMS)
+
+
+def is_url(source):
+    return source.startswith(('http://', 'https://'))
+
+
+def get_params_builder(kind):
+    builders = getattr(settings, 'JOBS_BATCH_PARAMS', {})
+    if kind not in builders:
+        raise JobError(f"Job kind {kind} does not support batches")
+    return import_string(builders[kind])
+
+
+def new_batch_dir():
+    path = os.path.join(settings.UPLOAD_ROOT, f"batch-{uuid.uuid4().hex}")
+    os.makedirs(path)
+    return path
+
+
+def item_path(directory, position, name):
+    # One sub-directory per item keeps the original file name (the result is named
+    # after it) while two items with the same name cannot clash.
+    path = os.path.join(directory, str(position), os.path.basename(name))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def extract_archive(archive, directory, start=0):
+    """Unpack the media files of a zip archive into ``directory`` and return them as batch sources.
+
+    Hidden files and extensions outside UPLOAD_ALLOWED_EXTENSIONS are skipped.
+    Archives with more items than JOBS_BATCH_MAX_ITEMS, or that would unpack
+    to more than UPLOAD_MAX_BYTES, are refused before anything is written.
+    """
+    allowed = getattr(settings, 'UPLOAD_ALLOWED_EXTENSIONS', None)
+    max_bytes = getattr(settings, 'UPLOAD_MAX_BYTES', None)
+    try:
+        zip_file = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise JobError("The archive is not a valid zip file.")
+
+    with zip_file:
+        members = []
+        for member in zip_file.infolist():
+            name = os.path.basename(member.filename)
+            extension = os.path.splitext(name)[1].lower().lstrip('.')
+            if member.is_dir() or name.startswith('.'):
+                continue
+            if allowed is not None and extension not in allowed:
+                logger.info(f"Skipping {member.filename} in batch archive")
+                continue
+            members.append(member)
+        if start + len(members) > get_max_items():
+            raise JobError(f"A batch holds at most {get_max_items()} items.")
+        if max_bytes and sum(member.file_size for member in members) > max_bytes:
+            raise JobError("The archive is too large once unpacked.")
+
+        sources = []
+        for position, member in enumerate(members, start=start):
+            path = item_path(directory, position, member.filename)
+            with zip_file.open(member) as source, open(path, 'wb') as destination:
+                shutil.copyfileobj(source, destination, 1024 * 1024)
+            sources.append({'source': path, 'label': member.filename})
+    return sources
+
+
+def request_sources(request, directory):
+    """Batch sources of a POST: URLs from repeated ``url`` fields or one per line in ``urls``,
+    uploads from repeated ``files`` fields, and the contents of zip files sent as ``archive``.
+    """
+    sources = [{'source': url, 'label': url} for url in request.POST.getlist('url') if url.strip()]
+    sources += [{'source': url.strip(), 'label': url.strip()}
+                for url in request.POST.get('urls', '').splitlines() if url.strip()]
+    for url in [source['source'] for source in sources]:
+        if not is_url(url):
+            raise JobError(f"Not an http(s) URL: {url}")
+
+    for uploaded_file in request.FILES.getlist('files'):
+        path = item_path(directory, len(sources), uploaded_file.name)
+        content_hash = store_upload(uploaded_file, path)
+        sources.append({'source': path, 'label': uploaded_file.name, 'content_hash': content_hash})
+    for archive in request.FILES.getlist('archive'):
+        sources += extract_archive(archive, directory, start=len(sources))
+
+    if not sources:
+        raise JobError("Send video URLs, files or a zip archive.")
+    if len(sources) > get_max_items():
+        raise JobError(f"A batch holds at most {get_max_items()} items.")
+    return sources
+
+
+def run_batch(kind, sources, remove_input=False, **options):
+    """Run every source through the ``kind`` handler on the shared job workers.
+
+    Yields one dict per item as soon as it finishes (so not in input order;
+    ``index`` is the position in ``sources``), then a summary with ``done``
+    set. ``options`` are passed to the JOBS_BATCH_PARAMS builder of ``kind``.
+    """
+    build = get_params_builder(kind)
+    start = time.perf_counter()
+    failed = 0
+    futures = {}
+    try:
+        for index, source in enumerate(sources):
+            try:
+                params = build(source['source'], content_hash=source.get('content_hash'),
+                               remove_input=remove_input, **options)
+            except JobError as e:
+                failed += 1
+                yield {'index': index, 'input': source['label'], 'status': 'failed', 'error': str(e)}
+                continue
+            futures[run_inline(kind, params)] = index
+
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                logger.error(f"Batch item {sources[index]['label']} ({kind}) failed: {e}")
+                yield {'index': index, 'input': sources[index]['label'], 'status': 'failed', 'error': str(e)}
+            else:
+                yield {'index': index, 'input': sources[index]['label'], 'status': 'done', 'result': result}
+    finally:
+        # Items still queued when the consumer goes away are dropped.
+        for future in futures:
+            future.cancel()
+    yield {'done': True, 'count': len(sources), 'failed': failed,
+           'seconds': round(time.perf_counter() - start, 3)}
+
+
+def batch_response(kind, sources, directory, **options):
+    """Stream the results of :func:`run_batch` as NDJSON and remove ``directory`` afterwards."""
+    batch = run_batch(kind, sources, remove_input=True, **options)
+
+    def lines():
+        try:
+            for line in batch:
+                yield json.dumps(line) + "\n"
+        finally:
+            batch.close()
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
@@ -0,0 +1,57 @@
+import os
+import json
+import shutil
+import zipfile
+from django.core.management.base import BaseCommand, CommandError
+from jobs.batch import get_max_items, is_url, new_batch_dir, extract_archive, run_batch
+from jobs.queue import JobError
+
+
+class Command(BaseCommand):
+    help = "Run many videos or audio files through one job kind and print one NDJSON line per item."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['bestframe', 'transcribe'])
+        parser.add_argument('inputs', nargs='+', metavar='INPUT',
+                            help="URLs, local files or zip archives of files.")
+        parser.add_argument('--top-n', type=int, default=None, help="Best frames per video (bestframe only).")
+        parser.add_argument('--backend', default=None, help="Face backend (bestframe only).")
+
+    def handle(self, *args, **options):
+        from transcriber.registry import preload_configured_models
+
+        batch_options = {}
+        if options['kind'] == 'bestframe':
+            from bestframer.views import get_search_options
+
+            try:
+                batch_options = get_search_options({'top_n': options['top_n'], 'backend': options['backend']})
+            except ValueError as e:
+                raise CommandError(str(e))
+        elif options['kind'] == 'transcribe':
+            preload_configured_models()
+
+        directory = None
+        sources = []
+        try:
+            for source in options['inputs']:
+                if is_url(source):
+                    sources.append({'source': source, 'label': source})
+                elif not os.path.isfile(source):
+                    raise CommandError(f"No such file: {source}")
+                elif zipfile.is_zipfile(source):
+                    directory = directory or new_batch_dir()
+                    sources += extract_archive(source, directory, start=len(sources))
+                else:
+                    sources.append({'source': os.path.abspath(source), 'label': source})
+            if len(sources) > get_max_items():
+                raise CommandError(f"A batch holds at most {get_max_items()} items.")
+
+            # The inputs are left in place; only files unpacked from archives are removed, at the end.
+            for line in run_batch(options['kind'], sources, **batch_options):
+                self.stdout.write(json.dumps(line))
+        except JobError as e:
+            raise CommandError(str(e))
+        finally:
+            if directory:
+                shutil.rmtree(directory, ignore_errors=True)
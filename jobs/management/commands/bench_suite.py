@@ -0,0 +1,60 @@
+import os
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from Autra.benchsuite import (CASES, DEFAULT_RESOLUTIONS, DEFAULT_VIDEO_SECONDS, DEFAULT_AUDIO_SECONDS,
+                              DEFAULT_MAX_COMBINED_OVERLAP, run_suite, fingerprints, load_baseline,
+                              compare_fingerprints, slow_overlaps)
+
+
+def resolution(value):
+    width, _, height = value.partition('x')
+    return int(width), int(height)
+
+
+class Command(BaseCommand):
+    help = "Benchmark get_best_frame, audio extraction, transcription and the combined job on generated fixtures."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resolutions', nargs='+', type=resolution,
+                            default=list(DEFAULT_RESOLUTIONS), metavar='WxH')
+        parser.add_argument('--video-seconds', nargs='+', type=int, default=list(DEFAULT_VIDEO_SECONDS))
+        parser.add_argument('--audio-seconds', nargs='+', type=int, default=list(DEFAULT_AUDIO_SECONDS))
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--cases', nargs='+', choices=list(CASES), help="Run only these cases.")
+        parser.add_argument('--skip-transcribe', action='store_true', help="Leave out the Whisper cases.")
+        parser.add_argument('--model', default=None)
+        parser.add_argument('--profile', default=None, help="Transcription inference profile.")
+        parser.add_argument('--output', help="Write the report here instead of stdout.")
+        parser.add_argument('--baseline', help="Fail when a case's output differs from this report "
+                                               "(default: BENCH_BASELINE).")
+        parser.add_argument('--no-baseline', action='store_true', help="Do not compare with any baseline.")
+        parser.add_argument('--save-baseline', help="Write the output fingerprints of this run here.")
+        parser.add_argument('--max-overlap', type=float, default=DEFAULT_MAX_COMBINED_OVERLAP,
+                            help="Fail when the combined job takes longer than this times its slower half.")
+
+    def handle(self, *args, **options):
+        report = run_suite(options['resolutions'], options['video_seconds'], options['audio_seconds'],
+                           repeat=options['repeat'], transcribe=not options['skip_transcribe'],
+                           model_name=options['model'], profile=options['profile'], cases=options['cases'])
+
+        baseline = options['baseline'] or getattr(settings, 'BENCH_BASELINE', None)
+        if baseline and not options['no_baseline'] and (options['baseline'] or os.path.exists(baseline)):
+            report['changes'] = compare_fingerprints(report, load_baseline(baseline))
+        report['slow_overlaps'] = slow_overlaps(report, options['max_overlap'])
+
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(text)
+        else:
+            self.stdout.write(text)
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline_file:
+                json.dump(fingerprints(report), baseline_file, indent=2, sort_keys=True)
+        if report.get('changes'):
+            raise CommandError("Output changed from the baseline:\n" + "\n".join(report['changes']))
+        if report['slow_overlaps']:
+            raise CommandError("The combined job does not run its halves side by side:\n"
+                               + "\n".join(report['slow_overlaps']))
@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from Autra.artifacts import evict_artifacts
+from Autra.cache import get_cache
+
+
+class Command(BaseCommand):
+    help = "Delete result files and cache entries that were not used recently or do not fit in their budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, help="Seconds since the last download (ARTIFACTS_MAX_AGE_SECONDS).")
+        parser.add_argument('--max-bytes', type=int, help="Total size of the result files (ARTIFACTS_MAX_BYTES).")
+        parser.add_argument('--interval', type=float,
+                            help="Keep running and evict every this many seconds instead of once.")
+
+    def handle(self, *args, **options):
+        while True:
+            removed = evict_artifacts(options['max_age'], options['max_bytes'])
+            evicted = get_cache().evict()
+            self.stdout.write(f"Removed {removed} result files and {evicted} cache entries.")
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from jobs.queue import dispatch_queued
+
+
+class Command(BaseCommand):
+    help = "Process queued jobs from the database in this process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between queue polls.")
+
+    def handle(self, *args, **options):
+        from transcriber.registry import preload_configured_models
+
+        preload_configured_models()
+        self.stdout.write("Waiting for jobs...")
+        while True:
+            dispatch_queued()
+            time.sleep(options['interval'])
@@ -0,0 +1,19 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from Autra.startup import HEAVY_MODULES, startup_cost, import_cost
+
+
+class Command(BaseCommand):
+    help = "Report what a worker pays at startup and what each heavy dependency costs to import."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modules', nargs='*', default=list(HEAVY_MODULES),
+                            help="Modules to time on their own (defaults to the heavy dependencies).")
+
+    def handle(self, *args, **options):
+        report = {
+            'startup': startup_cost(cwd=settings.BASE_DIR),
+            'imports': [import_cost(module, cwd=settings.BASE_DIR) for module in options['modules']],
+        }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,245 @@
+import time
+import asyncio
+import logging
+import threading
+from datetime import timedelta
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from Autra.metrics import collect
+from .models import Job
+
+logger = logging.getLogger(__name__)
+metrics_logger = logging.getLogger('Autra.metrics')
+
+DEFAULT_CONCURRENCY = 1
+DEFAULT_MAX_QUEUED = 8
+DEFAULT_RETRY_AFTER = 5
+DEFAULT_HEARTBEAT_SECONDS = 30
+DEFAULT_STALE_SECONDS = 5 * 60
+DEFAULT_MAX_ATTEMPTS = 2
+
+
+class JobError(Exception):
+    pass
+
+
+class QueueFull(JobError):
+    pass
+
+
+_executors = {}
+_in_flight = defaultdict(int)
+# Async views awaiting a result, which JOBS_MAX_QUEUED bounds. Batch items and
+# API jobs are counted in _in_flight only, so they never make a view answer 429.
+_waiting = defaultdict(int)
+_lock = threading.Lock()
+
+
+def get_concurrency(kind):
+    limits = getattr(settings, 'JOBS_CONCURRENCY', {})
+    return max(1, limits.get(kind, getattr(settings, 'JOBS_DEFAULT_CONCURRENCY', DEFAULT_CONCURRENCY)))
+
+
+def get_max_queued(kind):
+    limits = getattr(settings, 'JOBS_MAX_QUEUED', {})
+    return max(0, limits.get(kind, getattr(settings, 'JOBS_DEFAULT_MAX_QUEUED', DEFAULT_MAX_QUEUED)))
+
+
+def get_retry_after():
+    return getattr(settings, 'JOBS_RETRY_AFTER', DEFAULT_RETRY_AFTER)
+
+
+def get_handler(kind):
+    handlers = getattr(settings, 'JOBS_HANDLERS', {})
+    if kind not in handlers:
+        raise JobError(f"Unknown job kind: {kind}")
+    return import_string(handlers[kind])
+
+
+def get_executor(kind):
+    with _lock:
+        executor = _executors.get(kind)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=get_concurrency(kind), thread_name_prefix=f"jobs-{kind}")
+            _executors[kind] = executor
+        return executor
+
+
+def run_handler(job):
+    """Run the handler of ``job`` on this thread and log the stage timings it recorded."""
+    start = time.perf_counter()
+    with collect() as collector:
+        try:
+            return get_handler(job.kind)(job)
+        finally:
+            summary = collector.summary()
+            metrics_logger.info(f"Job {job.kind} {getattr(job, 'pk', '(inline)')} took "
+                                f"{time.perf_counter() - start:.3f}s: {summary}",
+                                extra={'metrics': summary, 'kind': job.kind})
+
+
+def _start(kind, fn, *args, limit=None):
+    with _lock:
+        if limit is not None:
+            if _waiting[kind] >= limit:
+                raise QueueFull(f"Too many {kind} requests are waiting, try again in a few seconds.")
+            _waiting[kind] += 1
+        _in_flight[kind] += 1
+
+    def done(future):
+        with _lock:
+            _in_flight[kind] -= 1
+            if limit is not None:
+                _waiting[kind] -= 1
+
+    future = get_executor(kind).submit(fn, *args)
+    future.add_done_callback(done)
+    return future
+
+
+def _dispatch(job_id, kind):
+    _start(kind, run_job, job_id)
+
+
+def submit(kind, params):
+    get_handler(kind)
+    job = Job.objects.create(kind=kind, params=params)
+    if getattr(settings, 'JOBS_RUN_IN_PROCESS', True):
+        transaction.on_commit(lambda: _dispatch(job.pk, kind))
+    return job
+
+
+def get_heartbeat_seconds():
+    return getattr(settings, 'JOBS_HEARTBEAT_SECONDS', DEFAULT_HEARTBEAT_SECONDS)
+
+
+def claim(job_id):
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(status=Job.RUNNING, started_at=now,
+                                                                     heartbeat_at=now, attempts=F('attempts') + 1)
+    return claimed == 1
+
+
+def heartbeat(job_id, stop):
+    """Mark the job ``job_id`` alive every JOBS_HEARTBEAT_SECONDS until ``stop`` is set."""
+    try:
+        while not stop.wait(get_heartbeat_seconds()):
+            Job.objects.filter(pk=job_id, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def requeue_stale(stale_seconds=None):
+    """Queue again the RUNNING jobs without a heartbeat for JOBS_STALE_SECONDS, which a process
+    that died or restarted left behind; the ones already tried JOBS_MAX_ATTEMPTS times fail instead.
+
+    Returns how many were queued again.
+    """
+    if stale_seconds is None:
+        stale_seconds = getattr(settings, 'JOBS_STALE_SECONDS', DEFAULT_STALE_SECONDS)
+    if not stale_seconds:
+        return 0
+    max_attempts = getattr(settings, 'JOBS_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=stale_seconds)
+    stale = Job.objects.filter(Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+                               status=Job.RUNNING)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=Job.FAILED, error=f"Interrupted {max_attempts} times before finishing.", finished_at=now)
+    requeued = stale.filter(attempts__lt=max_attempts).update(status=Job.QUEUED, started_at=None,
+                                                              heartbeat_at=None, progress=0)
+    if failed or requeued:
+        logger.warning(f"Requeued {requeued} and failed {failed} jobs without a heartbeat for {stale_seconds}s")
+    return requeued
+
+
+def run_job(job_id):
+    try:
+        # A job is claimed atomically, so a web process and `manage.py runjobs`
+        # can both dispatch the same queue without running a job twice.
+        if not claim(job_id):
+            return
+        job = Job.objects.get(pk=job_id)
+        stop = threading.Event()
+        threading.Thread(target=heartbeat, args=(job_id, stop), daemon=True,
+                         name=f"jobs-heartbeat-{job_id}").start()
+        try:
+            result = run_handler(job)
+        except Exception as e:
+            logger.error(f"Job {job_id} ({job.kind}) failed: {e}")
+            Job.objects.filter(pk=job_id).update(status=Job.FAILED, error=str(e), finished_at=timezone.now())
+        else:
+            Job.objects.filter(pk=job_id).update(status=Job.DONE, progress=1.0, result=result,
+                                                 finished_at=timezone.now())
+        finally:
+            stop.set()
+    finally:
+        connection.close()
+
+
+class InlineJob:
+    """Stand-in for a Job row, for handlers that run without going through the database."""
+
+    def __init__(self, kind, params):
+        self.kind = kind
+        self.params = params
+        self.progress = 0
+
+    def set_progress(self, progress):
+        self.progress = progress
+
+
+def run_inline(kind, params):
+    """Run the ``kind`` handler on ``params`` on the job workers and return its future.
+
+    The work shares the per-kind concurrency limit (and so the loaded models)
+    with queued jobs, but nothing is written to the database.
+    """
+    get_handler(kind)
+    return _start(kind, run_handler, InlineJob(kind, params))
+
+
+async def run_async(kind, params):
+    """Await the ``kind`` handler on ``params`` from an async view, without holding a thread meanwhile.
+
+    Raises QueueFull instead of queueing when as many views as there are
+    workers of ``kind`` plus JOBS_MAX_QUEUED are already waiting, so a burst
+    is turned away early rather than piling up behind the models.
+    """
+    get_handler(kind)
+    limit = get_concurrency(kind) + get_max_queued(kind)
+    return await asyncio.wrap_future(_start(kind, run_handler, InlineJob(kind, params), limit=limit))
+
+
+def dispatch_queued():
+    requeue_stale()
+    dispatched = 0
+    for job in Job.objects.filter(status=Job.QUEUED).order_by('created_at').only('id', 'kind'):
+        with _lock:
+            busy = _in_flight[job.kind] >= get_concurrency(job.kind)
+        if busy:
+            continue
+        _dispatch(job.pk, job.kind)
+        dispatched += 1
+    return dispatched
+
+
+def resume_jobs():
+    """Hand every queued job to the workers of this process, after requeueing stale ones.
+
+    Jobs run in the web process are otherwise only dispatched when submitted,
+    so those queued when a previous process stopped would wait forever.
+    """
+    requeue_stale()
+    dispatched = 0
+    for job in Job.objects.filter(status=Job.QUEUED).order_by('created_at').only('id', 'kind'):
+        _dispatch(job.pk, job.kind)
+        dispatched += 1
+    if dispatched:
+        logger.info(f"Resumed {dispatched} queued jobs")
+    return dispatched
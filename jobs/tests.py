@@ -0,0 +1,102 @@
+import time
+import threading
+from datetime import timedelta
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from jobs.models import Job
+from jobs.queue import claim, requeue_stale, run_job
+
+release_job = threading.Event()
+
+
+def slow_handler(job):
+    release_job.wait(10)
+    return {'done': True}
+
+
+class ClaimTests(TransactionTestCase):
+    def test_only_one_claim_wins(self):
+        job = Job.objects.create(kind='slow')
+        start = threading.Barrier(8)
+        results = []
+
+        def claim_job():
+            start.wait()
+            results.append(claim(job.pk))
+
+        threads = [threading.Thread(target=claim_job) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), [False] * 7 + [True])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 1))
+        self.assertIsNotNone(job.heartbeat_at)
+
+    def test_finished_jobs_are_not_claimed(self):
+        job = Job.objects.create(kind='slow', status=Job.DONE)
+        self.assertFalse(claim(job.pk))
+
+
+@override_settings(JOBS_STALE_SECONDS=300, JOBS_MAX_ATTEMPTS=2)
+class RequeueStaleTests(TestCase):
+    def running(self, heartbeat_age, attempts=1, started_age=3 * 3600):
+        now = timezone.now()
+        heartbeat_at = None if heartbeat_age is None else now - timedelta(seconds=heartbeat_age)
+        return Job.objects.create(kind='slow', status=Job.RUNNING, attempts=attempts, progress=0.5,
+                                  started_at=now - timedelta(seconds=started_age), heartbeat_at=heartbeat_at)
+
+    def test_long_job_with_a_heartbeat_keeps_running(self):
+        job = self.running(heartbeat_age=10)
+        self.assertEqual(requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+
+    def test_stale_job_is_queued_again(self):
+        job = self.running(heartbeat_age=600)
+        self.assertEqual(requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.started_at, job.heartbeat_at), (Job.QUEUED, 0, None, None))
+        self.assertTrue(claim(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+
+    def test_job_from_before_heartbeats_goes_by_its_start(self):
+        job = self.running(heartbeat_age=None)
+        self.assertEqual(requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+
+    def test_fails_after_max_attempts(self):
+        job = self.running(heartbeat_age=600, attempts=2)
+        self.assertEqual(requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_set_progress_is_a_heartbeat(self):
+        job = self.running(heartbeat_age=600)
+        job.set_progress(0.7)
+        self.assertEqual(requeue_stale(), 0)
+
+
+@override_settings(JOBS_HANDLERS={'slow': f"{__name__}.slow_handler"}, JOBS_HEARTBEAT_SECONDS=0.05,
+                   JOBS_STALE_SECONDS=0.5)
+class HeartbeatTests(TransactionTestCase):
+    def test_running_job_is_not_requeued(self):
+        job = Job.objects.create(kind='slow')
+        release_job.clear()
+        runner = threading.Thread(target=run_job, args=(job.pk,))
+        runner.start()
+        try:
+            # Well past JOBS_STALE_SECONDS without any progress from the handler.
+            for _ in range(10):
+                time.sleep(0.15)
+                self.assertEqual(requeue_stale(), 0)
+        finally:
+            release_job.set()
+            runner.join()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result), (Job.DONE, 1, {'done': True}))
+        self.assertGreater(job.heartbeat_at, job.started_at + timedelta(seconds=1))
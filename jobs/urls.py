@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('<uuid:job_id>/', views.job_status, name='job_status'),
+    path('<uuid:job_id>/result/', views.job_result, name='job_result'),
+]
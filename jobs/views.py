@@ -0,0 +1,42 @@
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from .models import Job
+from .queue import get_retry_after
+
+
+def job_payload(job):
+    return {
+        'job_id': str(job.id),
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'status_url': reverse('job_status', args=[job.id]),
+        'result_url': reverse('job_result', args=[job.id]),
+    }
+
+
+def busy_response(error):
+    response = HttpResponse(str(error), status=429)
+    response['Retry-After'] = str(get_retry_after())
+    return response
+
+
+def job_status(request, job_id):
+    job = get_object_or_404(Job, pk=job_id)
+    payload = job_payload(job)
+    if job.status == Job.FAILED:
+        payload['error'] = job.error
+    return JsonResponse(payload)
+
+
+def job_result(request, job_id):
+    job = get_object_or_404(Job, pk=job_id)
+    payload = job_payload(job)
+    if job.status == Job.DONE:
+        payload['result'] = job.result
+        return JsonResponse(payload)
+    if job.status == Job.FAILED:
+        payload['error'] = job.error
+        return JsonResponse(payload, status=500)
+    return JsonResponse(payload, status=202)
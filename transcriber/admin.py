@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import Transcript, AudioFile
 
-# Register your models here.
+
+@admin.register(Transcript, AudioFile)
+class ArtifactAdmin(admin.ModelAdmin):
+    list_display = ('id', 'filename', 'size', 'source', 'created_at', 'accessed_at')
+    search_fields = ('filename', 'content_hash', 'source')
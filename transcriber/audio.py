@@ -0,0 +1,84 @@
+import wave
+import subprocess
+from Autra.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+SAMPLE_RATE = 16000
+
+
+def ffmpeg_pcm_command(path):
+    return ['ffmpeg', '-nostdin', '-threads', '0', '-i', path, '-vn', '-f', 's16le', '-ac', '1',
+            '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE), '-loglevel', 'error', '-']
+
+
+def iter_pcm_blocks(stream, block_seconds=10):
+    """Yield 16 kHz mono s16le PCM read from ``stream`` as float32 blocks."""
+    block_bytes = int(block_seconds * SAMPLE_RATE) * 2
+    while True:
+        data = stream.read(block_bytes)
+        if not data:
+            break
+        yield np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+
+
+def iter_pcm(path, block_seconds=10):
+    """Yield the audio of ``path`` as 16 kHz mono float32 blocks.
+
+    ffmpeg decodes straight into a pipe, so at most one block of decoded
+    audio is held here at a time.
+    """
+    process = subprocess.Popen(ffmpeg_pcm_command(path), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        yield from iter_pcm_blocks(process.stdout, block_seconds)
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {path}: {stderr.decode(errors='replace').strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def probe_duration(path):
+    try:
+        output = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                                 '-of', 'default=noprint_wrappers=1:nokey=1', path],
+                                capture_output=True, text=True, check=True).stdout
+        return float(output.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+
+def load_audio(path):
+    """Decode the audio track of ``path`` (audio file or video container) to 16 kHz mono float32.
+
+    The buffer is sized from the container duration up front and filled
+    block by block from the ffmpeg pipe, so no intermediate file is written
+    and the decoded audio is held only once.
+    """
+    return join_pcm(iter_pcm(path), probe_duration(path))
+
+
+def join_pcm(blocks, duration=None):
+    """Concatenate PCM blocks into one array, preallocated from the expected ``duration`` in seconds."""
+    audio = np.empty(int(((duration or 60) + 1) * SAMPLE_RATE), dtype=np.float32)
+    length = 0
+    for block in blocks:
+        if length + len(block) > len(audio):
+            grown = np.empty(max(length + len(block), int(len(audio) * 1.5)), dtype=np.float32)
+            grown[:length] = audio[:length]
+            audio = grown
+        audio[length:length + len(block)] = block
+        length += len(block)
+    return audio[:length]
+
+
+def write_wav(audio, path):
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(pcm.tobytes())
+    return path
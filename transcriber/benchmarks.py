@@ -0,0 +1,158 @@
+import os
+import re
+import time
+import tempfile
+import multiprocessing
+from django.conf import settings
+from .audio import load_audio, SAMPLE_RATE
+
+
+def _peak_rss_bytes():
+    import resource
+    # ru_maxrss is in KiB on Linux; children covers the ffmpeg subprocesses.
+    self_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    return self_peak, children_peak
+
+
+def legacy_extract(video_path):
+    # The previous path: moviepy re-encodes a WAV, then Whisper decodes that WAV again.
+    from moviepy.editor import VideoFileClip
+    import whisper
+
+    with tempfile.TemporaryDirectory() as tmp:
+        audio_path = os.path.join(tmp, 'audio.wav')
+        video = VideoFileClip(video_path)
+        video.audio.write_audiofile(audio_path, logger=None)
+        video.audio.close()
+        video.close()
+        return whisper.load_audio(audio_path)
+
+
+def pipe_extract(video_path):
+    return load_audio(video_path)
+
+
+EXTRACTORS = {
+    'moviepy': legacy_extract,
+    'ffmpeg_pipe': pipe_extract,
+}
+
+
+def _run_extractor(name, video_path, queue):
+    start = time.perf_counter()
+    audio = EXTRACTORS[name](video_path)
+    elapsed = time.perf_counter() - start
+    self_peak, children_peak = _peak_rss_bytes()
+    queue.put({
+        'method': name,
+        'seconds': elapsed,
+        'audio_seconds': len(audio) / 16000,
+        'peak_rss_bytes': self_peak,
+        'peak_child_rss_bytes': children_peak,
+    })
+
+
+def bench_audio_extraction(video_path, repeat=3):
+    """Time each extraction path in a fresh process so peak RSS is not shared between them."""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in EXTRACTORS:
+        runs = []
+        for _ in range(repeat):
+            queue = context.Queue()
+            process = context.Process(target=_run_extractor, args=(name, video_path, queue))
+            process.start()
+            runs.append(queue.get())
+            process.join()
+        best = min(runs, key=lambda run: run['seconds'])
+        best['peak_rss_bytes'] = max(run['peak_rss_bytes'] for run in runs)
+        best['peak_child_rss_bytes'] = max(run['peak_child_rss_bytes'] for run in runs)
+        results.append(best)
+    return results
+
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", ' ', text.lower()).split()
+
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance (substitutions + deletions + insertions) and the reference length."""
+    reference, hypothesis = normalize_words(reference), normalize_words(hypothesis)
+    previous = list(range(len(hypothesis) + 1))
+    for i, word in enumerate(reference, start=1):
+        current = [i]
+        for j, other in enumerate(hypothesis, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other)))
+        previous = current
+    return previous[-1], len(reference)
+
+
+def load_samples(directory=None):
+    """``(audio_path, reference_text)`` for every file in ``directory`` with a ``NAME.txt`` next to it."""
+    directory = str(directory or getattr(settings, 'TRANSCRIBER_BENCH_SAMPLES', 'samples'))
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(name)
+        reference_path = os.path.join(directory, f"{stem}.txt")
+        if extension == '.txt' or not os.path.exists(reference_path):
+            continue
+        with open(reference_path) as reference:
+            samples.append((os.path.join(directory, name), reference.read()))
+    return samples
+
+
+def bench_profiles(directory=None, profiles=None, model_name=None, repeat=1):
+    """Transcribe every sample under each inference profile and report speed and word error rate.
+
+    Each run is seeded, so Whisper's temperature fallback samples the same
+    tokens every time and the WER of a profile only changes with the model,
+    the samples or the profile. The model load (and quantization) is reported
+    separately from ``seconds``, which is the best of ``repeat`` runs summed
+    over the samples.
+    """
+    import torch
+    from .profiles import profile_names, get_profile, profile_model_name
+    from .registry import get_registry, default_model_name
+    from .transcribe import run_whisper
+
+    samples = [(path, reference, load_audio(path)) for path, reference in load_samples(directory)]
+    if not samples:
+        raise ValueError("No benchmark samples found; add audio files with a NAME.txt reference next to each.")
+    model_name = model_name or default_model_name()
+    audio_seconds = sum(len(audio) for _, _, audio in samples) / SAMPLE_RATE
+
+    results = []
+    for name in profiles or profile_names():
+        profile = get_profile(name)
+        start = time.perf_counter()
+        get_registry().get(profile_model_name(model_name, profile))
+        load_seconds = time.perf_counter() - start
+
+        seconds = 0
+        errors = words = 0
+        per_sample = []
+        for path, reference, audio in samples:
+            runs = []
+            for _ in range(repeat):
+                torch.manual_seed(0)
+                start = time.perf_counter()
+                text = run_whisper(audio, model_name, name)['text']
+                runs.append(time.perf_counter() - start)
+            sample_errors, sample_words = word_errors(reference, text)
+            seconds += min(runs)
+            errors += sample_errors
+            words += sample_words
+            per_sample.append({'sample': os.path.basename(path), 'seconds': min(runs),
+                               'wer': sample_errors / max(1, sample_words)})
+        results.append({
+            'profile': name,
+            'model': profile_model_name(model_name, profile),
+            'load_seconds': load_seconds,
+            'seconds': seconds,
+            'audio_seconds': audio_seconds,
+            'realtime_factor': seconds / audio_seconds,
+            'wer': errors / max(1, words),
+            'samples': per_sample,
+        })
+    return results
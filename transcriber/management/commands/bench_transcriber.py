@@ -0,0 +1,29 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from transcriber.benchmarks import bench_audio_extraction, bench_profiles
+
+
+class Command(BaseCommand):
+    help = "Benchmarks for the transcription pipeline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--extract', metavar='VIDEO',
+                            help="Compare moviepy and ffmpeg-pipe audio extraction on this video.")
+        parser.add_argument('--profiles', nargs='*', metavar='PROFILE',
+                            help="Speed and WER of these inference profiles (all when none are named).")
+        parser.add_argument('--samples', default=None,
+                            help="Directory of audio files with NAME.txt references (TRANSCRIBER_BENCH_SAMPLES).")
+        parser.add_argument('--model', default=None)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if options['profiles'] is not None:
+            results = bench_profiles(options['samples'], profiles=options['profiles'], model_name=options['model'],
+                                     repeat=options['repeat'])
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        if not options['extract']:
+            raise CommandError("Pass --extract VIDEO or --profiles.")
+        results = bench_audio_extraction(options['extract'], repeat=options['repeat'])
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,15 @@
+import json
+from django.core.management.base import BaseCommand
+from transcriber.registry import get_registry, default_model_name
+
+
+class Command(BaseCommand):
+    help = "Load Whisper models through the registry and report load time and memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help="Model sizes to load (defaults to TRANSCRIBER_MODEL).")
+
+    def handle(self, *args, **options):
+        registry = get_registry()
+        registry.preload(options['models'] or [default_model_name()])
+        self.stdout.write(json.dumps(registry.stats(), indent=2))
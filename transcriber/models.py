@@ -1,3 +1,26 @@
 from django.db import models
+from Autra.artifacts import Artifact
 
-# Create your models here.
+
+class Transcript(Artifact):
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_hash'], name='transcript_hash_idx'),
+            models.Index(fields=['size'], name='transcript_size_idx'),
+            models.Index(fields=['created_at'], name='transcript_created_idx'),
+            models.Index(fields=['accessed_at'], name='transcript_accessed_idx'),
+            models.Index(fields=['source'], name='transcript_source_idx'),
+        ]
+
+
+class AudioFile(Artifact):
+    """A downloadable audio file: the audio of a video, a downloaded link or a kept upload."""
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_hash'], name='audiofile_hash_idx'),
+            models.Index(fields=['size'], name='audiofile_size_idx'),
+            models.Index(fields=['created_at'], name='audiofile_created_idx'),
+            models.Index(fields=['accessed_at'], name='audiofile_accessed_idx'),
+            models.Index(fields=['source'], name='audiofile_source_idx'),
+        ]
@@ -0,0 +1,57 @@
+from django.conf import settings
+from .registry import QUANTIZED_SUFFIX
+from Autra.lazy import lazy_import
+
+torch = lazy_import('torch')
+
+DEFAULT_PROFILE = 'default'
+PROFILE_DEFAULTS = {
+    'quantize': False,
+    'language': None,
+    'beam_size': None,
+    'threads': None,
+    'vad': False,
+}
+
+
+def profile_names():
+    return list(getattr(settings, 'TRANSCRIBER_PROFILES', {DEFAULT_PROFILE: {}}))
+
+
+def default_profile_name():
+    return getattr(settings, 'TRANSCRIBER_PROFILE', DEFAULT_PROFILE)
+
+
+def get_profile(name=None):
+    """Settings of the inference profile ``name`` (the configured default when None)."""
+    name = name or default_profile_name()
+    profiles = getattr(settings, 'TRANSCRIBER_PROFILES', {DEFAULT_PROFILE: {}})
+    if name not in profiles:
+        raise ValueError(f"Unknown transcription profile '{name}'")
+    return dict(PROFILE_DEFAULTS, **profiles[name], name=name)
+
+
+def profile_model_name(model_name, profile):
+    """Registry name of ``model_name`` under ``profile``; quantized weights are loaded as their own model."""
+    return f"{model_name}{QUANTIZED_SUFFIX}" if profile['quantize'] else model_name
+
+
+def decode_options(profile):
+    """Keyword arguments for ``model.transcribe`` under ``profile``."""
+    options = {}
+    if profile['quantize']:
+        # Quantized layers only run in fp32.
+        options['fp16'] = False
+    if profile['language']:
+        options['language'] = profile['language']
+    if profile['beam_size']:
+        options['beam_size'] = profile['beam_size']
+    return options
+
+
+def apply_threads(profile):
+    # torch's intra-op thread count is process-wide, so profiles that set it
+    # should not be mixed in one process.
+    threads = profile['threads']
+    if threads and torch.get_num_threads() != threads:
+        torch.set_num_threads(threads)
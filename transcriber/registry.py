@@ -0,0 +1,218 @@
+import gc
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from django.conf import settings
+from .utils import current_rss_bytes
+from Autra.lazy import lazy_import
+from Autra.metrics import observe
+
+whisper = lazy_import('whisper')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "medium"
+QUANTIZED_SUFFIX = ':int8'
+# fp32 weights of the released Whisper sizes (parameter count x 4 bytes), used to make
+# room before a model is loaded for the first time.
+MODEL_BYTES = {
+    'tiny': 39_000_000 * 4,
+    'base': 74_000_000 * 4,
+    'small': 244_000_000 * 4,
+    'medium': 769_000_000 * 4,
+    'turbo': 809_000_000 * 4,
+    'large': 1_550_000_000 * 4,
+}
+# int8 Linear layers, with the embeddings and convolutions still in fp32.
+QUANTIZED_BYTES_RATIO = 0.4
+
+
+def split_model_name(name):
+    """``'small:int8'`` -> ``('small', True)``."""
+    if name.endswith(QUANTIZED_SUFFIX):
+        return name[:-len(QUANTIZED_SUFFIX)], True
+    return name, False
+
+
+def quantize_model(model):
+    """Dynamic int8 quantization of the Linear layers, for CPU inference.
+
+    quantize_dynamic only swaps modules whose type is exactly nn.Linear.
+    Whisper's Linear subclass just casts its weights to the input dtype, which
+    is a no-op in fp32, so its instances are turned into plain nn.Linear first.
+    """
+    import torch
+
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_whisper_model(name):
+    base_name, quantized = split_model_name(name)
+    if not quantized:
+        return whisper.load_model(base_name)
+    return quantize_model(whisper.load_model(base_name, device='cpu'))
+
+
+def tensor_bytes(value):
+    if isinstance(value, (tuple, list)):
+        return sum(tensor_bytes(item) for item in value)
+    if hasattr(value, 'numel') and hasattr(value, 'element_size'):
+        return value.numel() * value.element_size()
+    return 0
+
+
+def model_bytes(model):
+    # Quantized layers keep their weights in the state dict as packed (weight, bias)
+    # tuples rather than as parameters.
+    return sum(tensor_bytes(value) for value in model.state_dict().values())
+
+
+def estimate_model_bytes(name):
+    """Weights of the Whisper model ``name`` from its size, or None for an unknown one."""
+    base_name, quantized = split_model_name(name)
+    base_name = base_name.split('.')[0]
+    size = 'turbo' if 'turbo' in base_name else base_name.split('-')[0]
+    if size not in MODEL_BYTES:
+        return None
+    return int(MODEL_BYTES[size] * (QUANTIZED_BYTES_RATIO if quantized else 1))
+
+
+class LoadedModel:
+    def __init__(self, name, model, load_seconds, size_bytes):
+        self.name = name
+        self.model = model
+        self.load_seconds = load_seconds
+        self.size_bytes = size_bytes
+        self.lock = threading.Lock()
+        self.uses = 0
+
+
+class ModelRegistry:
+    """Loads each Whisper model once per process and keeps it for reuse.
+
+    Models are kept in least-recently-used order. When ``max_bytes`` is set,
+    the least recently used idle models are dropped before a model is loaded,
+    so that its weights fit next to the ones kept, and again afterwards if it
+    turned out larger. A model loaded before is expected at its measured size,
+    others at :func:`estimate_model_bytes`. Whisper installs decoder hooks for
+    every call, so a loaded model is only used by one thread at a time.
+    """
+
+    def __init__(self, enabled=None, max_bytes=None, loader=load_whisper_model):
+        self.enabled = set(enabled) if enabled else None
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def _load(self, name):
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(name)
+                if entry is not None:
+                    self._models.move_to_end(name)
+                    return entry
+                incoming = self._sizes.get(name) or estimate_model_bytes(name) or 0
+                evicted = self._evict(keep=name, incoming=incoming)
+            if evicted:
+                # Release the dropped weights before the new ones are allocated.
+                gc.collect()
+
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            model = self.loader(name)
+            load_seconds = time.perf_counter() - start
+            observe('model_load', load_seconds)
+            entry = LoadedModel(name, model, load_seconds, model_bytes(model))
+            logger.info(f"Loaded Whisper model '{name}' in {load_seconds:.1f}s "
+                        f"({entry.size_bytes / 2**20:.0f} MiB weights, "
+                        f"RSS {rss_before / 2**20:.0f} -> {current_rss_bytes() / 2**20:.0f} MiB)")
+
+            with self._lock:
+                self._models[name] = entry
+                self._sizes[name] = entry.size_bytes
+                self._evict(keep=name)
+            return entry
+
+    def _evict(self, keep, incoming=0):
+        """Drop idle models until the loaded ones and ``incoming`` more bytes fit in ``max_bytes``."""
+        if not self.max_bytes:
+            return 0
+        total = incoming + sum(entry.size_bytes for entry in self._models.values())
+        evicted = 0
+        for name in list(self._models):
+            if total <= self.max_bytes:
+                break
+            entry = self._models[name]
+            if name == keep or entry.lock.locked():
+                continue
+            del self._models[name]
+            total -= entry.size_bytes
+            evicted += 1
+            logger.info(f"Evicted Whisper model '{name}' to stay under {self.max_bytes / 2**20:.0f} MiB")
+        return evicted
+
+    def check_enabled(self, name):
+        if self.enabled is not None and split_model_name(name)[0] not in self.enabled:
+            raise ValueError(f"Whisper model '{name}' is not enabled")
+
+    def get(self, name):
+        self.check_enabled(name)
+        return self._load(name).model
+
+    @contextmanager
+    def acquire(self, name):
+        self.check_enabled(name)
+        entry = self._load(name)
+        with entry.lock:
+            entry.uses += 1
+            yield entry.model
+
+    def preload(self, names):
+        for name in names:
+            self.get(name)
+
+    def stats(self):
+        with self._lock:
+            models = [{
+                'name': entry.name,
+                'load_seconds': entry.load_seconds,
+                'size_bytes': entry.size_bytes,
+                'uses': entry.uses,
+            } for entry in self._models.values()]
+        return {'models': models, 'rss_bytes': current_rss_bytes()}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry(
+                enabled=getattr(settings, 'TRANSCRIBER_ENABLED_MODELS', None),
+                max_bytes=getattr(settings, 'TRANSCRIBER_MODEL_CACHE_BYTES', None),
+            )
+        return _registry
+
+
+def preload_configured_models():
+    names = getattr(settings, 'TRANSCRIBER_PRELOAD_MODELS', [])
+    if names:
+        get_registry().preload(names)
+
+
+def default_model_name():
+    return getattr(settings, 'TRANSCRIBER_MODEL', DEFAULT_MODEL)
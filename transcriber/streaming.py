@@ -0,0 +1,143 @@
+import os
+import logging
+from django.conf import settings
+from .audio import SAMPLE_RATE, iter_pcm, probe_duration
+from .transcribe import save_text_to_file, transcript_params
+from .registry import get_registry, default_model_name
+from .profiles import get_profile, profile_model_name, decode_options, apply_threads
+from .vad import VAD_FRAME_SECONDS, frame_energy
+from Autra.lazy import lazy_import
+from Autra.metrics import timed, count
+
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+
+def find_cut(audio, window_samples, search_samples, min_silence_samples, threshold):
+    """Pick where to end the next window.
+
+    Looks for the quietest stretch of at least ``min_silence_samples`` in the
+    last ``search_samples`` of the window. Returns ``(cut, True)`` with the cut
+    in the middle of that stretch when it is below ``threshold`` (RMS), and
+    ``(window_samples, False)`` when the window has to be cut mid-speech.
+    """
+    frame_samples = int(VAD_FRAME_SECONDS * SAMPLE_RATE)
+    search_start = max(0, window_samples - search_samples)
+    energy = frame_energy(audio[search_start:window_samples], frame_samples)
+    run = max(1, min_silence_samples // frame_samples)
+    if len(energy) < run:
+        return window_samples, False
+
+    # Moving average over `run` frames; the lowest one is the quietest stretch.
+    moving = np.convolve(energy, np.ones(run) / run, mode='valid')
+    quietest = int(np.argmin(moving))
+    if moving[quietest] > threshold:
+        return window_samples, False
+    return search_start + (quietest + run // 2) * frame_samples, True
+
+
+def get_streaming_options():
+    return {
+        'window_seconds': getattr(settings, 'TRANSCRIBER_STREAM_WINDOW_SECONDS', 30),
+        'search_seconds': getattr(settings, 'TRANSCRIBER_STREAM_SILENCE_SEARCH_SECONDS', 5),
+        'min_silence_seconds': getattr(settings, 'TRANSCRIBER_STREAM_MIN_SILENCE_SECONDS', 0.3),
+        'silence_threshold': getattr(settings, 'TRANSCRIBER_STREAM_SILENCE_THRESHOLD', 0.01),
+    }
+
+
+def transcribe_stream(audio_path, base_name, model_name=None, on_progress=None, profile=None, transcript=None):
+    """Transcribe ``audio_path`` window by window, yielding segments as they finish.
+
+    Windows end at a silence when one is found near the window end. When a
+    window has to be cut mid-speech, its last segment is dropped and the next
+    window starts at that segment, so the overlap is re-transcribed once and
+    never appears twice in the text. A segment that starts the window is kept
+    instead, and the audio after its end (speech the model left unfinished at
+    the cut) goes on with the next window. Every kept segment is appended to the
+    file of ``transcript`` (a new :class:`Transcript` when None) right away,
+    so partial results can be downloaded while the transcription is still running.
+
+    The decoding settings of ``profile`` apply, except its VAD pre-pass: the
+    windows already end at silences and the timestamps must stay accurate.
+    """
+    duration = probe_duration(audio_path)
+    count('bytes_read', os.path.getsize(audio_path))
+    logger.info(f"Streaming transcription of {audio_path}")
+    yield from transcribe_blocks(iter_pcm(audio_path), base_name, model_name, on_progress, profile, transcript,
+                                 duration)
+
+
+def transcribe_blocks(blocks, base_name, model_name=None, on_progress=None, profile=None, transcript=None,
+                      duration=None):
+    """:func:`transcribe_stream` over 16 kHz mono float32 ``blocks``, transcribing each window
+    as soon as its audio has arrived; ``duration`` (seconds, when known) is passed to ``on_progress``.
+    """
+    options = get_streaming_options()
+    window_samples = int(options['window_seconds'] * SAMPLE_RATE)
+    search_samples = int(options['search_seconds'] * SAMPLE_RATE)
+    min_silence_samples = int(options['min_silence_seconds'] * SAMPLE_RATE)
+    if transcript is None:
+        transcript = save_text_to_file('', base_name, params=transcript_params(model_name, profile))
+    text_file_path = transcript.full_path()
+    profile = get_profile(profile)
+    model_name = profile_model_name(model_name or default_model_name(), profile)
+
+    buffer = np.empty(0, dtype=np.float32)
+    offset = 0
+    previous_text = None
+
+    def transcribe_window(window):
+        apply_threads(profile)
+        count('audio_seconds', len(window) / SAMPLE_RATE)
+        with get_registry().acquire(model_name) as model, timed('transcribe'):
+            result = model.transcribe(window, initial_prompt=previous_text, **decode_options(profile))
+        return result['segments']
+
+    def drain(final):
+        nonlocal buffer, offset, previous_text
+        while len(buffer) >= window_samples or (final and len(buffer)):
+            if final and len(buffer) <= window_samples:
+                cut, at_silence = len(buffer), True
+            else:
+                cut, at_silence = find_cut(buffer, window_samples, search_samples, min_silence_samples,
+                                           options['silence_threshold'])
+
+            segments = transcribe_window(buffer[:cut])
+            advance = cut
+            if not at_silence and segments:
+                resume = int(segments[-1]['start'] * SAMPLE_RATE)
+                end = int(segments[-1]['end'] * SAMPLE_RATE)
+                if resume > 0:
+                    segments = segments[:-1]
+                    advance = resume
+                elif 0 < end < cut:
+                    advance = end
+
+            kept = []
+            for segment in segments:
+                text = segment['text'].strip()
+                if text:
+                    kept.append({
+                        'start': offset / SAMPLE_RATE + segment['start'],
+                        'end': offset / SAMPLE_RATE + segment['end'],
+                        'text': text,
+                    })
+            if kept:
+                with open(text_file_path, 'a') as file:
+                    file.write(''.join(f"{segment['text']} " for segment in kept))
+                previous_text = kept[-1]['text']
+
+            buffer = buffer[advance:]
+            offset += advance
+            if on_progress is not None:
+                on_progress(offset / SAMPLE_RATE, duration)
+            yield from kept
+
+    try:
+        for block in blocks:
+            buffer = np.concatenate((buffer, block))
+            yield from drain(final=False)
+        yield from drain(final=True)
+    finally:
+        transcript.update_size()
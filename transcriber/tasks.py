@@ -0,0 +1,113 @@
+import os
+from django.urls import reverse
+from Autra.cache import get_cache, hash_file
+from jobs.batch import is_url
+from jobs.queue import JobError
+from .models import Transcript, AudioFile
+from .streaming import transcribe_stream
+from .transcribe import (transcribe_audio_file, extract_audio_from_video, download_audio_link,
+                         cached_transcription, transcript_cache_key, is_supported_audio_file,
+                         save_text_to_file, transcript_params, SUPPORTED_VIDEO_FORMATS)
+
+
+def transcribe(job):
+    source = job.params['source']
+    base_name = job.params.get('base_name')
+    streaming = job.params.get('streaming')
+    content_hash = job.params.get('content_hash')
+    profile = job.params.get('profile')
+    audio_file_path = job.params.get('path')
+    remove_input = job.params.get('remove_input', source == 'video')
+    saved_audio_path = audio_file_path if source == 'audio' and not remove_input else None
+    origin = job.params.get('url') or job.params.get('filename') or base_name
+    # Audio this job writes itself; it is removed again unless the job registers it.
+    written_path = None
+    # Streaming submissions hand out the download URL of their transcript before the job runs.
+    transcript = Transcript.objects.filter(pk=job.params.get('transcript_id')).first()
+
+    if source == 'link':
+        base_name, audio_file_path, content_hash = download_audio_link(job.params['url'])
+        if audio_file_path is None:
+            raise JobError("Invalid audio link or unsupported format.")
+        saved_audio_path = written_path = audio_file_path
+    elif content_hash is None:
+        content_hash = hash_file(audio_file_path)
+
+    try:
+        audio = audio_file_path
+        keep_audio = job.params.get('keep_audio', False)
+        transcription_text, cached = cached_transcription(content_hash, base_name, profile=profile, source=origin,
+                                                          transcript=transcript)
+        # A cached transcript is reused as is; a video only has its audio extracted to be kept.
+        if source == 'video' and (keep_audio if transcription_text is not None else not streaming):
+            audio, saved_audio_path = extract_audio_from_video(audio_file_path, base_name, save_wav=keep_audio)
+            written_path = saved_audio_path
+            if audio is None:
+                raise JobError("Error extracting audio from the video.")
+        if transcription_text is not None:
+            return transcription_result(transcription_text, cached,
+                                        save_audio(saved_audio_path, base_name, content_hash, origin))
+        job.set_progress(0.2)
+
+        if streaming:
+            def on_progress(position, duration):
+                if duration:
+                    job.set_progress(0.2 + 0.8 * min(1.0, position / duration))
+
+            # ffmpeg reads the audio track of a video directly, so nothing is extracted first.
+            if transcript is None:
+                transcript = save_text_to_file('', base_name, content_hash, origin, transcript_params(profile=profile))
+            segments = list(transcribe_stream(audio_file_path, base_name, on_progress=on_progress,
+                                              profile=profile, transcript=transcript))
+            transcription_text = ' '.join(segment['text'] for segment in segments)
+            if content_hash:
+                get_cache().put('transcripts', transcript_cache_key(content_hash, profile=profile),
+                                transcription_text.encode())
+        else:
+            transcription_text, transcript = transcribe_audio_file(audio, base_name, content_hash=content_hash,
+                                                                   profile=profile, source=origin)
+
+        if transcription_text is None:
+            raise JobError("Error during transcription.")
+        return transcription_result(transcription_text, transcript,
+                                    save_audio(saved_audio_path, base_name, content_hash, origin))
+    except BaseException:
+        if written_path and os.path.exists(written_path):
+            os.remove(written_path)
+        raise
+    finally:
+        if remove_input and os.path.exists(audio_file_path):
+            os.remove(audio_file_path)
+
+
+def save_audio(audio_file_path, base_name, content_hash, source):
+    """Record a kept audio file as an :class:`AudioFile`, so it can be downloaded and evicted."""
+    if not audio_file_path:
+        return None
+    extension = os.path.splitext(audio_file_path)[1]
+    return AudioFile.register(audio_file_path, f"{os.path.basename(base_name)}{extension}",
+                              content_hash=content_hash, source=source)
+
+
+def transcription_result(transcription_text, transcript, audio_file):
+    return {
+        'transcription': transcription_text,
+        'text_url': reverse('download_text', args=[transcript.id]) if transcript else None,
+        'audio_url': reverse('download_audio', args=[audio_file.id]) if audio_file else None,
+    }
+
+
+def batch_params(source, content_hash=None, remove_input=False, profile=None):
+    """Job params for one audio link or local audio/video file of a batch."""
+    if is_url(source):
+        return {'source': 'link', 'url': source, 'profile': profile}
+    base_name, extension = os.path.splitext(os.path.basename(source))
+    extension = extension.lower().lstrip('.')
+    if is_supported_audio_file(extension):
+        kind = 'audio'
+    elif extension in SUPPORTED_VIDEO_FORMATS:
+        kind = 'video'
+    else:
+        raise JobError("Invalid file type. Please send a supported audio or video file.")
+    return {'source': kind, 'path': source, 'base_name': base_name, 'content_hash': content_hash,
+            'remove_input': remove_input, 'profile': profile}
@@ -1,3 +1,313 @@
-from django.test import TestCase
+import os
+import shutil
+import asyncio
+import tempfile
+import threading
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from Autra import cache
+from Autra.artifacts import unique_path
+from Autra.lazy import lazy_import
+from jobs.queue import JobError, InlineJob, run_async
+from transcriber import tasks, views
+from transcriber.models import Transcript, AudioFile
+from transcriber.streaming import transcribe_blocks
+from .audio import SAMPLE_RATE, write_wav
+from .registry import ModelRegistry, estimate_model_bytes
+from .vad import drop_silence
 
-# Create your tests here.
+np = lazy_import('numpy')
+
+
+def tone(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+class DropSilenceTests(SimpleTestCase):
+    def test_short_input_is_returned_unchanged(self):
+        for samples in (0, 100, int(0.25 * SAMPLE_RATE)):
+            with self.subTest(samples=samples):
+                audio = tone(samples / SAMPLE_RATE)
+                self.assertTrue(np.array_equal(drop_silence(audio), audio))
+
+    def test_short_silence_is_returned_unchanged(self):
+        audio = np.zeros(int(0.25 * SAMPLE_RATE), dtype=np.float32)
+        self.assertEqual(len(drop_silence(audio)), len(audio))
+
+    def test_long_silence_is_cut_down_to_its_padding(self):
+        audio = np.concatenate((tone(0.5), np.zeros(SAMPLE_RATE, dtype=np.float32), tone(0.5)))
+        self.assertEqual(len(audio), 2 * SAMPLE_RATE)
+        result = drop_silence(audio, min_silence_seconds=0.5, pad_seconds=0.2)
+        # Both tones are kept whole, with 0.2 s of the silence on each side of it.
+        self.assertAlmostEqual(len(result) / SAMPLE_RATE, 1.4, delta=0.06)
+        self.assertTrue(np.array_equal(result[:int(0.5 * SAMPLE_RATE)], audio[:int(0.5 * SAMPLE_RATE)]))
+
+    def test_pause_shorter_than_the_minimum_is_kept(self):
+        audio = np.concatenate((tone(0.8), np.zeros(int(0.4 * SAMPLE_RATE), dtype=np.float32), tone(0.8)))
+        self.assertTrue(np.array_equal(drop_silence(audio, min_silence_seconds=0.5, pad_seconds=0.2), audio))
+
+
+class FakeWeights:
+    def __init__(self, size):
+        self.size = size
+
+    def numel(self):
+        return self.size
+
+    def element_size(self):
+        return 1
+
+
+class FakeModel:
+    def __init__(self, size):
+        self.weights = FakeWeights(size)
+
+    def state_dict(self):
+        return {'weight': self.weights}
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def registry(self, max_bytes, sizes=None):
+        """A registry whose loader records the models still loaded when each load starts."""
+        resident = []
+
+        def loader(name):
+            resident.append((name, sorted(registry._models)))
+            return FakeModel((sizes or {}).get(name) or estimate_model_bytes(name))
+
+        registry = ModelRegistry(max_bytes=max_bytes, loader=loader)
+        return registry, resident
+
+    def test_estimates(self):
+        self.assertEqual(estimate_model_bytes('base.en'), estimate_model_bytes('base'))
+        self.assertEqual(estimate_model_bytes('large-v3'), estimate_model_bytes('large'))
+        self.assertLess(estimate_model_bytes('large-v3-turbo'), estimate_model_bytes('large'))
+        self.assertLess(estimate_model_bytes('small:int8'), estimate_model_bytes('small'))
+        self.assertIsNone(estimate_model_bytes('custom'))
+
+    def test_evicts_before_loading(self):
+        registry, resident = self.registry(estimate_model_bytes('small') + estimate_model_bytes('base'))
+        registry.get('small')
+        registry.get('base')
+        registry.get('medium')
+        self.assertEqual(resident, [('small', []), ('base', ['small']), ('medium', [])])
+        self.assertEqual([model['name'] for model in registry.stats()['models']], ['medium'])
+
+    def test_keeps_models_in_use(self):
+        registry, resident = self.registry(estimate_model_bytes('small'))
+        with registry.acquire('small'):
+            registry.get('base')
+        self.assertEqual(resident, [('small', []), ('base', ['small'])])
+
+    def test_uses_the_measured_size_of_a_model_loaded_before(self):
+        registry, resident = self.registry(300, sizes={'one': 200, 'two': 200})
+        registry.get('one')
+        registry.get('two')
+        # 'two' had no estimate, so 'one' was only dropped after it was loaded.
+        registry.get('one')
+        self.assertEqual(resident, [('one', []), ('two', ['one']), ('one', [])])
+
+
+release_jobs = threading.Event()
+
+
+def blocking_handler(job):
+    release_jobs.wait(10)
+    return {}
+
+
+class BusyTranscribeViewTests(SimpleTestCase):
+    """The form view answers 429 once the transcribe workers and their queue are taken."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media_root, UPLOAD_ROOT=os.path.join(self.media_root, 'uploads'),
+                                     JOBS_HANDLERS={'transcribe': f"{__name__}.blocking_handler"},
+                                     JOBS_CONCURRENCY={'transcribe': 1}, JOBS_MAX_QUEUED={'transcribe': 0})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def stored_files(self):
+        return [os.path.join(directory, name) for directory, _, names in os.walk(self.media_root) for name in names]
+
+    async def post_while_busy(self, data):
+        release_jobs.clear()
+        waiting = asyncio.ensure_future(run_async('transcribe', {}))
+        await asyncio.sleep(0.05)
+        try:
+            return await self.async_client.post('/audiotrans/transcribe/', data)
+        finally:
+            release_jobs.set()
+            await waiting
+
+    def wav(self):
+        with tempfile.NamedTemporaryFile(suffix='.wav') as wav_file:
+            write_wav(tone(1), wav_file.name)
+            return wav_file.read()
+
+    async def test_uploads_are_removed(self):
+        for name, content_type in (('clip.wav', 'audio/wav'), ('clip.mp4', 'video/mp4')):
+            with self.subTest(name=name):
+                upload = SimpleUploadedFile(name, self.wav(), content_type=content_type)
+                response = await self.post_while_busy({'file': upload})
+                self.assertEqual(response.status_code, 429)
+                self.assertIn('Retry-After', response)
+                self.assertEqual(self.stored_files(), [])
+
+    async def test_downloaded_links_are_removed(self):
+        def download_audio_link(audio_link):
+            path = unique_path('audio', 'clip.wav')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_wav(tone(1), path)
+            return 'clip', path, 'hash'
+
+        with mock.patch.object(views, 'download_audio_link', download_audio_link):
+            response = await self.post_while_busy({'audio_link': 'http://example.com/clip.wav'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.stored_files(), [])
+
+
+class TranscribeJobTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patcher = mock.patch.object(cache, '_cache', cache.ResultCache(os.path.join(self.media_root, 'cache')))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def audio_files(self):
+        return os.listdir(os.path.join(self.media_root, 'audio'))
+
+    def download_audio_link(self, audio_link):
+        path = unique_path('audio', 'clip.wav')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_wav(tone(1), path)
+        return 'clip', path, 'a' * 64
+
+    def run_job(self, **params):
+        return tasks.transcribe(InlineJob('transcribe', params))
+
+    def test_failed_job_removes_the_downloaded_audio(self):
+        with mock.patch.object(tasks, 'download_audio_link', self.download_audio_link), \
+                mock.patch.object(tasks, 'transcribe_audio_file', return_value=(None, None)):
+            with self.assertRaises(JobError):
+                self.run_job(source='link', url='http://example.com/clip.wav')
+        self.assertEqual(self.audio_files(), [])
+        self.assertFalse(AudioFile.objects.exists())
+
+    def test_crashed_job_removes_the_downloaded_audio(self):
+        with mock.patch.object(tasks, 'download_audio_link', self.download_audio_link), \
+                mock.patch.object(tasks, 'transcribe_audio_file', side_effect=RuntimeError('out of memory')):
+            with self.assertRaises(RuntimeError):
+                self.run_job(source='link', url='http://example.com/clip.wav')
+        self.assertEqual(self.audio_files(), [])
+
+    def test_kept_audio_is_registered(self):
+        def transcribe_audio_file(audio, base_name, **options):
+            return 'hello', Transcript.objects.create(path='text/clip.txt', filename='clip.txt')
+
+        with mock.patch.object(tasks, 'download_audio_link', self.download_audio_link), \
+                mock.patch.object(tasks, 'transcribe_audio_file', transcribe_audio_file):
+            result = self.run_job(source='link', url='http://example.com/clip.wav')
+        audio_file = AudioFile.objects.get()
+        self.assertEqual(self.audio_files(), [os.path.basename(audio_file.path)])
+        self.assertTrue(result['audio_url'].endswith(f"{audio_file.id}/"))
+
+    def test_cache_hit_keeping_the_audio_reuses_the_transcript(self):
+        base_name, path, content_hash = self.download_audio_link(None)
+        cache.get_cache().put('transcripts', tasks.transcript_cache_key(content_hash), b'hello')
+        with mock.patch.object(tasks, 'transcribe_audio_file') as transcribe_audio_file:
+            result = self.run_job(source='audio', path=path, base_name=base_name, content_hash=content_hash,
+                                  keep_audio=True)
+        transcribe_audio_file.assert_not_called()
+        self.assertEqual(result['transcription'], 'hello')
+        self.assertEqual(Transcript.objects.count(), 1)
+        self.assertEqual(AudioFile.objects.get().full_path(), path)
+
+
+def word(level, seconds):
+    """Synthetic PCM for one word: a constant ``level`` / 10 for ``seconds``."""
+    return np.full(int(seconds * SAMPLE_RATE), level / 10, dtype=np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+class StreamModel:
+    """Stands in for whisper: every run of non-zero samples is a word named after its level.
+
+    Segments start a little before their word. A word the window starts in
+    the middle of comes out garbled, and one cut by the window end is left
+    out, as whisper does with words it only heard part of.
+    """
+
+    def __init__(self):
+        self.windows = []
+
+    def transcribe(self, window, initial_prompt=None, **options):
+        self.windows.append(window)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], (window != 0).astype(np.int8), [0]))))
+        segments = []
+        for start, end in zip(edges[::2], edges[1::2]):
+            if end == len(window):
+                continue
+            text = f"w{round(float(window[start]) * 10)}"
+            segments.append({'start': max(0, start / SAMPLE_RATE - 0.05), 'end': end / SAMPLE_RATE,
+                             'text': f"-{text}" if start == 0 else text})
+        return {'segments': segments}
+
+
+@override_settings(TRANSCRIBER_STREAM_WINDOW_SECONDS=1, TRANSCRIBER_STREAM_SILENCE_SEARCH_SECONDS=0.5,
+                   TRANSCRIBER_STREAM_MIN_SILENCE_SECONDS=0.3)
+class TranscribeBlocksTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.model = StreamModel()
+        registry = mock.MagicMock()
+        registry.acquire.return_value.__enter__.return_value = self.model
+        patcher = mock.patch('transcriber.streaming.get_registry', return_value=registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def transcribe(self, audio):
+        """Segments of ``audio`` fed in blocks of 0.25 s, and the text its transcript file ended up with."""
+        block = SAMPLE_RATE // 4
+        blocks = (audio[start:start + block] for start in range(0, len(audio), block))
+        progress = []
+        segments = list(transcribe_blocks(blocks, 'clip', on_progress=lambda done, total: progress.append(done)))
+        self.assertAlmostEqual(progress[-1], len(audio) / SAMPLE_RATE)
+        with open(Transcript.objects.get().full_path()) as f:
+            return segments, f.read()
+
+    def test_windows_are_stitched_at_silences(self):
+        audio = np.concatenate([silence(0.2)] + [np.concatenate((word(level, 0.3), silence(0.4)))
+                                                 for level in range(1, 6)])
+        segments, text = self.transcribe(audio)
+        self.assertEqual([segment['text'] for segment in segments], ['w1', 'w2', 'w3', 'w4', 'w5'])
+        for level, segment in enumerate(segments):
+            self.assertAlmostEqual(segment['start'], 0.15 + 0.7 * level, places=3)
+            self.assertAlmostEqual(segment['end'], 0.5 + 0.7 * level, places=3)
+        self.assertEqual(text, 'w1 w2 w3 w4 w5 ')
+        # Several windows, each but the last one cut in a silence.
+        self.assertGreater(len(self.model.windows), 2)
+        self.assertTrue(all(window[-1] == 0 for window in self.model.windows[:-1]))
+
+    def test_speech_cut_by_the_window_goes_on_with_the_next_one(self):
+        # No silence near the end of the first window, which is cut in the middle of w2.
+        audio = np.concatenate((silence(0.1), word(1, 0.7), silence(0.05), word(2, 0.55), silence(0.6)))
+        segments, text = self.transcribe(audio)
+        self.assertEqual([segment['text'] for segment in segments], ['w1', 'w2'])
+        self.assertAlmostEqual(segments[1]['start'], 0.8, places=3)
+        self.assertEqual(text, 'w1 w2 ')
+        self.assertTrue(all(window[0] == 0 for window in self.model.windows))
@@ -1,11 +1,22 @@
-from moviepy.editor import VideoFileClip
 from django.conf import settings
 import mimetypes
-import whisper
 import os
 import logging
+from Autra.artifacts import unique_path
+from Autra.cache import get_cache
+from Autra.ingest import download
+from .audio import SAMPLE_RATE, load_audio, write_wav
+from .registry import get_registry, default_model_name
+from .profiles import get_profile, profile_model_name, decode_options, apply_threads
+from .vad import drop_silence
+from .models import Transcript
+from Autra.lazy import lazy_import
+from Autra.metrics import timed, count
+
+whisper = lazy_import('whisper')
 
 SUPPORTED_AUDIO_FORMATS = {'wav', 'mp3', 'flac', 'aac', 'ogg'}
+SUPPORTED_VIDEO_FORMATS = {'mp4', 'mov', 'mkv', 'avi', 'webm'}
 
 logger = logging.getLogger(__name__)
 
@@ -17,29 +28,99 @@ def is_audio_file(file):
     return mime_type and mime_type.startswith('audio')
 
 
-def save_text_to_file(transcription_text, base_name):
-    text_file_path = os.path.join(settings.MEDIA_ROOT, f"text/{base_name}.txt")
+def transcript_params(model_name=None, profile=None):
+    return {'model': model_name or default_model_name(), 'profile': get_profile(profile)['name']}
+
+
+def save_text_to_file(transcription_text, base_name, content_hash=None, source=None, params=None, transcript=None):
+    """Save ``transcription_text`` and record it as a :class:`Transcript` downloaded as ``{base_name}.txt``.
+
+    With ``transcript`` the text replaces the content of that one instead,
+    whose download URL may already have been handed out.
+    """
+    text_file_path = transcript.full_path() if transcript else unique_path('text', f"{base_name}.txt")
     os.makedirs(os.path.dirname(text_file_path), exist_ok=True)
 
     try:
         with open(text_file_path, 'w') as file:
             file.write(transcription_text)
         logger.info(f"Transcription saved to: {text_file_path}")
-        return text_file_path
     except IOError as e:
         logger.error(f"Error saving transcription to file: {e}")
         return None
+    if transcript is not None:
+        transcript.update_size()
+        return transcript
+    return Transcript.register(text_file_path, f"{os.path.basename(base_name)}.txt", content_hash=content_hash,
+                               source=source or base_name, params=params or transcript_params())
+
+
+def transcript_cache_key(content_hash, model_name=None, profile=None):
+    return get_cache().key(content_hash, model=model_name or default_model_name(), profile=get_profile(profile))
+
+
+def cached_transcription(content_hash, base_name, model_name=None, profile=None, source=None, transcript=None):
+    if not content_hash:
+        return None, None
+    data = get_cache().get('transcripts', transcript_cache_key(content_hash, model_name, profile))
+    if data is None:
+        return None, None
+    transcription_text = data.decode()
+    logger.info(f"Using cached transcription for: {base_name}")
+    return transcription_text, save_text_to_file(transcription_text, base_name, content_hash, source,
+                                                 transcript_params(model_name, profile), transcript)
+
+
+def get_vad_options():
+    return {
+        'threshold': getattr(settings, 'TRANSCRIBER_VAD_THRESHOLD', 0.01),
+        'min_silence_seconds': getattr(settings, 'TRANSCRIBER_VAD_MIN_SILENCE_SECONDS', 0.5),
+        'pad_seconds': getattr(settings, 'TRANSCRIBER_VAD_PAD_SECONDS', 0.2),
+    }
+
 
+def run_whisper(audio, model_name=None, profile=None):
+    """Transcribe 16 kHz mono PCM with the inference profile ``profile`` and return Whisper's result."""
+    profile = get_profile(profile)
+    if profile['vad']:
+        audio = drop_silence(audio, **get_vad_options())
+    apply_threads(profile)
+    count('audio_seconds', len(audio) / SAMPLE_RATE)
+    with get_registry().acquire(profile_model_name(model_name or default_model_name(), profile)) as model:
+        with timed('transcribe'):
+            return model.transcribe(audio, **decode_options(profile))
 
-def transcribe_audio_file(audio_file_path, base_name):
-    logger.info(f"Transcribing audio: {audio_file_path}")
+
+def transcribe_audio_file(audio, base_name, model_name=None, content_hash=None, profile=None, source=None):
+    """``audio`` is a file path or 16 kHz mono float32 PCM as returned by extract_audio_from_video.
+
+    With ``content_hash`` (SHA-256 of the uploaded input) the transcript is
+    served from and stored in the result cache. ``profile`` names the
+    inference profile, TRANSCRIBER_PROFILE when None. Returns the text and
+    its :class:`Transcript`, recorded with ``source`` (the input's URL or name).
+    """
+    transcription_text, transcript = cached_transcription(content_hash, base_name, model_name, profile, source)
+    if transcription_text is not None:
+        return transcription_text, transcript
+
+    if isinstance(audio, str):
+        logger.info(f"Transcribing audio: {audio}")
+    else:
+        logger.info(f"Transcribing {len(audio) / SAMPLE_RATE:.1f}s of decoded audio for: {base_name}")
     try:
-        model = whisper.load_model("medium")
-        result = model.transcribe(audio_file_path)
+        if isinstance(audio, str):
+            count('bytes_read', os.path.getsize(audio))
+            with timed('audio_extraction'):
+                audio = load_audio(audio)
+        result = run_whisper(audio, model_name, profile)
         transcription_text = result['text']
+        if content_hash:
+            get_cache().put('transcripts', transcript_cache_key(content_hash, model_name, profile),
+                            transcription_text.encode())
 
-        transcription_file_path = save_text_to_file(transcription_text, base_name)
-        return transcription_text, transcription_file_path
+        transcript = save_text_to_file(transcription_text, base_name, content_hash, source,
+                                       transcript_params(model_name, profile))
+        return transcription_text, transcript
     except whisper.DecodingError as e:
         logger.error(f"Decoding error during transcription: {e}")
         return None, None
@@ -47,21 +128,42 @@ def transcribe_audio_file(audio_file_path, base_name):
         logger.error(f"Error during transcription: {e}")
         return None, None
 
-def extract_audio_from_video(video_file_path, base_name):
-    audio_file_path = os.path.join(settings.MEDIA_ROOT, f"audio/{base_name}.wav")
-    logger.info(f"Saving audio file to: {audio_file_path}")
+def extract_audio_from_video(video_file_path, base_name, save_wav=False):
+    """Demux the audio of a video straight into memory as 16 kHz mono PCM.
 
-    try:
-        video = VideoFileClip(video_file_path)
-        audio = video.audio
-        audio.write_audiofile(audio_file_path)
+    The WAV under ``media/audio/`` is only written when ``save_wav`` is set,
+    i.e. when the user wants to download the audio; its path is returned with the PCM.
+    """
+    logger.info(f"Extracting audio from: {video_file_path}")
 
-        audio.close()
-        video.close()
+    try:
+        count('bytes_read', os.path.getsize(video_file_path))
+        with timed('audio_extraction'):
+            audio = load_audio(video_file_path)
+    except (RuntimeError, IOError, OSError) as e:
+        logger.error(f"Error extracting audio: {e}")
+        return None, None
 
+    audio_file_path = None
+    if save_wav:
+        audio_file_path = unique_path('audio', f"{base_name}.wav")
+        os.makedirs(os.path.dirname(audio_file_path), exist_ok=True)
+        write_wav(audio, audio_file_path)
         logger.info(f"Audio file saved at: {audio_file_path}")
-        return audio_file_path
+    return audio, audio_file_path
 
-    except (IOError, OSError) as e:
-        logger.error(f"Error extracting audio: {e}")
-        return None
+def download_audio_link(audio_link):
+    base_name = os.path.basename(audio_link).split('.')[0]
+    audio_file_path = unique_path('audio', f"{base_name}.wav")
+
+    def is_supported(response):
+        return is_supported_audio_file(response.headers.get('content-type', '').split('/')[-1])
+
+    try:
+        content_hash = download(audio_link, audio_file_path, validate=is_supported)
+    except (Exception,) as e:
+        logger.error(f"Error downloading audio link {audio_link}: {e}")
+        return None, None, None
+    if content_hash is None:
+        return None, None, None
+    return base_name, audio_file_path, content_hash
@@ -3,6 +3,9 @@ from . import views
 
 urlpatterns = [
     path('transcribe/', views.transcribe_audio_view, name='transcribe_audio'),
-    path('download_audio/<str:base_name>/', views.download_audio, name='download_audio'),
-    path('download_text/<str:base_name>/', views.download_text, name='download_text'),
+    path('submit/', views.submit_transcription, name='submit_transcription'),
+    path('stream/', views.stream_transcription, name='stream_transcription'),
+    path('batch/', views.batch_transcription, name='batch_transcription'),
+    path('download_audio/<uuid:artifact_id>/', views.download_audio, name='download_audio'),
+    path('download_text/<uuid:artifact_id>/', views.download_text, name='download_text'),
 ]
@@ -0,0 +1,40 @@
+from .audio import SAMPLE_RATE
+from Autra.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+VAD_FRAME_SECONDS = 0.03
+
+
+def frame_energy(audio, frame_samples):
+    usable = len(audio) - len(audio) % frame_samples
+    frames = audio[:usable].reshape(-1, frame_samples)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def drop_silence(audio, threshold=0.01, min_silence_seconds=0.5, pad_seconds=0.2):
+    """Cut silences longer than ``min_silence_seconds`` out of 16 kHz mono PCM.
+
+    Frames whose RMS is below ``threshold`` are silent. ``pad_seconds`` of
+    every dropped silence is kept on both sides of the speech around it, so
+    word edges are not clipped and the speech on either side stays apart.
+    Shorter pauses are left alone. Timestamps in the result no longer match
+    the input.
+    """
+    frame_samples = int(VAD_FRAME_SECONDS * SAMPLE_RATE)
+    speech = frame_energy(audio, frame_samples) >= threshold
+    pad = int(pad_seconds / VAD_FRAME_SECONDS)
+    if len(speech) < 2 * pad + 1:
+        # Too short to hold a silence longer than the padding, and `same` mode would return the kernel length.
+        return audio
+    keep = np.convolve(speech, np.ones(2 * pad + 1), mode='same') > 0
+
+    min_frames = max(1, int(min_silence_seconds / VAD_FRAME_SECONDS) - 2 * pad)
+    # Runs of dropped frames start where `keep` goes 1 -> 0 and end where it goes back to 1.
+    edges = np.flatnonzero(np.diff(np.concatenate(([1], keep.astype(np.int8), [1]))))
+    for start, end in zip(edges[::2], edges[1::2]):
+        if end - start < min_frames:
+            keep[start:end] = True
+
+    usable = len(keep) * frame_samples
+    return np.concatenate((audio[:usable][np.repeat(keep, frame_samples)], audio[usable:]))
@@ -1,110 +1,197 @@
 import os
-import requests
+import json
+import uuid
+import shutil
+import logging
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from Autra.artifacts import unique_path, serve_artifact
+from Autra.ingest import run_io
+from Autra.uploadhandlers import store_upload, read_form
+from jobs.batch import new_batch_dir, request_sources, batch_response
+from jobs.queue import JobError, QueueFull, submit, run_async
+from jobs.views import job_payload, busy_response
 from .forms import FileUploadForm
-from .transcribe import transcribe_audio_file, is_supported_audio_file, is_audio_file, extract_audio_from_video
-from .utils import cleanup_old_files
-import mimetypes
-
-class AudioFilePath:
-    def __init__(self, base_name):
-        self.base_name = base_name
-
-class TextFilePath:
-    def __init__(self, base_name):
-        self.base_name = base_name
-
-def transcribe_audio_view(request):
-    cleanup_old_files()
-    if request.method == 'POST':
-        base_name = "default_name"
-        form = FileUploadForm(request.POST, request.FILES)
-        transcription = None
-        text_file_path = None
-        audio_file_path = None
-        if form.is_valid():
-            if 'file' in request.FILES:  # Handle uploaded file
-                uploaded_file = request.FILES['file']
-                base_name = os.path.splitext(os.path.basename(uploaded_file.name))[0]
-                file_extension = os.path.splitext(uploaded_file.name)[1].lower().lstrip('.')
-                if uploaded_file.name.endswith('mp4'):
-                    temp_video_path = os.path.join(settings.MEDIA_ROOT, f"{base_name}.mp4")
-                    with open(temp_video_path, 'wb+') as destination:
-                        for chunk in uploaded_file.chunks():
-                            destination.write(chunk)
-
-                    extracted_audio_path = extract_audio_from_video(temp_video_path, base_name)
-                    transcription = transcribe_audio_file(extracted_audio_path, base_name)
-
-                elif is_supported_audio_file(file_extension) and is_audio_file(uploaded_file):
-                    audio_file_path = os.path.join(settings.MEDIA_ROOT, f"audio/{base_name}.{file_extension}")
-                    text_file_path = os.path.join(settings.MEDIA_ROOT, f"text/{base_name}.txt")
-
-                    with open(audio_file_path, 'wb+') as destination:
-                        for chunk in uploaded_file.chunks():
-                            destination.write(chunk)
-
-                    transcription = transcribe_audio_file(audio_file_path, base_name=base_name)
-                else:
-                    transcription = "Invalid file type. Please upload a supported audio file or a video (.mp4)."
-                    text_file_path = None
-
-            elif 'audio_link' in request.POST:  # Handle audio link
-                audio_link = request.POST['audio_link']
-                response = requests.get(audio_link, stream=True)
-
-                if response.status_code == 200 and is_supported_audio_file(response.headers.get('content-type', '').split('/')[-1]):
-                    base_name = os.path.basename(audio_link).split('.')[0]
-                    audio_file_path = os.path.join(settings.MEDIA_ROOT, f"audio/{base_name}.wav")
-
-                    with open(audio_file_path, 'wb+') as destination:
-                        for chunk in response.iter_content(1024):
-                            destination.write(chunk)
-
-                    transcription = transcribe_audio_file(audio_file_path, base_name)
-
-                else:
-                    transcription = "Invalid audio link or unsupported format."
-            if transcription:
-                audio_file_path = AudioFilePath(base_name=base_name)
-                text_file_path = TextFilePath(base_name=base_name)
-                return render(request, 'transcribe/result.html', {
-                    'audio_file_path': AudioFilePath(base_name=base_name) if audio_file_path else None,
-                    'transcription': transcription,
-                    'text_file_path': AudioFilePath(base_name=base_name) if text_file_path else None,
-            })
+from .models import Transcript, AudioFile
+from .transcribe import (is_supported_audio_file, is_audio_file, download_audio_link, save_text_to_file,
+                         transcript_params)
+from .streaming import transcribe_stream
+from .profiles import profile_names
+
+logger = logging.getLogger(__name__)
+
+async def transcribe_audio_view(request):
+    """Form view: links are fetched on the ingest threads and the transcription runs on the
+    transcribe job workers, so waiting holds no thread; 429 when too many are already waiting.
+    """
+    if request.method != 'POST':
+        return render(request, 'transcribe/upload.html', {'form': FileUploadForm()})
+
+    post, files = await read_form(request)
+    form = FileUploadForm(post, files)
+    if form.is_valid():
+        # Sniffing and moving the upload touch the disk, so they run on a thread too.
+        params = await sync_to_async(save_upload_for_transcription, thread_sensitive=False)(files['file'])
+        if params is None:
+            return HttpResponse("Invalid file type. Please upload a supported audio file or a video (.mp4).")
+        params['keep_audio'] = bool(post.get('keep_audio'))
+    elif post.get('audio_link'):
+        base_name, audio_file_path, content_hash = await run_io(download_audio_link, post['audio_link'])
+        if audio_file_path is None:
+            return HttpResponse("Invalid audio link or unsupported format.")
+        params = {'source': 'audio', 'path': audio_file_path, 'base_name': base_name, 'content_hash': content_hash,
+                  'url': post['audio_link']}
     else:
-        form = FileUploadForm()
-    return render(request, 'transcribe/upload.html', {'form': form})
+        return render(request, 'transcribe/upload.html', {'form': form})
 
+    try:
+        result = await run_async('transcribe', params)
+    except QueueFull as e:
+        # Nothing registered the stored upload or download yet, so nothing else would remove it.
+        if os.path.exists(params['path']):
+            os.remove(params['path'])
+        return busy_response(e)
+    except JobError as e:
+        return HttpResponse(str(e))
+    return render(request, 'transcribe/result.html', {
+        'base_name': params['base_name'],
+        'audio_url': result['audio_url'],
+        'transcription': result['transcription'],
+        'text_url': result['text_url'],
+    })
+
+
+def save_upload_for_transcription(uploaded_file):
+    base_name = os.path.splitext(os.path.basename(uploaded_file.name))[0]
+    file_extension = os.path.splitext(uploaded_file.name)[1].lower().lstrip('.')
+    if uploaded_file.name.endswith('mp4'):
+        source = 'video'
+        upload_path = os.path.join(settings.MEDIA_ROOT, f"{uuid.uuid4().hex}_{base_name}.mp4")
+    elif is_supported_audio_file(file_extension) and is_audio_file(uploaded_file):
+        source = 'audio'
+        upload_path = unique_path('audio', f"{base_name}.{file_extension}")
+    else:
+        return None
+
+    content_hash = store_upload(uploaded_file, upload_path)
+    return {'source': source, 'path': upload_path, 'base_name': base_name, 'content_hash': content_hash,
+            'filename': os.path.basename(uploaded_file.name)}
+
+
+def get_profile_param(data):
+    """Inference profile asked for by a request, None for the default; raises ValueError with a message for the client."""
+    profile = data.get('profile') or None
+    if profile is not None and profile not in profile_names():
+        raise ValueError(f"profile must be one of: {', '.join(profile_names())}.")
+    return profile
 
-def download_audio(request, base_name):
-    filename = f'audio/{base_name}.wav'
-    media_root = settings.MEDIA_ROOT
-    file_path = os.path.join(media_root, filename)
+
+@csrf_exempt
+def submit_transcription(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': "POST a file or an audio_link."}, status=405)
+    try:
+        profile = get_profile_param(request.POST)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if 'file' in request.FILES:
+        params = save_upload_for_transcription(request.FILES['file'])
+        if params is None:
+            return JsonResponse({'error': "Invalid file type. Please upload a supported audio file or a video (.mp4)."},
+                                status=400)
+    elif request.POST.get('audio_link'):
+        params = {'source': 'link', 'url': request.POST['audio_link']}
+    else:
+        return JsonResponse({'error': "Please upload a file or enter an audio link."}, status=400)
+
+    params['streaming'] = bool(request.POST.get('streaming'))
+    params['keep_audio'] = bool(request.POST.get('keep_audio'))
+    params['profile'] = profile
+    transcript = None
+    if params['streaming'] and params.get('base_name'):
+        transcript = save_text_to_file('', params['base_name'], params['content_hash'], params['filename'],
+                                       transcript_params(profile=profile))
+        params['transcript_id'] = str(transcript.id)
+    job = submit('transcribe', params)
+    payload = job_payload(job)
+    if transcript is not None:
+        # The text file grows while the job runs, so this URL serves partial results.
+        payload['text_url'] = reverse('download_text', args=[transcript.id])
+    return JsonResponse(payload, status=202)
+
+
+@csrf_exempt
+def batch_transcription(request):
+    """Transcribe many files or links in one call and stream one NDJSON line per item.
+
+    Accepts ``url`` fields (or ``urls``, one per line), ``files`` uploads and
+    ``archive`` zip files of audio or video, plus the ``profile`` of submit_transcription.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': "POST audio links, files or a zip archive."}, status=405)
     try:
-        with open(file_path, 'rb') as fl:
-            mime_type, _ = mimetypes.guess_type(file_path)
-            response = HttpResponse(fl, content_type=mime_type)
-            response['Content-Disposition'] = "attachment; filename=%s" % os.path.basename(filename)
-            return response
-    except FileNotFoundError:
-        return HttpResponse("File not found.", status=404)
-
-def download_text(request, base_name):
-    filename = f'text/{base_name}.txt'
-    media_root = settings.MEDIA_ROOT
-    file_path = os.path.join(media_root, filename)
+        profile = get_profile_param(request.POST)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    directory = new_batch_dir()
     try:
-        with open(file_path, 'rb') as fl:
-            mime_type, _ = mimetypes.guess_type(file_path)
-            response = HttpResponse(fl, content_type=mime_type)
-            response['Content-Disposition'] = "attachment; filename=%s" % os.path.basename(filename)
-            return response
-    except FileNotFoundError:
-        pass
-    return HttpResponse("File not found.", status=404)
+        sources = request_sources(request, directory)
+    except JobError as e:
+        shutil.rmtree(directory, ignore_errors=True)
+        return JsonResponse({'error': str(e)}, status=400)
+    return batch_response('transcribe', sources, directory, profile=profile)
+
+
+@csrf_exempt
+def stream_transcription(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': "POST a file or an audio_link."}, status=405)
+    try:
+        profile = get_profile_param(request.POST)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if 'file' in request.FILES:
+        params = save_upload_for_transcription(request.FILES['file'])
+        if params is None:
+            return JsonResponse({'error': "Invalid file type. Please upload a supported audio file or a video (.mp4)."},
+                                status=400)
+        base_name, audio_path = params['base_name'], params['path']
+        content_hash, source = params['content_hash'], params['filename']
+    elif request.POST.get('audio_link'):
+        source = request.POST['audio_link']
+        base_name, audio_path, content_hash = download_audio_link(source)
+        if audio_path is None:
+            return JsonResponse({'error': "Invalid audio link or unsupported format."}, status=400)
+    else:
+        return JsonResponse({'error': "Please upload a file or enter an audio link."}, status=400)
+    transcript = save_text_to_file('', base_name, content_hash, source, transcript_params(profile=profile))
+
+    def lines():
+        try:
+            for segment in transcribe_stream(audio_path, base_name, profile=profile, transcript=transcript):
+                yield json.dumps(segment) + "\n"
+        except Exception as e:
+            logger.error(f"Error during streaming transcription: {e}")
+            yield json.dumps({'error': "Error during transcription."}) + "\n"
+            return
+        finally:
+            # Only the transcript is offered for download, so the input is not kept.
+            os.remove(audio_path)
+        yield json.dumps({'done': True, 'text_url': reverse('download_text', args=[transcript.id])}) + "\n"
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+def download_audio(request, artifact_id):
+    return serve_artifact(AudioFile, artifact_id)
 
 
+def download_text(request, artifact_id):
+    return serve_artifact(Transcript, artifact_id)